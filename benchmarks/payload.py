@@ -0,0 +1,118 @@
+"""
+Bytes and CPU per request of the list endpoints for each response format and
+content coding.
+
+    python benchmarks/payload.py --size 100k
+    python benchmarks/payload.py --size 1k --limit 1000 --repeat 50
+
+For a page of people, planets and users, and the streamed people list, it
+requests every combination of:
+  format    json, or columnar (Accept: application/x-columnar+json)
+  coding    identity, gzip and br (skipped if brotli is missing)
+and reports the body size, its ratio to plain JSON, and the median wall and
+CPU time per request through the Flask test client (the variants of a path
+are requested in turns). Every body is decoded and checked against the plain
+JSON one.
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import SIZES, seed  # noqa: E402
+
+COLUMNAR = 'application/x-columnar+json'
+
+
+def decode(response):
+    data = response.get_data()
+    coding = response.headers.get('Content-Encoding')
+    if coding == 'gzip':
+        data = gzip.decompress(data)
+    elif coding == 'br':
+        import brotli
+        data = brotli.decompress(data)
+    return json.loads(data)
+
+def as_dicts(body):
+    data = body['data']
+    if isinstance(data, dict):
+        return [dict(zip(data['fields'], row)) for row in data['rows']]
+    return data
+
+def timed(client, path, variants, repeat):
+    """Median wall and CPU ms of each of ``variants`` (request headers), requested in turns."""
+    walls, cpus, responses = [[] for _ in variants], [[] for _ in variants], [None] * len(variants)
+    for _ in range(repeat):
+        for index, headers in enumerate(variants):
+            wall, cpu = time.perf_counter(), time.process_time()
+            response = client.get(path, headers=headers)
+            response.get_data()
+            walls[index].append(time.perf_counter() - wall)
+            cpus[index].append(time.process_time() - cpu)
+            responses[index] = response
+    return [
+        (response, statistics.median(wall) * 1000, statistics.median(cpu) * 1000)
+        for response, wall, cpu in zip(responses, walls, cpus)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='1k')
+    parser.add_argument('--database-url')
+    parser.add_argument('--limit', type=int, default=100, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{tempfile.gettempdir()}/bench_{args.size}.db'
+    os.environ['PROFILING'] = '0'
+    if not args.cache:
+        os.environ['CACHE_TTL'] = '0'
+
+    from app import create_app
+    from models import db
+    from compression import compression
+
+    app = create_app({'MIGRATIONS': False})
+    with app.app_context():
+        seed(db.engine, db.metadata, *SIZES[args.size])
+    client = app.test_client()
+
+    paths = [f'/people?limit={args.limit}', f'/planets?limit={args.limit}', f'/users?limit={args.limit}',
+             '/people?stream=1']
+    formats = [('json', 'application/json'), ('columnar', COLUMNAR)]
+    codings = ['identity', 'gzip'] + (['br'] if 'br' in compression.codings else [])
+
+    print(f'{"path":<22}{"format":<10}{"coding":<10}{"bytes":>10}{"ratio":>8}{"ms/req":>9}{"cpu ms":>9}')
+    for path in paths:
+        variants = [
+            (format_name, accept, coding) for format_name, accept in formats for coding in codings
+            if not (format_name == 'columnar' and 'stream' in path)
+        ]
+        results = timed(client, path, [{'Accept': accept, 'Accept-Encoding': coding} for _, accept, coding in variants],
+                        args.repeat)
+        expected, plain_bytes = None, None
+        for (format_name, _, coding), (response, wall_ms, cpu_ms) in zip(variants, results):
+            items = as_dicts(decode(response))
+            size = len(response.get_data())
+            if expected is None:
+                expected, plain_bytes = items, size
+            elif items != expected:
+                print(f'MISMATCH: {path} {format_name} {coding} decodes to a different body')
+                return 1
+            print(f'{path:<22}{format_name:<10}{coding:<10}{size:>10}{size / plain_bytes:>8.2f}'
+                  f'{wall_ms:>9.2f}{cpu_ms:>9.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
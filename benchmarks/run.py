@@ -0,0 +1,408 @@
+"""
+Load test and micro-benchmark for every route of the API.
+
+    python benchmarks/run.py --size 1k                       # Flask test client
+    python benchmarks/run.py --size 100k --mode gunicorn     # real gunicorn process
+    python benchmarks/run.py --size 100k --mode asgi         # gunicorn with uvicorn workers (asgi.py)
+    python benchmarks/run.py --size 1k --update-baseline     # store benchmarks/baseline.json
+
+Reports p50/p99 latency, throughput and SQL statements per request for each
+route, plus peak RSS. Results are compared with the baseline file: a route
+that issues more statements than before, or whose p99 grew past the tolerance,
+is reported as a regression and the script exits with status 1.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import SIZES, seed  # noqa: E402
+
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+class Catalog:
+    """Ids to build request paths with, plus the rows created during the run."""
+
+    def __init__(self, people, planets, users, seed_value=7):
+        self.people, self.planets, self.users = people, planets, users
+        self.rng = random.Random(seed_value)
+        self.tag = f'{random.randrange(36 ** 4):04x}'
+        self.lock = threading.Lock()
+        self.created = {'people': [], 'planets': []}
+
+    def person(self):
+        return self.rng.randint(1, self.people)
+
+    def planet(self):
+        return self.rng.randint(1, self.planets)
+
+    def user(self):
+        return self.rng.randint(1, self.users)
+
+    def pop_created(self, kind):
+        with self.lock:
+            return self.created[kind].pop() if self.created[kind] else None
+
+
+def _remember(kind):
+    def callback(catalog, body):
+        ids = [body['data']['id']] if isinstance(body.get('data'), dict) else [
+            item['id'] for item in body.get('data', []) if item.get('status') == 'created'
+        ]
+        with catalog.lock:
+            catalog.created[kind].extend(ids)
+    return callback
+
+def _created_path(kind, template):
+    def path(catalog, i):
+        created = catalog.pop_created(kind)
+        return template.format(created) if created else None
+    return path
+
+def _favorite_pair(kind):
+    # The same pairs are added and then removed, so the run leaves no trace
+    def path(catalog, i):
+        rng = random.Random(f'{catalog.tag}-{kind}-{i}')
+        item = rng.randint(1, catalog.people if kind == 'people' else catalog.planets)
+        return f'/favorite/{rng.randint(1, catalog.users)}/{kind}/{item}'
+    return path
+
+# name, endpoint, method, path(catalog, i), body(catalog, i), on_response(catalog, json)
+SCENARIOS = [
+    ('sitemap', 'api.sitemap', 'GET', lambda c, i: '/', None, None),
+    ('hello', 'api.handle_hello', 'GET', lambda c, i: '/user', None, None),
+    ('list_users', 'api.get_users', 'GET', lambda c, i: '/users', None, None),
+    ('list_people', 'api.get_people', 'GET', lambda c, i: '/people', None, None),
+    ('list_people_fields', 'api.get_people', 'GET', lambda c, i: '/people?limit=500&fields=name', None, None),
+    ('list_planets', 'api.get_planets', 'GET', lambda c, i: '/planets', None, None),
+    ('get_person', 'api.get_person', 'GET', lambda c, i: f'/people/{c.person()}', None, None),
+    ('get_planet', 'api.get_planet', 'GET', lambda c, i: f'/planets/{c.planet()}', None, None),
+    ('multi_get_people', 'api.get_people', 'GET',
+        lambda c, i: '/people?expand=planet&ids=' + ','.join(str(c.person()) for _ in range(20)), None, None),
+    ('list_planets_residents', 'api.get_planets', 'GET', lambda c, i: '/planets?limit=50&expand=residents',
+        None, None),
+    ('get_planet_residents', 'api.get_planet', 'GET', lambda c, i: f'/planets/{c.planet()}?expand=residents',
+        None, None),
+    ('user_favorites', 'api.get_favorites_by_user', 'GET', lambda c, i: f'/user/{c.user()}/favorites', None, None),
+    ('user_profile', 'api.get_user_profile', 'GET', lambda c, i: f'/users/{c.user()}/profile', None, None),
+    ('user_profiles', 'api.get_user_profiles', 'GET',
+        lambda c, i: '/users/profiles?ids=' + ','.join(str(c.user()) for _ in range(20)), None, None),
+    ('people_leaderboard', 'api.get_people_leaderboard', 'GET', lambda c, i: '/leaderboard/people', None, None),
+    ('planets_leaderboard', 'api.get_planets_leaderboard', 'GET', lambda c, i: '/leaderboard/planets?limit=50',
+        None, None),
+    ('health_db', 'api.get_db_health', 'GET', lambda c, i: '/health/db', None, None),
+    ('cache_stats', 'api.get_cache_stats', 'GET', lambda c, i: '/cache/stats', None, None),
+    ('metrics', 'api.get_metrics', 'GET', lambda c, i: '/metrics', None, None),
+    ('swagger', 'swagger.get_swagger', 'GET', lambda c, i: '/swagger.json', None, None),
+    ('add_person', 'api.add_person', 'POST', lambda c, i: '/people',
+        lambda c, i: {'name': f'b{c.tag}-{i}', 'gender': 'male', 'height': 170}, _remember('people')),
+    ('update_person', 'api.update_person', 'PUT', lambda c, i: f'/people/{c.person()}',
+        lambda c, i: {'mass': i % 200}, None),
+    ('remove_person', 'api.remove_person', 'DELETE', _created_path('people', '/people/{}'), None, None),
+    ('add_planet', 'api.add_planet', 'POST', lambda c, i: '/planet',
+        lambda c, i: {'name': f'b{c.tag}-{i}', 'climate': 'arid'}, _remember('planets')),
+    ('update_planet', 'api.update_planet', 'PUT', lambda c, i: f'/planet/{c.planet()}',
+        lambda c, i: {'population': i}, None),
+    ('remove_planet', 'api.remove_planet', 'DELETE', _created_path('planets', '/planet/{}'), None, None),
+    ('add_favorite_person', 'api.add_favorite_person', 'POST', _favorite_pair('people'), None, None),
+    ('remove_favorite_person', 'api.remove_favorite_person', 'DELETE', _favorite_pair('people'), None, None),
+    ('add_favorite_planet', 'api.add_favorite_planet', 'POST', _favorite_pair('planet'), None, None),
+    ('remove_favorite_planet', 'api.remove_favorite_planet', 'DELETE', _favorite_pair('planet'), None, None),
+    ('bulk_create_people', 'api.bulk_people', 'POST', lambda c, i: '/people/bulk',
+        lambda c, i: [{'name': f'k{c.tag}-{i}-{j}'} for j in range(100)], _remember('people')),
+    ('bulk_update_people', 'api.bulk_people', 'PUT', lambda c, i: '/people/bulk',
+        lambda c, i: [{'id': c.person(), 'mass': j} for j in range(100)], None),
+    ('bulk_create_planets', 'api.bulk_planets', 'POST', lambda c, i: '/planets/bulk',
+        lambda c, i: [{'name': f'k{c.tag}-{i}-{j}'} for j in range(100)], _remember('planets')),
+    ('bulk_update_planets', 'api.bulk_planets', 'PUT', lambda c, i: '/planets/bulk',
+        lambda c, i: [{'id': c.planet(), 'diameter': j} for j in range(100)], None),
+    ('bulk_delete_people', 'api.bulk_people', 'DELETE', lambda c, i: '/people/bulk',
+        lambda c, i: [c.pop_created('people') for _ in range(100)], None),
+    ('bulk_delete_planets', 'api.bulk_planets', 'DELETE', lambda c, i: '/planets/bulk',
+        lambda c, i: [c.pop_created('planets') for _ in range(100)], None)
+]
+
+
+class ClientDriver:
+    """Runs requests in-process through the Flask test client."""
+
+    def __init__(self, app, engine):
+        from sqlalchemy import event
+        self.client = app.test_client()
+        self.queries = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.queries += 1
+
+    def request(self, method, path, body):
+        before = self.queries
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_data(), self.queries - before
+
+    def peak_rss_kb(self):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class GunicornDriver:
+    """Starts gunicorn on a free port and sends real HTTP requests to it."""
+
+    def __init__(self, database_url, workers, threads, asgi=False):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+        env = dict(os.environ, DATABASE_URL=database_url)
+        if asgi:
+            app_args = ['asgi:application', '-k', 'uvicorn.workers.UvicornWorker']
+        else:
+            app_args = ['wsgi', '--threads', str(threads)]
+        self.process = subprocess.Popen(
+            ['gunicorn', *app_args, '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '--chdir', SRC,
+             '-b', f'127.0.0.1:{self.port}', '-w', str(workers), '--log-level', 'warning'],
+            env=env
+        )
+        # The async views are not profiled, so /metrics would undercount them
+        self.counts_queries = not asgi
+        self.local = threading.local()
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            try:
+                self.request('GET', '/health/db', None)
+                return
+            except OSError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError('gunicorn did not start')
+
+    def request(self, method, path, body):
+        if not hasattr(self.local, 'connection'):
+            self.local.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        try:
+            self.local.connection.request(method, path, body=payload, headers=headers)
+            response = self.local.connection.getresponse()
+            return response.status, response.read(), None
+        except (http.client.HTTPException, ConnectionError):
+            del self.local.connection
+            raise OSError('connection lost')
+
+    def query_totals(self):
+        """SQL statements per endpoint from the /metrics of the (single) worker."""
+        _, body, _ = self.request('GET', '/metrics', None)
+        totals = {}
+        for line in body.decode().splitlines():
+            if line.startswith('api_db_queries_total{'):
+                labels, value = line[len('api_db_queries_total{'):].split('} ')
+                endpoint = labels.split('"')[1]
+                totals[endpoint] = totals.get(endpoint, 0) + float(value)
+        return totals
+
+    def peak_rss_kb(self):
+        """VmHWM of the master and its workers (Linux only)."""
+        pids = [self.process.pid]
+        for entry in os.listdir('/proc'):
+            if entry.isdigit():
+                try:
+                    with open(f'/proc/{entry}/stat') as stat:
+                        if int(stat.read().rsplit(')', 1)[1].split()[1]) == self.process.pid:
+                            pids.append(int(entry))
+                except (OSError, IndexError, ValueError):
+                    pass
+        total = 0
+        for pid in pids:
+            try:
+                with open(f'/proc/{pid}/status') as status:
+                    for line in status:
+                        if line.startswith('VmHWM:'):
+                            total += int(line.split()[1])
+            except OSError:
+                pass
+        return total or None
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run_scenario(driver, catalog, scenario, iterations, concurrency):
+    name, endpoint, method, path_fn, body_fn, on_response = scenario
+    latencies, errors, queries = [], 0, []
+
+    def one(i):
+        path = path_fn(catalog, i)
+        if path is None:
+            return None
+        body = body_fn(catalog, i) if body_fn else None
+        start = time.perf_counter()
+        status, data, query_count = driver.request(method, path, body)
+        elapsed = time.perf_counter() - start
+        if on_response and status == 200:
+            on_response(catalog, json.loads(data))
+        return elapsed, status, query_count
+
+    totals_before = driver.query_totals() if getattr(driver, 'counts_queries', False) else None
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(one, range(iterations)))
+    else:
+        results = [one(i) for i in range(iterations)]
+    wall = time.perf_counter() - start
+
+    for result in results:
+        if result is None:
+            continue
+        elapsed, status, query_count = result
+        latencies.append(elapsed)
+        errors += int(status >= 500)
+        if query_count is not None:
+            queries.append(query_count)
+
+    if totals_before is not None and latencies:
+        delta = driver.query_totals().get(endpoint, 0) - totals_before.get(endpoint, 0)
+        queries = [delta / len(latencies)]
+
+    if not latencies:
+        return None
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'throughput_rps': round(len(latencies) / wall, 1),
+        'queries_per_request': round(statistics.mean(queries), 2) if queries else None
+    }
+
+def check_coverage(app):
+    """Warn about routes no scenario exercises."""
+    covered = {scenario[1] for scenario in SCENARIOS}
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint not in covered and rule.endpoint != 'static' and not rule.rule.startswith('/admin'):
+            print(f'warning: no benchmark scenario for {rule.rule} ({rule.endpoint})', file=sys.stderr)
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    regressions = []
+    for name, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(name)
+        if not previous:
+            continue
+        # Rounded, since one-off statements (first version bump, cache fills) shift the mean a little
+        if current['queries_per_request'] is not None and previous.get('queries_per_request') is not None \
+                and round(current['queries_per_request']) > round(previous['queries_per_request']):
+            regressions.append(f'{name}: {previous["queries_per_request"]} -> {current["queries_per_request"]} queries')
+        if current['p99_ms'] > previous['p99_ms'] * (1 + tolerance) + min_delta_ms:
+            regressions.append(f'{name}: p99 {previous["p99_ms"]} -> {current["p99_ms"]} ms')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='1k')
+    parser.add_argument('--database-url', help='defaults to a SQLite file per size in the temp dir')
+    parser.add_argument('--mode', choices=('client', 'gunicorn', 'asgi'), default='client')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads in gunicorn and asgi modes')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers (query counts need 1)')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p99 growth, 0.25 = 25%%')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                        help='p99 growth in ms always ignored, so fast routes do not flap')
+    parser.add_argument('--output', help='also write the results JSON here')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f'sqlite:///{tempfile.gettempdir()}/bench_{args.size}.db'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SLOW_QUERY_MS', '10000')
+    if args.no_cache:
+        os.environ['CACHE_TTL'] = '0'
+
+    from app import create_app
+    from models import db
+
+    app = create_app({'MIGRATIONS': False})
+
+    people, planets, users, favorites = SIZES[args.size]
+    with app.app_context():
+        start = time.perf_counter()
+        if seed(db.engine, db.metadata, people, planets, users, favorites):
+            print(f'seeded {args.size} catalog in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+        engine = db.engine
+    check_coverage(app)
+
+    if args.mode == 'client':
+        driver, concurrency = ClientDriver(app, engine), 1
+    else:
+        driver = GunicornDriver(database_url, args.workers, args.concurrency, asgi=args.mode == 'asgi')
+        concurrency = args.concurrency
+
+    catalog = Catalog(people, planets, users)
+    results = {'size': args.size, 'mode': args.mode, 'database': database_url.split(':')[0], 'routes': {}}
+    try:
+        for scenario in SCENARIOS:
+            iterations = max(1, args.requests // 20) if scenario[0].startswith('bulk_') else args.requests
+            result = run_scenario(driver, catalog, scenario, iterations, concurrency)
+            if result is not None:
+                results['routes'][scenario[0]] = result
+        results['peak_rss_kb'] = driver.peak_rss_kb()
+    finally:
+        if isinstance(driver, GunicornDriver):
+            driver.close()
+
+    print(f'{"route":<26}{"p50 ms":>10}{"p99 ms":>10}{"req/s":>10}{"queries":>9}{"errors":>8}')
+    for name, result in results['routes'].items():
+        queries = '-' if result['queries_per_request'] is None else result['queries_per_request']
+        print(f'{name:<26}{result["p50_ms"]:>10}{result["p99_ms"]:>10}{result["throughput_rps"]:>10}'
+              f'{queries:>9}{result["errors"]:>8}')
+    print(f'peak RSS: {results["peak_rss_kb"]} kB')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baselines = json.load(baseline_file)
+    key = f'{args.mode}-{args.size}-{results["database"]}'
+
+    if args.update_baseline:
+        baselines[key] = results
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f'baseline {key} updated')
+        return 0
+
+    if key not in baselines:
+        print(f'no baseline for {key}, run with --update-baseline to create it')
+        return 0
+    regressions = compare(results, baselines[key], args.tolerance, args.min_delta_ms)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Fill a database with a deterministic catalog for the benchmarks.
+
+Works on any URL SQLAlchemy understands (SQLite file, Postgres, MySQL). Rows
+are inserted with batched executemany, so even the 1M preset seeds in minutes.
+"""
+import random
+from sqlalchemy import func, insert, inspect, select, text
+from favorites import recount_favorites
+
+SIZES = {
+    # preset: (people, planets, users, favorites)
+    '1k': (1_000, 100, 100, 1_000),
+    '100k': (100_000, 10_000, 10_000, 100_000),
+    '1M': (1_000_000, 100_000, 100_000, 1_000_000)
+}
+BATCH = 10_000
+GENDERS = ('male', 'female', None)
+CLIMATES = ('arid', 'temperate', 'frozen', 'murky', 'tropical')
+TERRAINS = ('desert', 'grasslands', 'mountains', 'jungle', 'ocean')
+
+
+def _insert_batches(connection, table, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            connection.execute(insert(table), batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+
+def _favorites(rng, people, planets, users, favorites):
+    """Unique (user, item) pairs, half people and half planets."""
+    seen = set()
+    while len(seen) < favorites:
+        user_id = rng.randint(1, users)
+        if rng.random() < 0.5:
+            key = (user_id, rng.randint(1, people), None)
+        else:
+            key = (user_id, None, rng.randint(1, planets))
+        if key not in seen:
+            seen.add(key)
+            yield {'user_id': key[0], 'people_id': key[1], 'planet_id': key[2]}
+
+def current_counts(connection, tables):
+    return tuple(
+        connection.execute(select(func.count()).select_from(tables[name])).scalar()
+        for name in ('people', 'planets', 'users', 'favorite_items')
+    )
+
+def columns_match(engine, metadata):
+    """Whether every table has the columns of models.py (an older seed may not)."""
+    inspector = inspect(engine)
+    return all(
+        {column['name'] for column in inspector.get_columns(table.name)} == set(table.columns.keys())
+        for table in metadata.sorted_tables
+    )
+
+def seed(engine, metadata, people, planets, users, favorites, seed_value=42):
+    """Create the schema and load the catalog, unless it already has these sizes."""
+    metadata.create_all(engine)
+    tables = metadata.tables
+    if columns_match(engine, metadata):
+        with engine.begin() as connection:
+            if current_counts(connection, tables) == (people, planets, users, favorites):
+                return False
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    rng = random.Random(seed_value)
+    with engine.begin() as connection:
+        _insert_batches(connection, tables['planets'], (
+            {
+                'id': i,
+                'name': f'planet-{i}',
+                'diameter': rng.randint(1_000, 200_000),
+                'climate': rng.choice(CLIMATES),
+                'population': rng.randint(0, 10 ** 9),
+                'terrain': rng.choice(TERRAINS),
+                'url': f'https://swapi.dev/api/planets/{i}/'
+            }
+            for i in range(1, planets + 1)
+        ))
+        _insert_batches(connection, tables['people'], (
+            {
+                'id': i,
+                'name': f'person-{i}',
+                'gender': rng.choice(GENDERS),
+                'height': rng.randint(60, 250),
+                'mass': rng.randint(20, 200),
+                'planet_id': rng.randint(1, planets),
+                'url': f'https://swapi.dev/api/people/{i}/'
+            }
+            for i in range(1, people + 1)
+        ))
+        _insert_batches(connection, tables['users'], (
+            {
+                'id': i,
+                'user_name': f'user-{i}',
+                'email': f'user-{i}@example.com',
+                'password': 'benchmark',
+                'is_active': True
+            }
+            for i in range(1, users + 1)
+        ))
+        _insert_batches(connection, tables['favorite_items'], _favorites(rng, people, planets, users, favorites))
+        recount_favorites(connection)
+
+        if engine.dialect.name == 'postgresql':
+            # Ids were given explicitly, so move the sequences past them
+            for name in ('planets', 'people', 'users'):
+                connection.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), (SELECT MAX(id) FROM {name}))"
+                ))
+    return True
@@ -0,0 +1,80 @@
+"""
+Micro-benchmark of the list serialization paths.
+
+    python benchmarks/serialization.py --size 100k --rows 1000
+
+Compares, for one page of people and one of planets:
+  orm       ORM instances + Model.serialize() + Flask's json encoder (the old path)
+  rows      Core select of public_fields + rows_to_dicts + Flask's json encoder
+  orjson    same rows with the orjson fast path (skipped if orjson is missing)
+and checks that every path produces byte-identical response bodies.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import SIZES, seed  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='1k')
+    parser.add_argument('--database-url')
+    parser.add_argument('--rows', type=int, default=1000, help='rows per page')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{tempfile.gettempdir()}/bench_{args.size}.db'
+    os.environ['PROFILING'] = '0'
+
+    from sqlalchemy import select
+    from app import create_app
+    from models import db, People, Planet
+    import serializers
+
+    app = create_app({'MIGRATIONS': False})
+    with app.app_context():
+        seed(db.engine, db.metadata, *SIZES[args.size])
+
+    def orm_body(model):
+        items = [item.serialize() for item in model.query.order_by(model.id).limit(args.rows)]
+        return app.json.response({'data': items}).get_data()
+
+    def rows_body(model):
+        fields = model.public_fields
+        rows = db.session.execute(
+            select(*[getattr(model, field) for field in fields]).order_by(model.id).limit(args.rows)
+        )
+        return app.json.response({'data': serializers.rows_to_dicts(fields, rows)}).get_data()
+
+    print(f'{"model":<8}{"path":<8}{"ms/page":>10}{"rows/s":>12}{"bytes":>10}')
+    with app.test_request_context():
+        for model in (People, Planet):
+            paths = [('orm', orm_body, False), ('rows', rows_body, False)]
+            if serializers.orjson is not None:
+                paths.append(('orjson', rows_body, True))
+
+            bodies = {}
+            for name, body, use_orjson in paths:
+                app.json.use_orjson = use_orjson
+                bodies[name] = body(model)
+                db.session.remove()
+                seconds = min(timeit.repeat(lambda: (body(model), db.session.remove()), number=1, repeat=args.repeat))
+                print(f'{model.__tablename__:<8}{name:<8}{seconds * 1000:>10.2f}'
+                      f'{args.rows / seconds:>12.0f}{len(bodies[name]):>10}')
+            app.json.use_orjson = False
+
+            if len(set(bodies.values())) != 1:
+                print(f'MISMATCH: {model.__tablename__} bodies differ between paths')
+                return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Cold start of a worker: how long a fresh process takes to import the app, build
+it with ``create_app`` and answer its first requests.
+
+    python benchmarks/startup.py --size 1k
+    python benchmarks/startup.py --runs 20 --output startup.json
+
+Each run is a new interpreter, so nothing is cached between runs. Three setups
+are measured:
+
+- ``cli``       what ``flask`` loads: Flask-Migrate included
+- ``server``    what wsgi.py / asgi.py load (``MIGRATIONS=False``)
+- ``api-only``  ``server`` with ``ENABLE_ADMIN=0`` and ``ENABLE_SWAGGER=0``
+
+and for each one the median of: interpreter start to ``from app import
+create_app`` done (import), ``create_app`` (create), the first ``GET /people``
+and the first ``GET /admin/`` (built on demand). ``total`` is the wall time
+of the whole process, interpreter start and exit included.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, 'src')
+sys.path.insert(0, SRC)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from seed import SIZES  # noqa: E402
+
+# name -> (create_app config, environment)
+SETUPS = {
+    'cli': ({}, {}),
+    'server': ({'MIGRATIONS': False}, {}),
+    'api-only': ({'MIGRATIONS': False}, {'ENABLE_ADMIN': '0', 'ENABLE_SWAGGER': '0'})
+}
+
+# Runs in the child; times are milliseconds since the interpreter started
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {src!r})
+from app import create_app
+imported = time.perf_counter()
+app = create_app({config!r})
+created = time.perf_counter()
+client = app.test_client()
+status = client.get('/people').status_code
+first = time.perf_counter()
+admin = None
+if app.config['ENABLE_ADMIN']:
+    client.get('/admin/')
+    admin = round((time.perf_counter() - first) * 1000, 1)
+print(json.dumps({{
+    'import_ms': round((imported - started) * 1000, 1),
+    'create_ms': round((created - imported) * 1000, 1),
+    'first_request_ms': round((first - created) * 1000, 1),
+    'first_admin_ms': admin,
+    'status': status
+}}))
+'''
+
+
+def measure(setup, runs, env):
+    config, setup_env = SETUPS[setup]
+    child_env = dict(env, **setup_env)
+    code = CHILD.format(src=SRC, config=config)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', code], env=child_env, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f'{setup} failed:\n{process.stderr}')
+        sample = json.loads(process.stdout.splitlines()[-1])
+        # Interpreter start and exit included
+        sample['total_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        samples.append(sample)
+
+    result = {}
+    for key in ('import_ms', 'create_ms', 'first_request_ms', 'first_admin_ms', 'total_ms'):
+        values = [sample[key] for sample in samples if sample[key] is not None]
+        result[key] = round(statistics.median(values), 1) if values else None
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=sorted(SIZES), default='1k')
+    parser.add_argument('--database-url', help='defaults to the SQLite file run.py seeds for --size')
+    parser.add_argument('--runs', type=int, default=10, help='processes per setup')
+    parser.add_argument('--output', help='also write the results JSON here')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f'sqlite:///{tempfile.gettempdir()}/bench_{args.size}.db'
+    env = dict(os.environ, DATABASE_URL=database_url)
+
+    results = {setup: measure(setup, args.runs, env) for setup in SETUPS}
+
+    print(f'{"setup":<12}{"import ms":>11}{"create ms":>11}{"1st req ms":>12}{"1st admin":>11}{"total ms":>10}')
+    for setup, result in results.items():
+        admin = '-' if result['first_admin_ms'] is None else result['first_admin_ms']
+        print(f'{setup:<12}{result["import_ms"]:>11}{result["create_ms"]:>11}{result["first_request_ms"]:>12}'
+              f'{admin:>11}{result["total_ms"]:>10}')
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings, read from the directory gunicorn is started in (see Procfile).
+
+With ``preload_app`` the master imports the app once and forks the workers
+from it, so they share its memory and start without importing anything.
+Connections the master opened while loading (the leaderboard warm-up) are
+dropped in each worker, never shared across processes, and each worker starts
+its own write-behind flusher (see writebehind.py).
+
+    GUNICORN_PRELOAD  0 to load the app in every worker instead (default 1)
+"""
+import os
+import sys
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# Entry point module -> its Flask app, see wsgi.py and asgi.py
+FLASK_APPS = {'wsgi': 'application', 'asgi': 'flask_app'}
+
+
+def post_fork(server, worker):
+    for module_name, attribute in FLASK_APPS.items():
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        from models import db
+        with getattr(module, attribute).app_context():
+            # close=False: the connections belong to the master, only forget them
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+    writebehind = sys.modules.get('writebehind')
+    if writebehind is not None:
+        writebehind.write_behind.start()
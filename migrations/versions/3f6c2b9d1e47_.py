@@ -0,0 +1,88 @@
+"""create the tables declared in models.py
+
+Revision ID: 3f6c2b9d1e47
+Revises: a5cffa318ac2
+Create Date: 2026-10-18 10:12:31.408113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6c2b9d1e47'
+down_revision = 'a5cffa318ac2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The first revision created a `user` table that no model maps to
+    op.drop_table('user')
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_name', sa.String(length=25), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=80), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('user_name')
+    )
+    op.create_table('planets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=25), nullable=False),
+    sa.Column('diameter', sa.Integer(), nullable=True),
+    sa.Column('climate', sa.String(length=25), nullable=True),
+    sa.Column('population', sa.Integer(), nullable=True),
+    sa.Column('terrain', sa.String(length=25), nullable=True),
+    sa.Column('url', sa.String(length=255), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('people',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=25), nullable=False),
+    sa.Column('gender', sa.Enum('male', 'female', name='gender_enum'), nullable=True),
+    sa.Column('height', sa.Integer(), nullable=True),
+    sa.Column('mass', sa.Integer(), nullable=True),
+    sa.Column('planet_id', sa.Integer(), nullable=True),
+    sa.Column('url', sa.String(length=255), nullable=True),
+    sa.ForeignKeyConstraint(['planet_id'], ['planets.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('favorite_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('planet_id', sa.Integer(), nullable=True),
+    sa.Column('people_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['people_id'], ['people.id'], ),
+    sa.ForeignKeyConstraint(['planet_id'], ['planets.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+
+
+def downgrade():
+    op.drop_table('table_versions')
+    op.drop_table('favorite_items')
+    op.drop_table('people')
+    sa.Enum(name='gender_enum').drop(op.get_bind(), checkfirst=True)
+    op.drop_table('planets')
+    op.drop_table('users')
+
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=80), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
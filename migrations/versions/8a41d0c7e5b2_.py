@@ -0,0 +1,43 @@
+"""indexes and unique keys for the favorites access paths
+
+Revision ID: 8a41d0c7e5b2
+Revises: 3f6c2b9d1e47
+Create Date: 2026-10-18 10:47:05.922871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a41d0c7e5b2'
+down_revision = '3f6c2b9d1e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep the oldest row of any repeated favorite so the unique keys can be created
+    for column in ('people_id', 'planet_id'):
+        op.execute(
+            f'DELETE FROM favorite_items WHERE {column} IS NOT NULL AND id NOT IN ('
+            f'SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorite_items '
+            f'WHERE {column} IS NOT NULL GROUP BY user_id, {column}) AS keep)'
+        )
+
+    # (user_id, ...) also serves the "favorites of a user" lookups
+    with op.batch_alter_table('favorite_items') as batch_op:
+        batch_op.create_unique_constraint('uq_favorite_items_user_people', ['user_id', 'people_id'])
+        batch_op.create_unique_constraint('uq_favorite_items_user_planet', ['user_id', 'planet_id'])
+    op.create_index('ix_favorite_items_people_id', 'favorite_items', ['people_id'], unique=False)
+    op.create_index('ix_favorite_items_planet_id', 'favorite_items', ['planet_id'], unique=False)
+    op.create_index('ix_people_planet_id', 'people', ['planet_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_people_planet_id', table_name='people')
+    op.drop_index('ix_favorite_items_planet_id', table_name='favorite_items')
+    op.drop_index('ix_favorite_items_people_id', table_name='favorite_items')
+    with op.batch_alter_table('favorite_items') as batch_op:
+        batch_op.drop_constraint('uq_favorite_items_user_planet', type_='unique')
+        batch_op.drop_constraint('uq_favorite_items_user_people', type_='unique')
@@ -0,0 +1,66 @@
+"""ON DELETE CASCADE / SET NULL on the favorites and people foreign keys
+
+Revision ID: b7d2f95c0a13
+Revises: e61b4d93a8f2
+Create Date: 2026-10-18 18:02:44.105238
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2f95c0a13'
+down_revision = 'e61b4d93a8f2'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, ON DELETE)
+FOREIGN_KEYS = [
+    ('people', 'planet_id', 'planets', 'SET NULL'),
+    ('favorite_items', 'user_id', 'users', 'CASCADE'),
+    ('favorite_items', 'planet_id', 'planets', 'CASCADE'),
+    ('favorite_items', 'people_id', 'people', 'CASCADE'),
+]
+
+# The first migration left the foreign keys unnamed: SQLite reports no name,
+# batch mode finds them by this convention instead
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+
+
+def _constraint_name(table, column, referred):
+    for foreign_key in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if foreign_key['constrained_columns'] == [column]:
+            return foreign_key['name'] or f'fk_{table}_{column}_{referred}'
+    return None
+
+def _replace_foreign_keys(ondelete):
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        # Batch mode recreates the tables: dropping the old copy must not fire
+        # the cascades nor fail on the rows still pointing at it
+        op.execute('PRAGMA foreign_keys=OFF')
+
+    for table in ('people', 'favorite_items'):
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for fk_table, column, referred, action in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                name = _constraint_name(table, column, referred)
+                if name is not None:
+                    batch_op.drop_constraint(name, type_='foreignkey')
+                batch_op.create_foreign_key(
+                    f'fk_{table}_{column}_{referred}', referred, [column], ['id'],
+                    ondelete=action if ondelete else None
+                )
+
+    if sqlite:
+        op.execute('PRAGMA foreign_keys=ON')
+
+
+def upgrade():
+    _replace_foreign_keys(ondelete=True)
+
+
+def downgrade():
+    _replace_foreign_keys(ondelete=False)
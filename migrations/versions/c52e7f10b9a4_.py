@@ -0,0 +1,48 @@
+"""indexes for the people and planets filters and name search
+
+Revision ID: c52e7f10b9a4
+Revises: 8a41d0c7e5b2
+Create Date: 2026-10-18 12:03:44.160257
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52e7f10b9a4'
+down_revision = '8a41d0c7e5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_people_gender', 'people', ['gender'], unique=False)
+    op.create_index('ix_people_height', 'people', ['height'], unique=False)
+    op.create_index('ix_people_mass', 'people', ['mass'], unique=False)
+    op.create_index('ix_planets_climate', 'planets', ['climate'], unique=False)
+    op.create_index('ix_planets_terrain', 'planets', ['terrain'], unique=False)
+    op.create_index('ix_planets_diameter', 'planets', ['diameter'], unique=False)
+    op.create_index('ix_planets_population', 'planets', ['population'], unique=False)
+
+    # Trigram indexes serve both ?name_prefix= and ?q= (ILIKE) on Postgres
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_people_name_trgm', 'people', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index('ix_planets_name_trgm', 'planets', ['name'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_planets_name_trgm', table_name='planets')
+        op.drop_index('ix_people_name_trgm', table_name='people')
+
+    op.drop_index('ix_planets_population', table_name='planets')
+    op.drop_index('ix_planets_diameter', table_name='planets')
+    op.drop_index('ix_planets_terrain', table_name='planets')
+    op.drop_index('ix_planets_climate', table_name='planets')
+    op.drop_index('ix_people_mass', table_name='people')
+    op.drop_index('ix_people_height', table_name='people')
+    op.drop_index('ix_people_gender', table_name='people')
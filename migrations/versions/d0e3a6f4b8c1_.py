@@ -0,0 +1,25 @@
+"""per-user favorites version for the favorites and profile ETags
+
+Revision ID: d0e3a6f4b8c1
+Revises: b7d2f95c0a13
+Create Date: 2026-10-18 21:40:12.630518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd0e3a6f4b8c1'
+down_revision = 'b7d2f95c0a13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('favorites_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('favorites_version')
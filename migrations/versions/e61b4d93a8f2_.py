@@ -0,0 +1,56 @@
+"""denormalized favorites counters on users, people and planets
+
+Revision ID: e61b4d93a8f2
+Revises: c52e7f10b9a4
+Create Date: 2026-10-18 16:21:07.482913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e61b4d93a8f2'
+down_revision = 'c52e7f10b9a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('favorite_people_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('users', sa.Column('favorite_planets_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('people', sa.Column('favorited_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('planets', sa.Column('favorited_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the favorites that already exist
+    op.execute(
+        'UPDATE users SET '
+        'favorite_people_count = (SELECT COUNT(*) FROM favorite_items '
+        'WHERE favorite_items.user_id = users.id AND favorite_items.people_id IS NOT NULL), '
+        'favorite_planets_count = (SELECT COUNT(*) FROM favorite_items '
+        'WHERE favorite_items.user_id = users.id AND favorite_items.planet_id IS NOT NULL)'
+    )
+    op.execute(
+        'UPDATE people SET favorited_count = '
+        '(SELECT COUNT(*) FROM favorite_items WHERE favorite_items.people_id = people.id)'
+    )
+    op.execute(
+        'UPDATE planets SET favorited_count = '
+        '(SELECT COUNT(*) FROM favorite_items WHERE favorite_items.planet_id = planets.id)'
+    )
+
+    op.create_index('ix_people_favorited_count', 'people', ['favorited_count'], unique=False)
+    op.create_index('ix_planets_favorited_count', 'planets', ['favorited_count'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_planets_favorited_count', table_name='planets')
+    op.drop_index('ix_people_favorited_count', table_name='people')
+
+    with op.batch_alter_table('planets') as batch_op:
+        batch_op.drop_column('favorited_count')
+    with op.batch_alter_table('people') as batch_op:
+        batch_op.drop_column('favorited_count')
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('favorite_planets_count')
+        batch_op.drop_column('favorite_people_count')
@@ -1,19 +1,132 @@
 import os
+from flask import Flask
 from flask_admin import Admin
 from models import db, User, People, Planet, FavoriteItem
+from versioning import bump_versions
+from dialects import estimated_count
+from cache import response_cache
+from leaderboard import leaderboard
+from favorites import forget_favorites, forget_user_favorites, remove_favorite
 from flask_admin.contrib.sqla import ModelView
 
-def setup_admin(app):
+
+class CatalogModelView(ModelView):
+    """
+    ModelView for big tables: no COUNT(*) per page (the pager uses the planner's
+    row estimate when there is one, otherwise only next/previous), related rows
+    joined into the list query, and filters, search and sorting only on indexed
+    columns. Relationship fields in the forms are searched with AJAX instead of
+    loading every row into a select.
+
+    Writes keep the favorites counters, the leaderboard and the response cache
+    in step like the API handlers do.
+    """
+    simple_list_pager = True
+    page_size = 50
+    can_set_page_size = False
+    column_default_sort = 'id'
+    # Response cache resource and favorites kind of the model, if any
+    cache_resource = None
+    favorite_kind = None
+
+    def get_list(self, page, sort_column, sort_desc, search, filters, execute=True, page_size=None):
+        count, query = ModelView.get_list(self, page, sort_column, sort_desc, search, filters,
+                                          execute=execute, page_size=page_size)
+        if count is None and not search and not filters:
+            count = estimated_count(self.model.__tablename__)
+        return count, query
+
+    def on_model_delete(self, model):
+        if self.favorite_kind is not None:
+            forget_favorites(self.favorite_kind, [model.id])
+
+    def after_model_change(self, form, model, is_created):
+        self._changed(model)
+
+    def after_model_delete(self, model):
+        self._changed(model)
+
+    def _changed(self, model):
+        if self.cache_resource is not None:
+            response_cache.invalidate(self.cache_resource, model.id)
+        if self.favorite_kind is not None:
+            leaderboard.mark_stale(self.favorite_kind)
+
+
+class UserView(CatalogModelView):
+    column_list = ('id', 'user_name', 'email', 'is_active', 'favorite_people_count', 'favorite_planets_count')
+    column_sortable_list = ('id', 'user_name', 'email')
+    column_searchable_list = ('user_name', 'email')
+    form_excluded_columns = ('favorites', 'favorite_people_count', 'favorite_planets_count')
+
+    def on_model_delete(self, model):
+        forget_user_favorites([model.id])
+
+class PeopleView(CatalogModelView):
+    cache_resource = 'people'
+    favorite_kind = 'people'
+    column_list = ('id', 'name', 'gender', 'height', 'mass', 'planet', 'favorited_count')
+    column_select_related_list = ('planet',)
+    column_sortable_list = ('id', 'name', 'gender', 'height', 'mass', 'favorited_count')
+    column_searchable_list = ('name',)
+    column_filters = ('gender', 'height', 'mass', 'favorited_count')
+    form_excluded_columns = ('favorite_item', 'favorited_count')
+    form_ajax_refs = {'planet': {'fields': ('name',), 'page_size': 10}}
+
+class PlanetView(CatalogModelView):
+    cache_resource = 'planets'
+    favorite_kind = 'planet'
+    column_list = ('id', 'name', 'diameter', 'climate', 'population', 'terrain', 'favorited_count')
+    column_sortable_list = ('id', 'name', 'diameter', 'climate', 'population', 'terrain', 'favorited_count')
+    column_searchable_list = ('name',)
+    column_filters = ('climate', 'terrain', 'diameter', 'population', 'favorited_count')
+    form_excluded_columns = ('habitant', 'favorite_item', 'favorited_count')
+
+    def on_model_delete(self, model):
+        CatalogModelView.on_model_delete(self, model)
+        # Its people lose planet_id in the database (ON DELETE SET NULL), out of the session's sight
+        bump_versions(People.__tablename__)
+
+    def after_model_delete(self, model):
+        CatalogModelView.after_model_delete(self, model)
+        response_cache.invalidate('people')
+
+class FavoriteItemView(CatalogModelView):
+    # Favorites are created through the API, which keeps the counters
+    can_create = False
+    can_edit = False
+    column_list = ('id', 'user', 'people', 'planet')
+    column_select_related_list = ('user', 'people', 'planet')
+    column_sortable_list = ('id',)
+    column_filters = ('user_id', 'people_id', 'planet_id')
+
+    def delete_model(self, model):
+        if model.people_id is not None:
+            remove_favorite(model.user_id, 'people', model.people_id)
+        else:
+            remove_favorite(model.user_id, 'planet', model.planet_id)
+        return True
+
+
+def setup_admin(app, url=None):
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
-    admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
+    admin = Admin(app, name='4Geeks Admin', url=url, template_mode='bootstrap3')
 
     
     # Add your models here, for example this is how we add a the User model to the admin
-    admin.add_view(ModelView(User, db.session))
-    admin.add_view(ModelView(People, db.session))
-    admin.add_view(ModelView(Planet, db.session))
-    admin.add_view(ModelView(FavoriteItem, db.session))
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(PeopleView(People, db.session))
+    admin.add_view(PlanetView(Planet, db.session))
+    admin.add_view(FavoriteItemView(FavoriteItem, db.session))
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, db.session))
+
+def create_admin_app(config):
+    """The admin as an app of its own, mounted under /admin by ``app.LazyAdmin``."""
+    app = Flask(__name__, static_folder=None)
+    app.config.update(config)
+    db.init_app(app)
+    setup_admin(app, url='/')
+    return app
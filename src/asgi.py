@@ -0,0 +1,201 @@
+"""
+Async entry point: the same API served by an ASGI server.
+
+    pipenv run start-async
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker --chdir ./src/
+
+The sync mode (``gunicorn wsgi``, Procfile) is unchanged.
+
+The hot read endpoints (GET /people, /people/<id>, /planets, /planets/<id>,
+/users and /user/<id>/favorites) run on an async SQLAlchemy engine, so one
+process keeps many requests waiting on the database at the same time. They
+build the same statements as the Flask views and answer with the same bodies,
+status codes and ETags, compressed the same way (see compression.py).
+Everything else (writes, streaming, columnar pages, ``?ids=`` and ``?expand=``,
+admin, /metrics...) is handed to the Flask app in a thread, so both modes serve
+the same routes.
+With ``FAVORITES_WRITE_BEHIND=1`` the favorites of a user with pending changes
+are also answered by Flask, which overlays them.
+
+The async stack is optional and left out of the Pipfile, like orjson and
+brotli: ``pip install starlette uvicorn a2wsgi`` and the driver matching
+``DATABASE_URL`` (asyncpg, aiosqlite or aiomysql, see db_config.py). The
+async engine uses that driver and the same ``DB_*`` pool variables; each of
+``DATABASE_REPLICA_URLS`` gets one too (see replicas.py). The
+response cache and the per-request profiling only apply to the Flask views.
+"""
+from contextlib import asynccontextmanager
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+try:
+    from a2wsgi import WSGIMiddleware
+    from starlette.applications import Starlette
+    from starlette.requests import Request
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+except ImportError as error:
+    raise ImportError(f'{error.name} is missing, the async mode needs: pip install starlette uvicorn a2wsgi') from error
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+from app import create_app
+from compression import compression
+from db_config import async_database_url, async_engine_options_from_env
+from dialects import NULLS_HIGH_DIALECTS
+from favorites import favorites_versions_query, favorites_etag_from_rows
+from models import User, People, Planet
+from pagination import page_query
+from serializers import COMPACT_SEPARATORS, COLUMNAR, one_query, row_to_dict, favorites_query, favorite_row_items
+from streaming import NDJSON
+from utils import APIException
+from versioning import versions_query, etag_from_rows
+from writebehind import write_behind
+from replicas import replicas
+
+flask_app = create_app({'MIGRATIONS': False})
+db_url = flask_app.config['SQLALCHEMY_DATABASE_URI']
+engine = create_async_engine(async_database_url(db_url), **async_engine_options_from_env(db_url))
+replica_engines = {
+    key: create_async_engine(async_database_url(bind['url']), **async_engine_options_from_env(bind['url']))
+    for key, bind in flask_app.config['SQLALCHEMY_BINDS'].items() if key in replicas.keys
+}
+flask_wsgi = WSGIMiddleware(flask_app)
+
+
+def json_response(body, status_code=200, etag=None, request=None):
+    # Flask's provider, so bodies are byte-identical to the sync views
+    content = (flask_app.json.dumps(body, separators=COMPACT_SEPARATORS) + '\n').encode()
+    coding = compression.negotiate(request.headers.get('accept-encoding')) if request is not None else None
+    headers = {'Vary': 'Accept-Encoding'}
+    if coding is not None and len(content) >= compression.min_bytes:
+        content = compression.compress(content, coding)
+        headers['Content-Encoding'] = coding
+    response = Response(content, status_code=status_code, headers=headers, media_type='application/json')
+    if etag is not None and status_code == 200:
+        response.headers['ETag'] = quote_etag(etag)
+    if request is not None and 'origin' in request.headers:
+        response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+def full_path(request):
+    return f'{request.url.path}?{request.scope.get("query_string", b"").decode("latin-1")}'
+
+def wants_stream(request):
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    if accept.best_match(['application/json', NDJSON]) == NDJSON:
+        return True
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def wants_columnar(request):
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    return accept.best_match(['application/json', COLUMNAR]) == COLUMNAR
+
+def flask_only(request):
+    """Features only the Flask views have."""
+    params = request.query_params
+    return wants_stream(request) or wants_columnar(request) or 'ids' in params or 'expand' in params
+
+class AsyncView:
+    """
+    Async counterpart of ``versioning.conditional``: answers with ``view(request,
+    connection)`` unless ``If-None-Match`` still matches the version of ``tables``.
+    Streaming, columnar, ``?ids=`` and ``?expand=`` requests go to the Flask
+    view, as do the ones ``to_flask(request)`` picks. Reads go to a replica like in the
+    Flask views, unless ``on_primary(request)``. ``suffix(request, connection)``
+    plays the part of the ``suffix`` of ``conditional``.
+    """
+
+    def __init__(self, tables, view, to_flask=None, on_primary=None, suffix=None):
+        self.tables = tables
+        self.view = view
+        self.to_flask = to_flask
+        self.on_primary = on_primary
+        self.suffix = suffix
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if flask_only(request) or (self.to_flask is not None and self.to_flask(request)):
+            await flask_wsgi(scope, receive, send)
+            return
+        response = await self.respond(request)
+        await response(scope, receive, send)
+
+    async def respond(self, request):
+        key = None if self.on_primary is not None and self.on_primary(request) else replicas.pick()
+        if key is not None:
+            try:
+                return await self.respond_from(replica_engines[key], request)
+            except OperationalError:
+                replicas.failed(key)
+        return await self.respond_from(engine, request)
+
+    async def respond_from(self, engine, request):
+        async with engine.connect() as connection:
+            rows = (await connection.execute(versions_query(self.tables))).all()
+            coding = compression.negotiate(request.headers.get('accept-encoding'))
+            etag = etag_from_rows(self.tables, rows, full_path(request), request.headers.get('accept', ''), coding)
+            if self.suffix is not None:
+                etag = f'{etag}-{await self.suffix(request, connection)}'
+            if parse_etags(request.headers.get('if-none-match')).contains_weak(etag):
+                return Response(status_code=304, headers={'ETag': quote_etag(etag)})
+            try:
+                body, status_code = await self.view(request, connection)
+            except APIException as error:
+                return json_response(error.to_dict(), error.status_code, request=request)
+        return json_response(body, status_code, etag, request)
+
+
+def list_view(model, msg):
+    async def view(request, connection):
+        nulls_high = engine.dialect.name in NULLS_HIGH_DIALECTS
+        statement, to_page = page_query(model, request.query_params, nulls_high)
+        page, next_cursor = to_page((await connection.execute(statement)).all())
+        return {'msg': msg, 'data': page, 'next': next_cursor}, 200
+    return view
+
+def detail_view(model, param, missing_msg, msg):
+    async def view(request, connection):
+        item_id = request.path_params[param]
+        item = row_to_dict(model, (await connection.execute(one_query(model, item_id))).first())
+        if item is None:
+            return {'mg': missing_msg.format(item_id)}, 404
+        return {'mg': msg, 'data': item}, 200
+    return view
+
+async def favorites_view(request, connection):
+    result = await connection.execute(favorites_query(request.path_params['user_id']))
+    return {'Favoritos': [item for row in result for item in favorite_row_items(row)]}, 200
+
+async def favorites_version(request, connection):
+    user_ids = [request.path_params['user_id']]
+    return favorites_etag_from_rows(user_ids, (await connection.execute(favorites_versions_query(user_ids))).all())
+
+def has_pending_favorites(request):
+    # The read-your-writes overlay of the write-behind mode lives in the Flask view
+    return bool(write_behind.pending_changes(request.path_params['user_id']))
+
+def changed_favorites(request):
+    return replicas.is_sticky(request.path_params['user_id'], request.cookies)
+
+
+routes = [
+    Route('/users', AsyncView(('users',), list_view(User, 'get users ok')), methods=['GET']),
+    Route('/user/{user_id:int}/favorites', AsyncView(('favorite_items', 'people', 'planets'), favorites_view,
+                                                    has_pending_favorites, changed_favorites, favorites_version),
+          methods=['GET']),
+    Route('/people', AsyncView(('people',), list_view(People, 'get all people ok')), methods=['GET']),
+    Route('/people/{people_id:int}', AsyncView(('people',), detail_view(
+        People, 'people_id', 'El personaje con ID {} no existe', 'get person ok')), methods=['GET']),
+    Route('/planets', AsyncView(('planets',), list_view(Planet, 'get all planets ok')), methods=['GET']),
+    Route('/planets/{planet_id:int}', AsyncView(('planets',), detail_view(
+        Planet, 'planet_id', 'El planeta con ID {} no existe', 'get planet ok')), methods=['GET']),
+    Mount('/', app=flask_wsgi)
+]
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+    for replica_engine in replica_engines.values():
+        await replica_engine.dispose()
+
+application = Starlette(routes=routes, lifespan=lifespan)
@@ -0,0 +1,212 @@
+"""
+Batch create/update/delete for people and planets.
+
+Each call runs in a single transaction with a fixed number of statements:
+duplicate and existence checks are one ``IN`` query, writes are executemany.
+The result has one entry per input item, in input order. Items whose fields
+don't fit their columns (type, length, enum values, NOT NULL) or point at a row
+that doesn't exist are reported as ``invalid`` and the rest are written.
+"""
+import json
+from flask import request
+from sqlalchemy import Enum, Integer, String, delete, select
+from utils import APIException
+from models import db, People
+from dialects import insert_ignore
+from streaming import NDJSON
+from versioning import bump_versions
+from favorites import forget_favorites
+
+MAX_BULK_ITEMS = 5000
+# Range of an INTEGER column in every supported database
+MIN_INT, MAX_INT = -2 ** 31, 2 ** 31 - 1
+
+
+def read_bulk_body():
+    """Items of a bulk request, sent as a JSON array or as NDJSON."""
+    if request.mimetype == NDJSON:
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise APIException(f'Línea NDJSON no válida: {len(items) + 1}', status_code=400)
+    else:
+        items = request.get_json(silent=True)
+
+    if not isinstance(items, list):
+        raise APIException('Debes enviar una lista de elementos', status_code=400)
+    if len(items) > MAX_BULK_ITEMS:
+        raise APIException(f'Máximo {MAX_BULK_ITEMS} elementos por petición', status_code=413)
+    return items
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _field_error(column, value):
+    """Why ``value`` can't be written to ``column``, or None."""
+    field = column.key.upper()
+    if value is None:
+        return None if column.nullable else f'El campo {field} es obligatorio'
+    # Enum is a String too
+    if isinstance(column.type, Enum):
+        if value not in column.type.enums:
+            return f'El campo {field} debe ser uno de: {", ".join(column.type.enums)}'
+    elif isinstance(column.type, Integer):
+        if not _is_int(value):
+            return f'El campo {field} debe ser un número entero'
+        if not MIN_INT <= value <= MAX_INT:
+            return f'El campo {field} está fuera de rango'
+    elif isinstance(column.type, String):
+        if not isinstance(value, str):
+            return f'El campo {field} debe ser un texto'
+        if column.type.length is not None and len(value) > column.type.length:
+            return f'El campo {field} admite como máximo {column.type.length} caracteres'
+    return None
+
+def _item_error(model, item):
+    for field in model.writable_fields:
+        if field in item:
+            error = _field_error(model.__table__.c[field], item[field])
+            if error is not None:
+                return error
+    return None
+
+def _drop_missing_references(model, entries, results):
+    """
+    Take out of ``entries`` ({key: (index, row)}) the rows whose foreign keys
+    point at no row, with one IN query per foreign key.
+    """
+    for field in model.writable_fields:
+        column = model.__table__.c[field]
+        for foreign_key in column.foreign_keys:
+            values = {row[field] for _, row in entries.values() if row.get(field) is not None}
+            if not values:
+                continue
+            referred = foreign_key.column
+            found = set(db.session.execute(select(referred).where(referred.in_(values))).scalars())
+            for key, (index, row) in list(entries.items()):
+                if row.get(field) is not None and row[field] not in found:
+                    del entries[key]
+                    results[index] = {
+                        'index': index, 'status': 'invalid',
+                        'msg': f'El campo {field.upper()} apunta a un registro que no existe: {row[field]}'
+                    }
+
+def bulk_create(model, items):
+    results = [None] * len(items)
+    rows = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('name'):
+            error = 'El campo NAME es obligatorio'
+        else:
+            error = _item_error(model, item)
+        if error is not None:
+            results[index] = {'index': index, 'status': 'invalid', 'msg': error}
+        elif item['name'] in rows:
+            results[index] = {'index': index, 'status': 'duplicate', 'name': item['name']}
+        else:
+            rows[item['name']] = (index, {field: item.get(field) for field in model.writable_fields})
+
+    _drop_missing_references(model, rows, results)
+    if rows:
+        existing = set(db.session.execute(select(model.name).where(model.name.in_(rows))).scalars())
+        for name in existing:
+            index, _ = rows.pop(name)
+            results[index] = {'index': index, 'status': 'duplicate', 'name': name}
+
+    if rows:
+        # Ignore rows that a concurrent request created in the meantime
+        db.session.execute(insert_ignore(model.__table__), [row for _, row in rows.values()])
+        created = db.session.execute(select(model.name, model.id).where(model.name.in_(rows)))
+        for name, item_id in created:
+            index, _ = rows[name]
+            results[index] = {'index': index, 'status': 'created', 'id': item_id}
+        bump_versions(model.__tablename__)
+
+    db.session.commit()
+    return results
+
+def bulk_update(model, items):
+    results = [None] * len(items)
+    mappings = {}
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            error = 'El campo ID es obligatorio'
+        else:
+            error = _field_error(model.__table__.c.id, item.get('id')) or _item_error(model, item)
+        if error is not None:
+            results[index] = {'index': index, 'status': 'invalid', 'msg': error}
+        elif item['id'] in mappings:
+            results[index] = {'index': index, 'status': 'duplicate', 'id': item['id']}
+        else:
+            changes = {field: item[field] for field in model.writable_fields if field in item}
+            mappings[item['id']] = (index, dict(changes, id=item['id']))
+
+    if mappings:
+        found = set(db.session.execute(select(model.id).where(model.id.in_(mappings))).scalars())
+        for item_id in set(mappings) - found:
+            index, _ = mappings.pop(item_id)
+            results[index] = {'index': index, 'status': 'not_found', 'id': item_id}
+    _drop_missing_references(model, mappings, results)
+
+    # A new name must not belong to another row (nor repeat within the batch)
+    renamed = {mapping['name']: item_id for item_id, (_, mapping) in mappings.items() if 'name' in mapping}
+    if renamed:
+        taken = db.session.execute(select(model.name, model.id).where(model.name.in_(renamed)))
+        conflicts = {renamed[name] for name, owner_id in taken if owner_id != renamed[name]}
+        seen = set()
+        for item_id, (_, mapping) in mappings.items():
+            if 'name' in mapping:
+                if mapping['name'] in seen:
+                    conflicts.add(item_id)
+                seen.add(mapping['name'])
+        for item_id in conflicts:
+            index, mapping = mappings.pop(item_id)
+            results[index] = {'index': index, 'status': 'duplicate', 'name': mapping['name']}
+
+    if mappings:
+        db.session.bulk_update_mappings(model, [mapping for _, mapping in mappings.values()])
+        bump_versions(model.__tablename__)
+        for item_id, (index, _) in mappings.items():
+            results[index] = {'index': index, 'status': 'updated', 'id': item_id}
+
+    db.session.commit()
+    return results
+
+def bulk_delete(model, items):
+    results = [None] * len(items)
+    ids = {}
+    found = set()
+    for index, item in enumerate(items):
+        item_id = item.get('id') if isinstance(item, dict) else item
+        error = _field_error(model.__table__.c.id, item_id)
+        if error is not None:
+            results[index] = {'index': index, 'status': 'invalid', 'msg': error}
+        elif item_id in ids:
+            results[index] = {'index': index, 'status': 'duplicate', 'id': item_id}
+        else:
+            ids[item_id] = index
+
+    if ids:
+        found = set(db.session.execute(select(model.id).where(model.id.in_(ids))).scalars())
+        for item_id, index in ids.items():
+            status = 'deleted' if item_id in found else 'not_found'
+            results[index] = {'index': index, 'status': status, 'id': item_id}
+
+    if found:
+        touched = [model.__tablename__]
+        if model is People:
+            forget_favorites('people', found)
+        else:
+            forget_favorites('planet', found)
+            # Their people lose planet_id in the database (ON DELETE SET NULL)
+            touched.append(People.__tablename__)
+        db.session.execute(delete(model).where(model.id.in_(found)))
+        bump_versions(*touched)
+
+    db.session.commit()
+    return results
@@ -0,0 +1,215 @@
+"""
+Read-through response cache for the catalog endpoints (people and planets).
+
+Entries are grouped per resource: ``people:list`` holds every cached page of
+``GET /people`` and ``people:<id>`` holds ``GET /people/<id>``. The write handlers
+invalidate exactly the groups they touch.
+
+``cached`` goes under ``versioning.conditional`` and keys each entry by the
+request's ETag, which holds the versions of every table the view reads. A write
+made by another worker, the admin or a database cascade changes those versions,
+so an entry filled before it is never served afterwards, not even under the new
+ETag; invalidating only frees the memory sooner.
+
+The default backend is an in-process LRU with TTL and a size bound. Setting
+``CACHE_BACKEND=redis`` shares the cache between workers through
+``CACHE_REDIS_URL``; if the ``redis`` package or URL is missing the local LRU is
+used as a stand-in.
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, request
+from streaming import wants_columnar, wants_stream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 30
+DEFAULT_MAX_ENTRIES = 1024
+
+
+class LRUCacheBackend:
+    name = 'local'
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, group, value)
+        self._groups = {}              # group -> set(keys)
+        self._generations = {}         # group -> invalidation count
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self, group):
+        return self._generations.get(group, 0)
+
+    def get(self, group, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, group, key, value, generation):
+        with self._lock:
+            # The group was invalidated while the value was being computed
+            if self._generations.get(group, 0) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, group, value)
+            self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *groups):
+        with self._lock:
+            for group in groups:
+                self._generations[group] = self._generations.get(group, 0) + 1
+                for key in list(self._groups.get(group, ())):
+                    self._remove(key)
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'ttl': self.ttl
+        }
+
+    def _remove(self, key):
+        _, group, _ = self._entries.pop(key)
+        keys = self._groups.get(group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+
+class RedisCacheBackend:
+    """
+    Shared cache. Each group has a generation counter that is part of the key,
+    so invalidating a group is a single INCR; old entries expire with their TTL.
+    Evictions are done by Redis itself and are not counted here.
+    """
+    name = 'redis'
+
+    def __init__(self, client, ttl=DEFAULT_TTL, prefix='cache'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self, group):
+        return int(self.client.get(f'{self.prefix}:gen:{group}') or 0)
+
+    def get(self, group, key):
+        value = self.client.get(f'{self.prefix}:{group}:{self.generation(group)}:{key}')
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return current_app.json.loads(value)
+
+    def set(self, group, key, value, generation):
+        # Stored under the generation read before the value was computed, so a
+        # concurrent invalidation leaves it unreachable
+        self.client.set(f'{self.prefix}:{group}:{generation}:{key}', current_app.json.dumps(value), ex=self.ttl)
+
+    def invalidate(self, *groups):
+        for group in groups:
+            self.client.incr(f'{self.prefix}:gen:{group}')
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'ttl': self.ttl
+        }
+
+
+class ResponseCache:
+
+    def __init__(self):
+        self.backend = LRUCacheBackend()
+
+    def init_app(self, app):
+        ttl = int(os.getenv('CACHE_TTL', DEFAULT_TTL))
+        max_entries = int(os.getenv('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.backend = LRUCacheBackend(max_entries=max_entries, ttl=ttl)
+
+        if os.getenv('CACHE_BACKEND', 'local') == 'redis':
+            redis_url = os.getenv('CACHE_REDIS_URL')
+            try:
+                import redis
+            except ImportError:
+                redis = None
+            if redis is None or not redis_url:
+                logger.warning('CACHE_BACKEND=redis sin paquete redis o CACHE_REDIS_URL, se usa la cache local')
+            else:
+                self.backend = RedisCacheBackend(redis.Redis.from_url(redis_url), ttl=ttl)
+
+        app.extensions['response_cache'] = self
+
+    def cached(self, resource):
+        """Cache successful JSON responses of a GET handler for ``resource``."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if wants_stream():
+                    return view(**kwargs)
+
+                group = self.group(resource, *kwargs.values())
+                key = f'{request.full_path}|columnar' if wants_columnar() else request.full_path
+                if 'etag' in g:
+                    key = f'{key}|{g.etag}'
+                entry = self.backend.get(group, key)
+                if entry is not None:
+                    body, status, mimetype = entry
+                    return current_app.response_class(body, status=status, mimetype=mimetype)
+
+                generation = self.backend.generation(group)
+                response = current_app.make_response(view(**kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    entry = (response.get_data(as_text=True), response.status_code, response.mimetype)
+                    self.backend.set(group, key, entry, generation)
+                return response
+            return wrapper
+        return decorator
+
+    def invalidate(self, resource, item_id=None):
+        """Drop the cached lists of ``resource`` and, if given, the item ``item_id``."""
+        groups = [self.group(resource)]
+        if item_id is not None:
+            groups.append(self.group(resource, item_id))
+        self.backend.invalidate(*groups)
+
+    def stats(self):
+        return self.backend.stats()
+
+    @staticmethod
+    def group(resource, item_id=None):
+        return f'{resource}:list' if item_id is None else f'{resource}:{item_id}'
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,195 @@
+"""
+Streaming import and export of the catalog tables, used by ``flask catalog``.
+
+Files are CSV (with a header) or NDJSON and are read and written in batches of
+``batch_size`` rows, so memory stays flat whatever the file size. On Postgres
+each batch goes through ``COPY``; other databases get one executemany INSERT
+per batch. An import runs in a single transaction.
+
+Imports may reference rows by name instead of id (``planet`` instead of
+``planet_id`` for people, ``user_name`` / ``people`` / ``planet`` for
+favorites): the names of a batch are resolved with one ``IN`` query.
+
+The favorites counters are left out of exports and rebuilt after importing
+favorites (see ``favorites.recount_favorites``).
+"""
+import csv
+import io
+import json
+from sqlalchemy import Boolean, Integer, insert, select, text
+from models import User, People, Planet, FavoriteItem
+from favorites import recount_favorites
+from versioning import bump_versions
+
+CATALOG_TABLES = {
+    'people': People.__table__,
+    'planets': Planet.__table__,
+    'users': User.__table__,
+    'favorite_items': FavoriteItem.__table__
+}
+FORMATS = ('csv', 'ndjson')
+BATCH_SIZE = 5000
+
+# Maintained by favorites.py, never exported nor imported
+DERIVED_COLUMNS = ('favorite_people_count', 'favorite_planets_count', 'favorited_count')
+
+# table -> {column in the file: (column holding the name, foreign key it fills)}
+REFERENCES = {
+    'people': {'planet': (Planet.name, 'planet_id')},
+    'favorite_items': {
+        'user_name': (User.user_name, 'user_id'),
+        'people': (People.name, 'people_id'),
+        'planet': (Planet.name, 'planet_id')
+    }
+}
+
+TRUE_VALUES = ('1', 't', 'true', 'yes')
+
+
+class CatalogError(Exception):
+    """The file can't be imported (unknown column, bad value, missing reference)."""
+
+
+def exported_columns(table):
+    return [column for column in table.columns if column.name not in DERIVED_COLUMNS]
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_rows(connection, table_name, output, file_format, batch_size=BATCH_SIZE):
+    """Write every row of ``table_name`` to the text file ``output``. Returns the row count."""
+    table = CATALOG_TABLES[table_name]
+    columns = exported_columns(table)
+    names = [column.name for column in columns]
+
+    if file_format == 'csv' and connection.dialect.name == 'postgresql':
+        cursor = connection.connection.cursor()
+        cursor.copy_expert(
+            f'COPY (SELECT {", ".join(names)} FROM {table.name} ORDER BY id) TO STDOUT WITH (FORMAT csv, HEADER)',
+            output
+        )
+        return cursor.rowcount
+
+    result = connection.execution_options(stream_results=True).execute(
+        select(*columns).order_by(table.c.id)
+    )
+    count = 0
+    if file_format == 'csv':
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(names)
+        for rows in result.partitions(batch_size):
+            writer.writerows(rows)
+            count += len(rows)
+    else:
+        for rows in result.partitions(batch_size):
+            output.write(''.join(json.dumps(dict(zip(names, row)), separators=(',', ':')) + '\n' for row in rows))
+            count += len(rows)
+    return count
+
+
+def read_items(source, file_format):
+    """Dicts from a CSV or NDJSON text file. CSV values are strings, '' meaning NULL."""
+    if file_format == 'csv':
+        yield from csv.DictReader(source)
+        return
+    for number, line in enumerate(source, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise CatalogError(f'line {number} is not valid JSON')
+        if not isinstance(item, dict):
+            raise CatalogError(f'line {number} is not a JSON object')
+        yield item
+
+def _converter(column):
+    if isinstance(column.type, Boolean):
+        return lambda value: value.lower() in TRUE_VALUES
+    if isinstance(column.type, Integer):
+        return int
+    return str
+
+def _normalize(connection, table, batch, from_csv):
+    """Row dicts ready to insert: CSV strings converted, names replaced by ids."""
+    references = REFERENCES.get(table.name, {})
+    converters = {column.name: _converter(column) for column in table.columns if column.name not in DERIVED_COLUMNS}
+    rows = []
+    for item in batch:
+        unknown = set(item) - set(converters) - set(references)
+        if unknown:
+            raise CatalogError(f'unknown columns for {table.name}: {", ".join(sorted(map(str, unknown)))}')
+        row = {}
+        for name, value in item.items():
+            if from_csv:
+                value = None if value == '' else value
+                if value is not None and name in converters:
+                    try:
+                        value = converters[name](value)
+                    except ValueError:
+                        raise CatalogError(f'bad value for {table.name}.{name}: {value!r}')
+            row[name] = value
+        rows.append(row)
+
+    for name, (lookup, foreign_key) in references.items():
+        wanted = {row[name] for row in rows if row.get(name) is not None}
+        ids = {}
+        if wanted:
+            model_id = lookup.class_.id
+            ids = dict(connection.execute(select(lookup, model_id).where(lookup.in_(wanted))).all())
+        missing = wanted - set(ids)
+        if missing:
+            raise CatalogError(f'{name} not found: {", ".join(sorted(map(str, missing))[:10])}')
+        for row in rows:
+            if name in row:
+                value = row.pop(name)
+                if value is not None:
+                    row[foreign_key] = ids[value]
+    return rows
+
+def _copy(connection, table, rows):
+    columns = sorted({name for row in rows for name in row})
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    for row in rows:
+        writer.writerow([row.get(name) for name in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f'COPY {table.name} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+def _insert(connection, table, rows):
+    # executemany needs the same keys in every row
+    columns = {name for row in rows for name in row}
+    connection.execute(insert(table), [dict(dict.fromkeys(columns), **row) for row in rows])
+
+def import_rows(connection, table_name, source, file_format, batch_size=BATCH_SIZE):
+    """Insert the rows of ``source`` into ``table_name``. Returns the row count."""
+    table = CATALOG_TABLES[table_name]
+    write = _copy if connection.dialect.name == 'postgresql' else _insert
+    count = 0
+    with_ids = False
+    for batch in _batches(read_items(source, file_format), batch_size):
+        rows = _normalize(connection, table, batch, file_format == 'csv')
+        with_ids = with_ids or any(row.get('id') is not None for row in rows)
+        write(connection, table, rows)
+        count += len(rows)
+
+    if with_ids and connection.dialect.name == 'postgresql':
+        # Explicit ids don't advance the sequence
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT MAX(id) FROM {table.name}))"
+        ))
+    if table_name == 'favorite_items':
+        recount_favorites(connection)
+    if count:
+        bump_versions(table.name, connection=connection)
+    return count
@@ -0,0 +1,141 @@
+"""
+Custom ``flask`` CLI commands, registered next to the ``flask db`` ones.
+"""
+import time
+import click
+from flask.cli import AppGroup
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+from models import db
+from favorites import recount_favorites
+from catalog import CATALOG_TABLES, FORMATS, BATCH_SIZE, CatalogError, export_rows, import_rows
+
+schema_cli = AppGroup('schema', help='Compare the live database schema with models.py.')
+favorites_cli = AppGroup('favorites', help='Maintenance of the favorites counters.')
+catalog_cli = AppGroup('catalog', help='Stream the catalog tables to and from CSV or NDJSON files.')
+
+# Columns the API filters on besides foreign keys (table -> columns), see filters.py
+FILTERED_COLUMNS = {
+    'favorite_items': ['user_id'],
+    'people': ['gender', 'height', 'mass', 'name'],
+    'planets': ['climate', 'terrain', 'diameter', 'population', 'name']
+}
+
+# Postgres-only indexes created by the migrations but not declared in models.py
+MIGRATION_ONLY_INDEXES = ('ix_people_name_trgm', 'ix_planets_name_trgm')
+
+
+def filtered_columns(metadata):
+    columns = {}
+    for table in metadata.sorted_tables:
+        names = {fk.parent.name for fk in table.foreign_keys}
+        names.update(FILTERED_COLUMNS.get(table.name, ()))
+        if names:
+            columns[table.name] = sorted(names)
+    return columns
+
+def leading_indexed_columns(inspector, table_name):
+    """Columns that are the first column of some index, unique key or primary key."""
+    leading = set()
+    pk = inspector.get_pk_constraint(table_name).get('constrained_columns') or []
+    if pk:
+        leading.add(pk[0])
+    for index in inspector.get_indexes(table_name):
+        if index.get('column_names') and index['column_names'][0]:
+            leading.add(index['column_names'][0])
+    for unique in inspector.get_unique_constraints(table_name):
+        if unique.get('column_names'):
+            leading.add(unique['column_names'][0])
+    return leading
+
+def missing_indexes(inspector, metadata):
+    live_tables = set(inspector.get_table_names())
+    missing = []
+    for table_name, columns in filtered_columns(metadata).items():
+        if table_name not in live_tables:
+            continue
+        leading = leading_indexed_columns(inspector, table_name)
+        missing.extend(f'{table_name}.{column}' for column in columns if column not in leading)
+    return missing
+
+def _include_object(obj, name, type_, reflected, compare_to):
+    return not (type_ == 'index' and name in MIGRATION_ONLY_INDEXES)
+
+@schema_cli.command('check')
+def schema_check():
+    """Diff the live schema against models.py and flag unindexed filter columns."""
+    # alembic takes longer to import than the rest of the app: only for this command
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+
+    with db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={
+            'compare_type': True,
+            'include_object': _include_object
+        })
+        diffs = compare_metadata(context, db.metadata)
+        missing = missing_indexes(inspect(connection), db.metadata)
+
+    for diff in diffs:
+        click.echo(f'schema: {diff}')
+    for column in missing:
+        click.echo(f'missing index: {column}')
+
+    if diffs or missing:
+        raise SystemExit(1)
+    click.echo('Schema matches models.py and every filtered column is indexed.')
+
+@favorites_cli.command('recount')
+def favorites_recount():
+    """Rebuild the favorites counters of users, people and planets from favorite_items."""
+    with db.engine.begin() as connection:
+        recount_favorites(connection)
+    click.echo('Favorites counters rebuilt.')
+
+def _format_of(path, file_format):
+    if file_format:
+        return file_format
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+def _report(action, count, table, started):
+    elapsed = time.perf_counter() - started
+    rate = f'{count / elapsed:,.0f}' if elapsed > 0 else '-'
+    click.echo(f'{action} {count} rows of {table} in {elapsed:.2f}s ({rate} rows/s)', err=True)
+
+@catalog_cli.command('export')
+@click.argument('table', type=click.Choice(sorted(CATALOG_TABLES)))
+@click.argument('path', default='-')
+@click.option('--format', 'file_format', type=click.Choice(FORMATS), help='Default: from the extension, else csv.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def catalog_export(table, path, file_format, batch_size):
+    """Write TABLE to PATH (stdout by default)."""
+    file_format = _format_of(path, file_format)
+    started = time.perf_counter()
+    with click.open_file(path, 'w', encoding='utf-8') as output:
+        with db.engine.connect() as connection:
+            count = export_rows(connection, table, output, file_format, batch_size)
+    _report('Exported', count, table, started)
+
+@catalog_cli.command('import')
+@click.argument('table', type=click.Choice(sorted(CATALOG_TABLES)))
+@click.argument('path', default='-')
+@click.option('--format', 'file_format', type=click.Choice(FORMATS), help='Default: from the extension, else csv.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+def catalog_import(table, path, file_format, batch_size):
+    """Insert the rows of PATH (stdin by default) into TABLE, all or nothing."""
+    file_format = _format_of(path, file_format)
+    started = time.perf_counter()
+    with click.open_file(path, 'r', encoding='utf-8') as source:
+        try:
+            with db.engine.begin() as connection:
+                count = import_rows(connection, table, source, file_format, batch_size)
+        except CatalogError as error:
+            raise click.ClickException(str(error))
+        except IntegrityError as error:
+            raise click.ClickException(f'nothing imported, rows conflict with the database: {error.orig}')
+    _report('Imported', count, table, started)
+
+def setup_commands(app):
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(favorites_cli)
+    app.cli.add_command(catalog_cli)
@@ -0,0 +1,125 @@
+"""
+Response compression negotiated through ``Accept-Encoding``.
+
+JSON, NDJSON and text bodies of at least ``COMPRESS_MIN_BYTES`` go out with
+brotli when the client accepts ``br`` and the ``brotli`` package is installed
+(``pip install brotli``), with gzip otherwise. Streamed responses are compressed
+as they are written: every ``COMPRESS_FLUSH_BYTES`` of output the compressor is
+flushed (Z_SYNC_FLUSH), so the client can decode the rows received so far
+without waiting for the end of the body.
+
+The ETags of ``versioning.conditional`` include the negotiated coding, so a
+gzip body and a plain one never share an ETag.
+
+    COMPRESSION              0 to send every body as it is (default 1)
+    COMPRESS_MIN_BYTES       smaller bodies are not compressed (default 1024)
+    COMPRESS_LEVEL           gzip level, 1-9 (default 6)
+    COMPRESS_BROTLI_QUALITY  brotli quality, 0-11 (default 5)
+    COMPRESS_FLUSH_BYTES     flush interval of streamed bodies (default 16384)
+"""
+import os
+import gzip
+import zlib
+from flask import request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIN_BYTES = 1024
+DEFAULT_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 5
+DEFAULT_FLUSH_BYTES = 16384
+
+
+def compressible(mimetype):
+    return mimetype is not None and (mimetype.startswith('text/') or mimetype.endswith('json'))
+
+
+class Compression:
+
+    def __init__(self):
+        self.enabled = True
+        self.min_bytes = DEFAULT_MIN_BYTES
+        self.level = DEFAULT_LEVEL
+        self.brotli_quality = DEFAULT_BROTLI_QUALITY
+        self.flush_bytes = DEFAULT_FLUSH_BYTES
+        # In order of preference when the client accepts both equally
+        self.codings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def init_app(self, app):
+        self.enabled = os.getenv('COMPRESSION', '1').lower() not in ('0', 'false', 'no')
+        self.min_bytes = int(os.getenv('COMPRESS_MIN_BYTES', DEFAULT_MIN_BYTES))
+        self.level = int(os.getenv('COMPRESS_LEVEL', DEFAULT_LEVEL))
+        self.brotli_quality = int(os.getenv('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY))
+        self.flush_bytes = int(os.getenv('COMPRESS_FLUSH_BYTES', DEFAULT_FLUSH_BYTES))
+        app.after_request(self.compress_response)
+        app.extensions['compression'] = self
+
+    def negotiate(self, accept_encoding):
+        """Coding to answer a request with ``accept_encoding`` in, or None for no compression."""
+        if not self.enabled or not accept_encoding:
+            return None
+        accept = parse_accept_header(accept_encoding)
+        best, best_quality = None, 0
+        for coding in self.codings:
+            quality = accept.quality(coding)
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def compress(self, data, coding):
+        if coding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        # mtime=0: the same body always compresses to the same bytes
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def compress_chunks(self, chunks, coding):
+        """Compress an iterable of byte chunks, flushing every ``flush_bytes`` of input."""
+        if coding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            # wbits=31: gzip header and trailer around the deflate stream
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+            process, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+
+        pending = 0
+        for chunk in chunks:
+            data = process(chunk)
+            pending += len(chunk)
+            if pending >= self.flush_bytes:
+                data += flush()
+                pending = 0
+            if data:
+                yield data
+        yield finish()
+
+    def compress_response(self, response):
+        if not compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code < 200 or response.status_code in (204, 304) or response.direct_passthrough
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        coding = self.negotiate(request.headers.get('Accept-Encoding'))
+        if coding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self.compress_chunks(response.iter_encoded(), coding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_bytes:
+                return response
+            response.set_data(self.compress(data, coding))
+        response.headers['Content-Encoding'] = coding
+        return response
+
+
+compression = Compression()
@@ -0,0 +1,144 @@
+"""
+SQLAlchemy engine options taken from the environment, and pool statistics for
+the health endpoint.
+
+    DB_POOL_SIZE             connections kept open per worker (default 5)
+    DB_MAX_OVERFLOW          extra connections allowed on spikes (default 10)
+    DB_POOL_TIMEOUT          seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE          seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING         test connections on checkout (default 1)
+    DB_STATEMENT_TIMEOUT_MS  server side statement timeout, 0 disables (default 0)
+    DB_EXTERNAL_POOLER       1 when behind pgbouncer or similar: no local pool
+    DATABASE_REPLICA_URLS    comma separated read replicas (see replicas.py)
+
+SQLite keeps SQLAlchemy's defaults since it has no server connections to pool.
+The async entry point (asgi.py) reads the same variables through
+``async_engine_options_from_env``.
+"""
+import os
+import time
+import threading
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+def _env_bool(name, default):
+    return os.getenv(name, default).lower() in ('1', 'true', 'yes')
+
+
+class MonitoredQueuePool(QueuePool):
+    """QueuePool that also records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        QueuePool.__init__(self, *args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return QueuePool._do_get(self)
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+
+
+def engine_options_from_env(db_url):
+    if db_url.startswith('sqlite'):
+        return {}
+
+    options = {
+        'pool_pre_ping': _env_bool('DB_POOL_PRE_PING', '1'),
+        'connect_args': {}
+    }
+    if _env_bool('DB_EXTERNAL_POOLER', '0'):
+        # The external pooler owns the connections; keeping our own would double pool them
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'poolclass': MonitoredQueuePool,
+            'pool_size': _env_int('DB_POOL_SIZE', 5),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+            'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800)
+        })
+
+    statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)
+    if statement_timeout > 0:
+        if db_url.startswith('postgresql'):
+            options['connect_args']['options'] = f'-c statement_timeout={statement_timeout}'
+        elif db_url.startswith('mysql'):
+            options['connect_args']['init_command'] = f'SET SESSION max_execution_time={statement_timeout}'
+    return options
+
+def database_url(url):
+    return url.replace("postgres://", "postgresql://")
+
+def replica_binds_from_env():
+    """``SQLALCHEMY_BINDS`` entries for the replicas, with the same engine options."""
+    urls = [url.strip() for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    return {
+        f'replica_{index}': dict(engine_options_from_env(database_url(url)), url=database_url(url))
+        for index, url in enumerate(urls)
+    }
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql'
+}
+
+def async_database_url(db_url):
+    """``db_url`` with its sync driver swapped for the asyncio one."""
+    scheme, rest = db_url.split('://', 1)
+    backend = scheme.split('+')[0]
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f'No async driver configured for {scheme}')
+    return f'{ASYNC_DRIVERS[backend]}://{rest}'
+
+def async_engine_options_from_env(db_url):
+    options = engine_options_from_env(db_url)
+    if options.get('poolclass') is MonitoredQueuePool:
+        # create_async_engine needs an asyncio aware pool, keep its default one
+        del options['poolclass']
+
+    connect_args = options.get('connect_args', {})
+    if 'options' in connect_args:
+        # asyncpg takes server settings instead of libpq's options string
+        timeout = connect_args.pop('options').split('=', 1)[1]
+        connect_args['server_settings'] = {'statement_timeout': timeout}
+    return options
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'timeout': pool.timeout()
+        })
+    if isinstance(pool, MonitoredQueuePool):
+        checkouts = pool.checkouts
+        stats.update({
+            'checkouts': checkouts,
+            'timeouts': pool.timeouts,
+            'avg_wait_ms': round(pool.total_wait * 1000 / checkouts, 3) if checkouts else 0.0,
+            'max_wait_ms': round(pool.max_wait * 1000, 3)
+        })
+    return stats
@@ -0,0 +1,90 @@
+"""
+Small helpers for statements whose syntax depends on the database backend.
+"""
+import sqlite3
+from sqlalchemy import event, insert, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from models import db
+
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores FOREIGN KEY constraints unless asked per connection
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+# Backends where ORDER BY puts NULL after every value in ascending order
+NULLS_HIGH_DIALECTS = ('postgresql', 'oracle')
+
+def nulls_sort_high():
+    return dialect_name() in NULLS_HIGH_DIALECTS
+
+# ER_DUP_ENTRY
+MYSQL_DUPLICATE_KEY = 1062
+
+def insert_ignore(table):
+    """
+    INSERT that silently skips rows violating a unique constraint. Foreign key
+    violations still raise. Its rowcount can't tell whether a row was inserted
+    on MySQL, see ``insert_if_absent``.
+    """
+    name = dialect_name()
+    if name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if name == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if name == 'mysql':
+        # INSERT IGNORE would also swallow foreign key errors
+        statement = mysql.insert(table)
+        return statement.on_duplicate_key_update({column.name: column for column in table.primary_key})
+    return insert(table)
+
+def _is_duplicate_key(error):
+    orig = error.orig
+    if getattr(orig, 'args', None) and orig.args[0] == MYSQL_DUPLICATE_KEY:
+        return True
+    message = str(orig).lower()
+    return 'duplicate' in message or 'unique' in message
+
+def insert_if_absent(table, values):
+    """
+    INSERT one row of ``values`` unless it violates a unique constraint. Returns
+    whether it was inserted; foreign key violations raise.
+    """
+    if dialect_name() in ('postgresql', 'sqlite'):
+        return db.session.execute(insert_ignore(table).values(values)).rowcount == 1
+
+    # ON DUPLICATE KEY UPDATE counts the duplicate as a matched row
+    # (CLIENT_FOUND_ROWS), so let the INSERT fail inside a savepoint instead
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(values))
+    except IntegrityError as error:
+        if not _is_duplicate_key(error):
+            raise
+        return False
+    return True
+
+def estimated_count(table_name):
+    """Row count of ``table_name`` from the planner statistics, or None where there are none."""
+    name = dialect_name()
+    if name == 'postgresql':
+        # reltuples is -1 (or 0) until the table is first analyzed
+        count = db.session.execute(
+            text('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:name)'), {'name': table_name}
+        ).scalar()
+    elif name == 'mysql':
+        count = db.session.execute(
+            text('SELECT table_rows FROM information_schema.tables '
+                 'WHERE table_schema = DATABASE() AND table_name = :name'), {'name': table_name}
+        ).scalar()
+    else:
+        return None
+    return count if count is not None and count > 0 else None
@@ -0,0 +1,221 @@
+"""
+Atomic add/remove of favorites.
+
+Each mutation is a single INSERT ... ON CONFLICT DO NOTHING (a plain INSERT in a
+savepoint on MySQL, see ``dialects.insert_if_absent``) or DELETE relying on
+the unique keys of ``favorite_items``: there is no check-then-write window, so
+concurrent requests can never create the same favorite twice. A missing user or
+item surfaces as a foreign key violation, which is the only time the callers
+run extra queries (to build the 404 message).
+
+The same transaction keeps the denormalized counters in step: the user's
+``favorite_people_count`` / ``favorite_planets_count`` and the item's
+``favorited_count``. The same UPDATE of the user bumps its
+``favorites_version``, which tags the ETags of its favorites and profile (see
+``favorites_etag``): a toggle changes no ETag but its user's, and concurrent
+toggles of different users write no common row. The database deletes the favorites of a deleted user,
+person or planet (ON DELETE CASCADE), but not their counters: deleting people
+or planets must go through ``forget_favorites`` and deleting users through
+``forget_user_favorites`` first.
+
+``apply_favorite_changes`` runs many toggles in one transaction for the
+write-behind mode (see writebehind.py).
+"""
+import hashlib
+from collections import Counter
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, User, People, Planet, FavoriteItem
+from dialects import insert_if_absent
+from versioning import bump_versions
+from leaderboard import leaderboard
+from replicas import replicas
+
+# kind -> (item model, FavoriteItem column, User counter)
+FAVORITE_KINDS = {
+    'people': (People, FavoriteItem.people_id, User.favorite_people_count),
+    'planet': (Planet, FavoriteItem.planet_id, User.favorite_planets_count)
+}
+
+
+class FavoriteTargetMissing(Exception):
+    """The user or the item of a favorite does not exist."""
+
+    def __init__(self, user_exists, item_exists):
+        Exception.__init__(self)
+        self.user_exists = user_exists
+        self.item_exists = item_exists
+
+
+# Values of every UPDATE of users that changes their favorites
+bumped_favorites_version = {User.favorites_version: User.favorites_version + 1}
+
+
+def favorites_versions_query(user_ids):
+    return select(User.id, User.favorites_version).where(User.id.in_(user_ids))
+
+def favorites_etag_from_rows(user_ids, rows):
+    versions = dict(rows)
+    tag = '.'.join(str(versions.get(user_id, 0)) for user_id in user_ids)
+    if len(user_ids) > 1:
+        tag = hashlib.sha1(tag.encode()).hexdigest()[:12]
+    return f'u{tag}'
+
+def favorites_etag(user_ids):
+    """ETag suffix with the favorites version of ``user_ids``."""
+    return favorites_etag_from_rows(user_ids, db.session.execute(favorites_versions_query(user_ids)).all())
+
+def target_exists(user_id, kind, item_id):
+    model, _, _ = FAVORITE_KINDS[kind]
+    user_exists = db.session.get(User, user_id) is not None
+    item_exists = db.session.get(model, item_id) is not None
+    return user_exists, item_exists
+
+def _count_favorite(user_id, kind, item_id, delta):
+    model, _, counter = FAVORITE_KINDS[kind]
+    db.session.execute(
+        update(User).where(User.id == user_id).values({counter: counter + delta, **bumped_favorites_version})
+    )
+    db.session.execute(
+        update(model).where(model.id == item_id).values(favorited_count=model.favorited_count + delta)
+    )
+
+def _insert_favorite(user_id, kind, item_id):
+    _, column, _ = FAVORITE_KINDS[kind]
+    return insert_if_absent(FavoriteItem.__table__, {'user_id': user_id, column.key: item_id})
+
+def _delete_favorite(user_id, kind, item_id):
+    _, column, _ = FAVORITE_KINDS[kind]
+    statement = delete(FavoriteItem.__table__).where(
+        FavoriteItem.user_id == user_id,
+        column == item_id
+    )
+    return db.session.execute(statement).rowcount > 0
+
+def add_favorite(user_id, kind, item_id):
+    """Create the favorite. Returns False if it already existed."""
+    try:
+        created = _insert_favorite(user_id, kind, item_id)
+        if created:
+            _count_favorite(user_id, kind, item_id, 1)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        user_exists, item_exists = target_exists(user_id, kind, item_id)
+        if user_exists and item_exists:
+            raise
+        raise FavoriteTargetMissing(user_exists, item_exists)
+    if created:
+        leaderboard.record(kind, item_id, 1)
+        replicas.stick(user_id)
+    return created
+
+def remove_favorite(user_id, kind, item_id):
+    """
+    Delete the favorite. Returns False if there was nothing to delete; raises
+    FavoriteTargetMissing if that is because the user or the item don't exist.
+    """
+    removed = _delete_favorite(user_id, kind, item_id)
+    if removed:
+        _count_favorite(user_id, kind, item_id, -1)
+    db.session.commit()
+
+    if removed:
+        leaderboard.record(kind, item_id, -1)
+        replicas.stick(user_id)
+    else:
+        user_exists, item_exists = target_exists(user_id, kind, item_id)
+        if not (user_exists and item_exists):
+            raise FavoriteTargetMissing(user_exists, item_exists)
+    return removed
+
+def apply_favorite_changes(changes):
+    """
+    Apply ``changes``, (user_id, kind, item_id, 'add' | 'remove') tuples, in the
+    current transaction with one UPDATE per touched counter. Doesn't commit.
+    Returns the change in favorites of every touched (kind, item_id).
+    """
+    user_deltas, item_deltas = Counter(), Counter()
+    for user_id, kind, item_id, action in changes:
+        if action == 'add':
+            delta = 1 if _insert_favorite(user_id, kind, item_id) else 0
+        else:
+            delta = -1 if _delete_favorite(user_id, kind, item_id) else 0
+        user_deltas[user_id, kind] += delta
+        item_deltas[kind, item_id] += delta
+
+    for (user_id, kind), delta in user_deltas.items():
+        if delta:
+            counter = FAVORITE_KINDS[kind][2]
+            db.session.execute(
+                update(User).where(User.id == user_id).values({counter: counter + delta, **bumped_favorites_version})
+            )
+    for (kind, item_id), delta in item_deltas.items():
+        if delta:
+            model = FAVORITE_KINDS[kind][0]
+            db.session.execute(
+                update(model).where(model.id == item_id).values(favorited_count=model.favorited_count + delta)
+            )
+    return {key: delta for key, delta in item_deltas.items() if delta}
+
+def forget_favorites(kind, item_ids):
+    """
+    Delete every favorite pointing at ``item_ids`` before the items themselves
+    are deleted, taking them off the users' counters. Doesn't commit.
+    """
+    _, column, counter = FAVORITE_KINDS[kind]
+    per_user = (
+        select(func.count())
+        .where(FavoriteItem.user_id == User.id, column.in_(item_ids))
+        .scalar_subquery()
+    )
+    fans = select(FavoriteItem.user_id).where(column.in_(item_ids))
+    db.session.execute(
+        update(User).where(User.id.in_(fans)).values({counter: counter - per_user, **bumped_favorites_version}),
+        execution_options={'synchronize_session': False}
+    )
+    removed = db.session.execute(delete(FavoriteItem.__table__).where(column.in_(item_ids))).rowcount
+    if removed:
+        bump_versions(FavoriteItem.__tablename__)
+        leaderboard.mark_stale(kind)
+    return removed
+
+def forget_user_favorites(user_ids):
+    """
+    Delete the favorites of ``user_ids`` before the users themselves are
+    deleted, taking them off the items' counters. Doesn't commit.
+    """
+    for kind, (model, column, _) in FAVORITE_KINDS.items():
+        per_item = (
+            select(func.count())
+            .where(column == model.id, FavoriteItem.user_id.in_(user_ids))
+            .scalar_subquery()
+        )
+        favorited = select(column).where(FavoriteItem.user_id.in_(user_ids))
+        result = db.session.execute(
+            update(model).where(model.id.in_(favorited)).values(favorited_count=model.favorited_count - per_item),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount:
+            leaderboard.mark_stale(kind)
+    removed = db.session.execute(
+        delete(FavoriteItem.__table__).where(FavoriteItem.user_id.in_(user_ids))
+    ).rowcount
+    if removed:
+        bump_versions(FavoriteItem.__tablename__)
+    return removed
+
+def recount_favorites(connection):
+    """Rebuild every favorites counter from ``favorite_items``."""
+    favorites = FavoriteItem.__table__
+    users, people, planets = User.__table__, People.__table__, Planet.__table__
+
+    def count(*conditions):
+        return select(func.count()).select_from(favorites).where(*conditions).scalar_subquery()
+
+    connection.execute(users.update().values(
+        favorite_people_count=count(favorites.c.user_id == users.c.id, favorites.c.people_id.isnot(None)),
+        favorite_planets_count=count(favorites.c.user_id == users.c.id, favorites.c.planet_id.isnot(None))
+    ))
+    connection.execute(people.update().values(favorited_count=count(favorites.c.people_id == people.c.id)))
+    connection.execute(planets.update().values(favorited_count=count(favorites.c.planet_id == planets.c.id)))
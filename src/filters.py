@@ -0,0 +1,87 @@
+"""
+Server-side filters, sorting and name search for the list endpoints.
+
+    /people?planet_id=1&gender=female&min_height=150&max_mass=80
+    /planets?climate=arid&terrain=desert&min_population=1000&sort=-diameter,name
+    /people?name_prefix=Lu        (prefix search on name)
+    /planets?q=oo                 (substring search on name)
+
+Every filter column has an index (see the migrations); on Postgres the name
+search uses the pg_trgm GIN indexes, elsewhere it falls back to LIKE.
+"""
+from utils import APIException
+from models import User, People, Planet
+
+EQUAL_FILTERS = {
+    People: {'planet_id': int, 'gender': str},
+    Planet: {'climate': str, 'terrain': str}
+}
+RANGE_FILTERS = {
+    People: ('height', 'mass'),
+    Planet: ('diameter', 'population')
+}
+SORTABLE = {
+    User: ('user_name', 'email'),
+    People: ('name', 'gender', 'height', 'mass', 'planet_id'),
+    Planet: ('name', 'climate', 'terrain', 'diameter', 'population')
+}
+SEARCHABLE = {
+    People: 'name',
+    Planet: 'name'
+}
+# Range of the integers every driver can bind
+MIN_BIND_INT, MAX_BIND_INT = -2 ** 63, 2 ** 63 - 1
+
+
+def _parse_int(args, name):
+    try:
+        value = int(args[name])
+    except ValueError:
+        raise APIException(f'El parámetro "{name}" debe ser un número', status_code=400)
+    if not MIN_BIND_INT <= value <= MAX_BIND_INT:
+        raise APIException(f'El parámetro "{name}" está fuera de rango', status_code=400)
+    return value
+
+def _like_pattern(text):
+    return text.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+def apply_filters(query, model, args):
+    for name, kind in EQUAL_FILTERS.get(model, {}).items():
+        if name in args:
+            column = getattr(model, name)
+            value = _parse_int(args, name) if kind is int else args[name]
+            enums = getattr(column.type, 'enums', None)
+            if enums and value not in enums:
+                raise APIException(f'El parámetro "{name}" debe ser uno de: {", ".join(enums)}', status_code=400)
+            query = query.filter(column == value)
+
+    for name in RANGE_FILTERS.get(model, ()):
+        column = getattr(model, name)
+        if f'min_{name}' in args:
+            query = query.filter(column >= _parse_int(args, f'min_{name}'))
+        if f'max_{name}' in args:
+            query = query.filter(column <= _parse_int(args, f'max_{name}'))
+
+    search_field = SEARCHABLE.get(model)
+    if search_field is not None:
+        column = getattr(model, search_field)
+        if args.get('name_prefix'):
+            query = query.filter(column.ilike(_like_pattern(args['name_prefix']) + '%', escape='/'))
+        if args.get('q'):
+            query = query.filter(column.ilike('%' + _like_pattern(args['q']) + '%', escape='/'))
+    return query
+
+def parse_sort(model, args):
+    """?sort=-mass,name -> [('mass', True), ('name', False)]; the id is added by the caller."""
+    sort = []
+    for item in args.get('sort', '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith('-')
+        name = item.lstrip('-+')
+        if name not in SORTABLE.get(model, ()):
+            raise APIException(f'No se puede ordenar por "{name}"', status_code=400)
+        if name not in [field for field, _ in sort]:
+            sort.append((name, descending))
+    return sort
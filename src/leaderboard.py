@@ -0,0 +1,181 @@
+"""
+Most favorited people and planets, kept in memory.
+
+Each worker tracks the ``capacity`` (twice ``LEADERBOARD_SIZE``) items with the
+most favorites. ``add_favorite`` / ``remove_favorite`` report every change, so
+the top is updated in place and ``GET /leaderboard/<kind>`` only sorts a few
+hundred entries. Items outside the tracked set are only known to have at most
+``floor`` favorites; while that bound stays below the last requested position
+the answer is exact, otherwise it is reloaded from the ``favorited_count``
+index (one ``ORDER BY ... LIMIT`` query, never a GROUP BY over favorite_items).
+
+Writes done by other workers are not seen, so every ``LEADERBOARD_CHECK_SECONDS``
+(default 60) a read reloads the top from the database and logs when it had
+drifted.
+
+    LEADERBOARD_SIZE           longest top that can be requested (default 100)
+    LEADERBOARD_CHECK_SECONDS  seconds between checks against the database
+"""
+import os
+import time
+import logging
+import threading
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, People, Planet
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 100
+DEFAULT_CHECK_SECONDS = 60
+
+
+class TopK:
+    """Favorites count and name of the most favorited items of one kind."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = {}      # id -> [count, name]
+        self._floor = 0       # no untracked item has more favorites than this
+        self._ranking = None  # sorted [(id, count, name)], rebuilt after changes
+
+    def load(self, rows):
+        """``rows`` of (id, name, count), most favorited first, at most ``capacity``."""
+        self._items = {item_id: [count, name] for item_id, name, count in rows}
+        self._floor = rows[-1][2] if len(rows) >= self.capacity else 0
+        self._ranking = None
+
+    def add(self, item_id, delta):
+        """Apply ``delta`` favorites to ``item_id``. False if the top must be reloaded."""
+        entry = self._items.get(item_id)
+        if entry is not None:
+            entry[0] += delta
+            if entry[0] <= 0:
+                del self._items[item_id]
+            self._ranking = None
+            return True
+        if delta > 0:
+            if self._floor == 0:
+                # Every favorited item was tracked: this one is new and we don't know its name
+                return False
+            # It may now have up to floor + delta favorites
+            self._floor += delta
+        return True
+
+    def ranking(self):
+        if self._ranking is None:
+            self._ranking = sorted(
+                ((item_id, count, name) for item_id, (count, name) in self._items.items()),
+                key=lambda item: (-item[1], item[0])
+            )
+        return self._ranking
+
+    def exact(self, limit):
+        """Whether the first ``limit`` positions can't contain an untracked item."""
+        ranking = self.ranking()
+        if len(ranking) < limit:
+            return self._floor == 0
+        return ranking[limit - 1][1] > self._floor
+
+
+class Leaderboard:
+
+    def __init__(self, model, capacity):
+        self.model = model
+        self.topk = TopK(capacity)
+        self.stale = True
+        self.changes = 0
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def query(self):
+        model = self.model
+        return (
+            select(model.id, model.name, model.favorited_count)
+            .where(model.favorited_count > 0)
+            .order_by(model.favorited_count.desc(), model.id)
+            .limit(self.topk.capacity)
+        )
+
+    def rebuild(self, size):
+        with self._lock:
+            changes = self.changes
+            before = [item[:2] for item in self.topk.ranking()[:size]]
+            was_stale = self.stale
+        rows = db.session.execute(self.query()).all()
+
+        with self._lock:
+            self.topk.load(rows)
+            # A favorite changed while we were reading: the next read reloads again
+            self.stale = self.changes != changes
+            self.checked_at = time.monotonic()
+            after = [item[:2] for item in self.topk.ranking()[:size]]
+        if not was_stale and before != after:
+            # Expected with several workers, each one only sees its own writes
+            logger.info('Leaderboard de %s desincronizado, recargado desde la base de datos',
+                           self.model.__tablename__)
+
+    def record(self, item_id, delta):
+        with self._lock:
+            self.changes += 1
+            if not self.topk.add(item_id, delta):
+                self.stale = True
+
+    def mark_stale(self):
+        with self._lock:
+            self.stale = True
+
+    def top(self, limit, size, check_seconds):
+        with self._lock:
+            due = time.monotonic() - self.checked_at >= check_seconds
+            fresh = not (self.stale or due) and self.topk.exact(limit)
+        if not fresh:
+            self.rebuild(size)
+        with self._lock:
+            return self.topk.ranking()[:limit]
+
+
+class Leaderboards:
+
+    def __init__(self):
+        self.size = DEFAULT_SIZE
+        self.check_seconds = DEFAULT_CHECK_SECONDS
+        self.boards = self._boards()
+
+    def _boards(self):
+        # Keyed like favorites.FAVORITE_KINDS
+        return {
+            'people': Leaderboard(People, self.size * 2),
+            'planet': Leaderboard(Planet, self.size * 2)
+        }
+
+    def init_app(self, app):
+        self.size = int(os.getenv('LEADERBOARD_SIZE', DEFAULT_SIZE))
+        self.check_seconds = float(os.getenv('LEADERBOARD_CHECK_SECONDS', DEFAULT_CHECK_SECONDS))
+        self.boards = self._boards()
+
+        with app.app_context():
+            try:
+                for board in self.boards.values():
+                    board.rebuild(self.size)
+            except SQLAlchemyError:
+                # e.g. `flask db upgrade` on an empty database: built on the first read instead
+                logger.info('Leaderboard no disponible al arrancar, se calculará en la primera lectura')
+            finally:
+                db.session.remove()
+        app.extensions['leaderboard'] = self
+
+    def record(self, kind, item_id, delta):
+        self.boards[kind].record(item_id, delta)
+
+    def mark_stale(self, kind):
+        self.boards[kind].mark_stale()
+
+    def top(self, kind, limit):
+        """[{'id', 'name', 'favorited_count'}] of the ``limit`` most favorited items of ``kind``."""
+        limit = min(limit, self.size)
+        ranking = self.boards[kind].top(limit, self.size, self.check_seconds)
+        return [{'id': item_id, 'name': name, 'favorited_count': count} for item_id, count, name in ranking]
+
+
+leaderboard = Leaderboards()
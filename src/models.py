@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -9,8 +10,18 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password = db.Column(db.String(80), nullable=False)
     is_active = db.Column(db.Boolean(), nullable=False)
+    # Contadores desnormalizados, los mantiene favorites.py en la misma transacción
+    favorite_people_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorite_planets_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Sube con cada cambio en sus favoritos, forma parte del ETag de sus favoritos y su perfil
+    favorites_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    favorites = db.relationship('FavoriteItem', back_populates='user', cascade="all, delete-orphan")
+    # La base de datos borra sus favoritos (ON DELETE CASCADE), el ORM no los carga
+    favorites = db.relationship('FavoriteItem', back_populates='user', cascade="all, delete-orphan",
+                                passive_deletes=True)
+
+    # Columnas que se pueden pedir con ?fields= en los listados
+    public_fields = ('id', 'email', 'user_name')
 
     def __repr__(self):
         return f'<User %r>' % self.user_name
@@ -26,14 +37,21 @@ class Planet(db.Model):
     __tablename__ = 'planets'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(25), nullable=False, unique=True)
-    diameter = db.Column(db.Integer)
-    climate = db.Column(db.String(25))
-    population = db.Column(db.Integer)
-    terrain = db.Column(db.String(25))
+    diameter = db.Column(db.Integer, index=True)
+    climate = db.Column(db.String(25), index=True)
+    population = db.Column(db.Integer, index=True)
+    terrain = db.Column(db.String(25), index=True)
     url = db.Column(db.String(255))
+    # Usuarios que lo tienen en favoritos (ver favorites.py)
+    favorited_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
+
+    # ON DELETE SET NULL / CASCADE: borrar un planeta no carga a sus habitantes ni favoritos
+    habitant = db.relationship('People', back_populates='planet', passive_deletes=True)
+    favorite_item = db.relationship('FavoriteItem', back_populates='planet', cascade="all, delete-orphan",
+                                    passive_deletes=True)
 
-    habitant = db.relationship('People', back_populates='planet')
-    favorite_item = db.relationship('FavoriteItem', back_populates='planet', cascade="all, delete-orphan")
+    public_fields = ('id', 'name', 'diameter', 'climate', 'population', 'terrain', 'url')
+    writable_fields = ('name', 'diameter', 'climate', 'population', 'terrain', 'url')
 
     def __repr__(self):
         return f'<El planeta con ID {self.id} es {self.name}>'
@@ -53,14 +71,20 @@ class People(db.Model):
     __tablename__ = 'people'
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(25), nullable=False, unique=True)
-    gender = db.Column(db.Enum('male', 'female', name='gender_enum'))
-    height = db.Column(db.Integer)
-    mass = db.Column(db.Integer)
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'))
+    gender = db.Column(db.Enum('male', 'female', name='gender_enum'), index=True)
+    height = db.Column(db.Integer, index=True)
+    mass = db.Column(db.Integer, index=True)
+    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id', ondelete='SET NULL'), index=True)
     url = db.Column(db.String(255))
+    # Usuarios que lo tienen en favoritos (ver favorites.py)
+    favorited_count = db.Column(db.Integer, nullable=False, default=0, server_default='0', index=True)
 
     planet = db.relationship(Planet, back_populates='habitant')
-    favorite_item = db.relationship('FavoriteItem', back_populates='people', cascade="all, delete-orphan")
+    favorite_item = db.relationship('FavoriteItem', back_populates='people', cascade="all, delete-orphan",
+                                    passive_deletes=True)
+
+    public_fields = ('id', 'name', 'gender', 'height', 'mass', 'url')
+    writable_fields = ('name', 'gender', 'height', 'mass', 'planet_id', 'url')
 
     def __repr__(self):
         return f'<Personaje con ID {self.id} se llama {self.name}>'
@@ -77,14 +101,20 @@ class People(db.Model):
     
 class FavoriteItem(db.Model):
     __tablename__ = 'favorite_items'
+    # Un usuario no puede repetir favorito; las altas se apoyan en estas claves.
+    # Al empezar por user_id, también sirven de índice para los favoritos de un usuario
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'people_id', name='uq_favorite_items_user_people'),
+        db.UniqueConstraint('user_id', 'planet_id', name='uq_favorite_items_user_planet'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     user = db.relationship(User, back_populates='favorites')
 
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id', ondelete='CASCADE'), index=True)
     planet = db.relationship(Planet, back_populates='favorite_item')
 
-    people_id = db.Column(db.Integer, db.ForeignKey('people.id'))
+    people_id = db.Column(db.Integer, db.ForeignKey('people.id', ondelete='CASCADE'), index=True)
     people = db.relationship(People, back_populates='favorite_item')
 
     def __repr__(self):
@@ -95,4 +125,13 @@ class FavoriteItem(db.Model):
             'user_id': self.user_id,
             'planet_id': self.planet_id,
             'people_id': self.people_id
-        }
\ No newline at end of file
+        }
+    
+class TableVersion(db.Model):
+    # Contador por tabla que se incrementa en cada escritura (ETags de los listados)
+    __tablename__ = 'table_versions'
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<Version de {self.table_name}: {self.version}>'
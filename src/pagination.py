@@ -0,0 +1,183 @@
+"""
+Keyset (cursor) pagination and column projection for the list endpoints.
+
+A page is requested with ``?limit=N&after=<cursor>&fields=a,b``. The cursor is
+opaque for the client: it is whatever ``next`` returned in the previous page.
+It holds the sort values and the id of the last row, so pages stay consistent
+with the filters and ``?sort=`` of ``filters.py``.
+"""
+import base64
+import json
+from sqlalchemy import Enum, and_, false, or_, select
+from utils import APIException
+from models import db
+from dialects import nulls_sort_high
+from filters import MAX_BIND_INT, MIN_BIND_INT, apply_filters, parse_sort
+from serializers import EXPANSIONS, rows_to_columns, rows_to_dicts
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+MAX_IDS = 100
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise APIException('El cursor "after" no es válido', status_code=400)
+    if not isinstance(values, list):
+        raise APIException('El cursor "after" no es válido', status_code=400)
+    return values
+
+def _fits(column, value):
+    """Whether the cursor ``value`` can be compared with ``column``."""
+    if value is None:
+        return column.nullable
+    python_type = column.type.python_type
+    # bool is an int for isinstance
+    if isinstance(value, bool) or python_type is bool:
+        return isinstance(value, bool) and python_type is bool
+    if isinstance(value, int):
+        return python_type in (int, float) and MIN_BIND_INT <= value <= MAX_BIND_INT
+    if isinstance(column.type, Enum):
+        return value in column.type.enums
+    return isinstance(value, python_type)
+
+def check_cursor(values, columns):
+    """Reject a cursor that doesn't hold one value of the right type per sort column."""
+    if len(values) != len(columns) or not all(_fits(column, value) for column, value in zip(columns, values)):
+        raise APIException('El cursor "after" no es válido', status_code=400)
+
+def parse_limit(args):
+    limit = args.get('limit', DEFAULT_LIMIT)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise APIException('El parámetro "limit" debe ser un número', status_code=400)
+    if limit < 1:
+        raise APIException('El parámetro "limit" debe ser mayor que 0', status_code=400)
+    return min(limit, MAX_LIMIT)
+
+def parse_ids(args):
+    """Distinct ids of ?ids=1,2,3 in the order given."""
+    raw = args.get('ids', '')
+    try:
+        ids = [int(value) for value in raw.split(',') if value.strip()]
+    except ValueError:
+        ids = None
+    if ids is None or not all(MIN_BIND_INT <= item_id <= MAX_BIND_INT for item_id in ids):
+        raise APIException('El parámetro "ids" debe ser una lista de números separados por comas', status_code=400)
+    if not ids:
+        raise APIException('Debes enviar el parámetro "ids"', status_code=400)
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > MAX_IDS:
+        raise APIException(f'El parámetro "ids" admite como máximo {MAX_IDS} valores', status_code=400)
+    return ids
+
+def parse_fields(args, model):
+    """Columns requested with ?fields=, in model order. The id is always included."""
+    fields = args.get('fields')
+    if not fields:
+        return list(model.public_fields)
+
+    requested = {field.strip() for field in fields.split(',') if field.strip()}
+    unknown = requested - set(model.public_fields)
+    if unknown:
+        raise APIException(f'Campos no válidos: {", ".join(sorted(unknown))}', status_code=400)
+
+    requested.add('id')
+    return [field for field in model.public_fields if field in requested]
+
+def parse_expand(args, model):
+    """Relationships requested with ?expand=planet,... (see serializers.EXPANSIONS)."""
+    raw = args.get('expand')
+    if not raw:
+        return []
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in EXPANSIONS.get(model, {})]
+    if unknown:
+        raise APIException(f'Valores de "expand" no válidos: {", ".join(unknown)}', status_code=400)
+    return names
+
+def _after_value(column, value, descending, nulls_high):
+    """Condition for ``column`` to sort strictly after ``value``, or None if nothing can."""
+    larger = not descending
+    if value is None:
+        # NULL is the largest value where nulls_high, the smallest elsewhere
+        return column.isnot(None) if larger != nulls_high else None
+    if larger:
+        return or_(column > value, column.is_(None)) if nulls_high else column > value
+    return column < value if nulls_high else or_(column < value, column.is_(None))
+
+def keyset_after(keys, values, nulls_high):
+    """Rows after ``values`` in the order of ``keys`` [(column, descending)]."""
+    clauses = []
+    for index, (column, descending) in enumerate(keys):
+        after = _after_value(column, values[index], descending, nulls_high)
+        if after is None:
+            continue
+        equal = [
+            previous.is_(None) if value is None else previous == value
+            for (previous, _), value in zip(keys[:index], values[:index])
+        ]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses) if clauses else false()
+
+def build_query(model, args):
+    """
+    SELECT of the ?fields= columns of ``model`` with the filters and sort of the
+    request applied. Returns the statement, the output fields, every selected
+    column name and the sort keys (ending with the id).
+    """
+    fields = parse_fields(args, model)
+    sort = parse_sort(model, args) + [('id', False)]
+    selected = fields + [name for name, _ in sort if name not in fields]
+
+    statement = apply_filters(select(*[getattr(model, name) for name in selected]), model, args)
+    order = [getattr(model, name).desc() if descending else getattr(model, name) for name, descending in sort]
+    return statement.order_by(*order), fields, selected, sort
+
+def page_query(model, args, nulls_high, columnar=False):
+    """
+    Statement for one page and a function turning its rows into
+    ``(data, next_cursor)``, ``data`` being a list of dicts or, if
+    ``columnar``, one table (see serializers.py). It doesn't touch the
+    session, so the async entry point runs the same statement.
+    """
+    limit = parse_limit(args)
+    statement, fields, selected, sort = build_query(model, args)
+
+    after = args.get('after')
+    if after:
+        values = decode_cursor(after)
+        keys = [(getattr(model, name), descending) for name, descending in sort]
+        check_cursor(values, [column.expression for column, _ in keys])
+        statement = statement.where(keyset_after(keys, values, nulls_high))
+
+    def to_page(rows):
+        # One extra row tells us whether there is a next page without a COUNT(*)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = None
+        if has_more:
+            last = dict(zip(selected, rows[-1]))
+            next_cursor = encode_cursor([last[name] for name, _ in sort])
+        data = rows_to_columns(fields, rows) if columnar else rows_to_dicts(fields, rows)
+        return data, next_cursor
+
+    return statement.limit(limit + 1), to_page
+
+def paginate(model, args, columnar=False):
+    """
+    Return one page of ``model`` as a list of dicts (or a columnar table) plus
+    the cursor for the next page.
+
+    Only the requested columns are selected, so no ORM instances are built.
+    """
+    statement, to_page = page_query(model, args, nulls_sort_high(), columnar)
+    return to_page(db.session.execute(statement).all())
@@ -0,0 +1,130 @@
+"""
+Request-level SQL profiling.
+
+For every request we count the SQL statements it ran and the time spent in the
+database, in JSON serialization and in total, plus the response size. Totals per
+endpoint are served in Prometheus text format at ``/metrics``. Statements slower
+than ``SLOW_QUERY_MS`` (default 200) are logged with their bound parameters.
+Set ``PROFILING=0`` to turn everything off. Totals are per worker process.
+"""
+import os
+import time
+import logging
+import threading
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from serializers import APIJSONProvider
+
+logger = logging.getLogger(__name__)
+
+METRICS = (
+    # name, request field, type, help
+    ('api_requests_total', 'count', 'counter', 'Requests handled'),
+    ('api_request_duration_seconds_total', 'duration', 'counter', 'Time spent handling requests'),
+    ('api_db_queries_total', 'queries', 'counter', 'SQL statements executed'),
+    ('api_db_time_seconds_total', 'db_time', 'counter', 'Time spent waiting on SQL statements'),
+    ('api_serialization_seconds_total', 'serialize_time', 'counter', 'Time spent encoding JSON'),
+    ('api_response_bytes_total', 'bytes', 'counter', 'Response body bytes (not counting streamed bodies)'),
+    ('api_slow_queries_total', 'slow_queries', 'counter', 'Statements slower than SLOW_QUERY_MS')
+)
+
+
+class RequestStats:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, key, values):
+        with self._lock:
+            totals = self._endpoints.setdefault(key, dict.fromkeys(values, 0))
+            for field, value in values.items():
+                totals[field] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(totals) for key, totals in self._endpoints.items()}
+
+    def prometheus(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, field, metric_type, help_text in METRICS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for (endpoint, method, status), totals in sorted(snapshot.items()):
+                labels = f'endpoint="{endpoint}",method="{method}",status="{status}"'
+                lines.append(f'{name}{{{labels}}} {totals[field]}')
+        return '\n'.join(lines) + '\n'
+
+
+request_stats = RequestStats()
+
+
+class TimedJSONProvider(APIJSONProvider):
+    """The app's JSON provider, adding the encoding time to the current request."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return APIJSONProvider.dumps(self, obj, **kwargs)
+        finally:
+            if has_request_context() and 'profile' in g:
+                g.profile['serialize_time'] += time.perf_counter() - start
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    slow = elapsed * 1000 >= float(os.getenv('SLOW_QUERY_MS', 200))
+    if slow:
+        logger.warning('Slow query (%.1f ms): %s | params=%r', elapsed * 1000, statement, parameters)
+
+    if has_request_context() and 'profile' in g:
+        g.profile['queries'] += 1
+        g.profile['db_time'] += elapsed
+        g.profile['slow_queries'] += int(slow)
+
+def _handle_error(exception_context):
+    # A statement that raised never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+def _start_profile():
+    g.profile = {
+        'start': time.perf_counter(),
+        'queries': 0,
+        'db_time': 0.0,
+        'serialize_time': 0.0,
+        'slow_queries': 0
+    }
+
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+
+    values = {
+        'count': 1,
+        'duration': time.perf_counter() - profile.pop('start'),
+        'bytes': 0 if response.is_streamed else (response.calculate_content_length() or 0)
+    }
+    values.update(profile)
+    key = (request.endpoint or 'unknown', request.method, response.status_code)
+    request_stats.record(key, values)
+    return response
+
+def setup_profiling(app):
+    if os.getenv('PROFILING', '1').lower() in ('0', 'false', 'no'):
+        return
+
+    app.json = TimedJSONProvider(app)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
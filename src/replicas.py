@@ -0,0 +1,185 @@
+"""
+Read replicas for GET traffic (``DATABASE_REPLICA_URLS``).
+
+Each replica URL becomes a Flask-SQLAlchemy bind (``replica_0``, ``replica_1``...)
+and ``RoutingSession``, the class of ``db.session``, sends the reads of a GET or
+HEAD request to one of them, picked round-robin and kept for the whole request.
+Everything else stays on the primary:
+
+- writes (flushes and INSERT / UPDATE / DELETE statements), and every read of
+  the same request after its first write;
+- requests that aren't GET / HEAD, CLI commands and background threads;
+- ``db.session.connection()`` and other calls that don't say what they run.
+
+A replica that fails with OperationalError is skipped for
+``REPLICA_RETRY_SECONDS`` and the failed read is retried on the primary.
+
+Replicas lag behind the primary, so a user who just changed a favorite reads
+``/user/<id>/favorites`` and their profile from the primary for the next
+``REPLICA_STICKY_SECONDS`` (see ``sticky``). The window travels with the
+client: the response to the write sets the ``replica_sticky`` cookie, signed
+with ``FLASK_APP_KEY``, holding until when each user it changed stays on the
+primary. Any worker or machine honours it, so every worker must share the same
+key (and roughly the same clock). Clients that drop cookies may read a replica
+that hasn't caught up yet.
+
+    DATABASE_REPLICA_URLS   comma separated replica URLs (default none)
+    REPLICA_STICKY_SECONDS  primary-only reads after a favorite change (default 5)
+    REPLICA_RETRY_SECONDS   seconds a failed replica is left out (default 30)
+
+To try it locally, point the variable at a copy of the SQLite file
+(``cp /tmp/test.db /tmp/replica.db``) or at a second Postgres.
+"""
+import os
+import math
+import time
+import logging
+import threading
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from itsdangerous import BadData, URLSafeSerializer
+from sqlalchemy.exc import OperationalError
+from db_config import pool_stats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STICKY_SECONDS = 5
+DEFAULT_RETRY_SECONDS = 30
+READ_METHODS = ('GET', 'HEAD')
+STICKY_COOKIE = 'replica_sticky'
+# Users kept in the cookie, the ones that wrote last
+MAX_STICKY_USERS = 20
+
+
+class ReplicaRouter:
+
+    def __init__(self):
+        self.keys = []
+        self.sticky_seconds = DEFAULT_STICKY_SECONDS
+        self.retry_seconds = DEFAULT_RETRY_SECONDS
+        self._next = 0
+        self._down = {}       # bind key -> monotonic time it can be tried again
+        self._serializer = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.keys = sorted(key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith('replica_'))
+        self.sticky_seconds = float(os.getenv('REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS))
+        self.retry_seconds = float(os.getenv('REPLICA_RETRY_SECONDS', DEFAULT_RETRY_SECONDS))
+        self._serializer = URLSafeSerializer(app.secret_key, salt=STICKY_COOKIE)
+        app.after_request(self._set_sticky_cookie)
+        app.extensions['replicas'] = self
+
+    def pick(self):
+        """Bind key of the next healthy replica, or None to use the primary."""
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.keys)):
+                key = self.keys[self._next % len(self.keys)]
+                self._next += 1
+                if self._down.get(key, 0) <= now:
+                    return key
+        return None
+
+    def failed(self, key):
+        logger.warning('Réplica %s no disponible, se usa la principal durante %ss', key, self.retry_seconds)
+        with self._lock:
+            self._down[key] = time.monotonic() + self.retry_seconds
+
+    def stick(self, user_id):
+        """Keep the reads about ``user_id`` of this client on the primary for a while (it just wrote)."""
+        if not self.keys or not has_request_context():
+            return
+        g.setdefault('replica_sticky', {})[str(user_id)] = time.time() + self.sticky_seconds
+
+    def _sticky_windows(self, cookies):
+        """{user id: until} of the sticky cookie in ``cookies`` still open."""
+        try:
+            windows = self._serializer.loads(cookies.get(STICKY_COOKIE, ''))
+        except BadData:
+            return {}
+        now = time.time()
+        return {user_id: until for user_id, until in windows.items() if until > now}
+
+    def _set_sticky_cookie(self, response):
+        stuck = g.get('replica_sticky')
+        if not stuck:
+            return response
+        windows = self._sticky_windows(request.cookies)
+        windows.update(stuck)
+        latest = sorted(windows.items(), key=lambda window: window[1])[-MAX_STICKY_USERS:]
+        response.set_cookie(STICKY_COOKIE, self._serializer.dumps(dict(latest)),
+                            max_age=math.ceil(self.sticky_seconds), httponly=True, samesite='Lax')
+        return response
+
+    def is_sticky(self, user_id, cookies=None):
+        """Whether the client's cookie (``cookies``, the request's by default) keeps ``user_id`` on the primary."""
+        return str(user_id) in self._sticky_windows(request.cookies if cookies is None else cookies)
+
+    def sticky(self, param):
+        """Decorator: the request reads from the primary while its ``param`` user is sticky."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                if self.keys and self.is_sticky(kwargs[param]):
+                    use_primary()
+                return view(**kwargs)
+            return wrapper
+        return decorator
+
+    def stats(self, engines):
+        now = time.monotonic()
+        with self._lock:
+            down = dict(self._down)
+        return [
+            {'bind': key, 'healthy': down.get(key, 0) <= now, 'pool': pool_stats(engines[key])}
+            for key in self.keys
+        ]
+
+
+replicas = ReplicaRouter()
+
+
+def use_primary():
+    """Run the rest of the current request on the primary."""
+    current_app.extensions['sqlalchemy'].session.info['primary'] = True
+
+
+class RoutingSession(Session):
+    """``db.session`` class: reads of GET requests go to a replica, see the module docstring."""
+
+    def _replica_key(self, mapper, clause):
+        if not replicas.keys or self.info.get('primary'):
+            return None
+        if self._flushing or getattr(clause, 'is_dml', False):
+            # Read-after-write: this request stays on the primary from now on
+            self.info['primary'] = True
+            return None
+        if mapper is None and clause is None:
+            return None
+        if not has_request_context() or request.method not in READ_METHODS:
+            return None
+        if 'replica' not in self.info:
+            self.info['replica'] = replicas.pick()
+        return self.info['replica']
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = self._replica_key(mapper, clause)
+            if key is not None:
+                return self._db.engines[key]
+        return Session.get_bind(self, mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def execute(self, statement, *args, **kwargs):
+        try:
+            return Session.execute(self, statement, *args, **kwargs)
+        except OperationalError:
+            key = self.info.get('replica')
+            if key is None or self.info.get('primary'):
+                raise
+            replicas.failed(key)
+            # Nothing was written yet (or we would be on the primary)
+            self.rollback()
+            self.info['primary'] = True
+            return Session.execute(self, statement, *args, **kwargs)
@@ -0,0 +1,447 @@
+"""
+The endpoints of the API, registered by ``create_app`` (see app.py).
+"""
+import time
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from utils import APIException, generate_sitemap
+from db_config import pool_stats
+from serializers import COLUMNAR, expand, fetch_many, fetch_one, fetch_profiles, iter_favorites
+from profiling import request_stats
+from models import db, User, People, Planet, FavoriteItem
+from pagination import paginate, parse_expand, parse_fields, parse_ids, parse_limit
+from streaming import wants_columnar, wants_stream, stream_response, iter_model_rows, STREAM_BATCH
+from cache import response_cache
+from leaderboard import leaderboard
+from versioning import conditional, bump_versions
+from bulk import read_bulk_body, bulk_create, bulk_update, bulk_delete
+from favorites import add_favorite, remove_favorite, forget_favorites, favorites_etag, FavoriteTargetMissing
+from writebehind import write_behind
+from replicas import replicas, use_primary
+from singleflight import single_flight
+
+api = Blueprint('api', __name__)
+
+# Handle/serialize errors like a JSON object
+@api.app_errorhandler(APIException)
+def handle_invalid_usage(error):
+    return jsonify(error.to_dict()), error.status_code
+
+# generate sitemap with all your endpoints
+@api.route('/')
+def sitemap():
+    return generate_sitemap(current_app)
+
+@api.route('/user', methods=['GET'])
+def handle_hello():
+
+    response_body = {
+        "msg": "Hello, this is your GET /user response "
+    }
+
+    return jsonify(response_body), 200
+
+@api.route('/health/db', methods=['GET'])
+def get_db_health():
+    use_primary()
+    start = time.perf_counter()
+    try:
+        db.session.execute(text('SELECT 1'))
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        return jsonify({'msg': 'database unavailable', 'error': type(error).__name__, 'pool': pool_stats(db.engine),
+                        'replicas': replicas.stats(db.engines)}), 503
+
+    latency_ms = round((time.perf_counter() - start) * 1000, 3)
+    return jsonify({'msg': 'database ok', 'latency_ms': latency_ms, 'pool': pool_stats(db.engine),
+                    'replicas': replicas.stats(db.engines)}), 200
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    metrics = request_stats.prometheus() + single_flight.prometheus()
+    return current_app.response_class(metrics, mimetype='text/plain; version=0.0.4')
+
+@api.route('/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({'msg': 'get cache stats ok', 'data': response_cache.stats()}), 200
+
+def list_page(model, msg):
+    """One page of ``model``, or the items of ``?ids=`` (plus the ``missing`` ones), with their ``?expand=``."""
+    columnar = wants_columnar()
+    names = parse_expand(request.args, model)
+    if 'ids' in request.args:
+        data, missing = fetch_many(model, parse_ids(request.args), parse_fields(request.args, model), columnar)
+        body = {'msg': msg, 'data': expand(model, data, names), 'missing': missing}
+    else:
+        page, next_cursor = paginate(model, request.args, columnar)
+        body = {'msg': msg, 'data': expand(model, page, names), 'next': next_cursor}
+
+    response = jsonify(body)
+    if columnar:
+        response.mimetype = COLUMNAR
+    return response, 200
+
+def stream_list(model, msg):
+    if 'expand' in request.args:
+        raise APIException('El parámetro "expand" no está disponible con stream', status_code=400)
+    return stream_response(iter_model_rows(model, request.args), msg)
+
+@api.route('/users', methods=['GET'])
+@conditional('users')
+def get_users():
+    if wants_stream():
+        return stream_list(User, 'get users ok')
+
+    return list_page(User, 'get users ok')
+
+def user_favorites_etag(user_id):
+    pending = write_behind.etag_suffix(user_id)
+    return f'{favorites_etag([user_id])}-{pending}' if pending else favorites_etag([user_id])
+
+def profiles_etag():
+    return favorites_etag(parse_ids(request.args))
+
+@api.route('/user/<int:user_id>/favorites', methods=['GET'])
+@replicas.sticky('user_id')
+@conditional('favorite_items', 'people', 'planets', suffix=user_favorites_etag)
+@single_flight.collapse('favorites')
+def get_favorites_by_user(user_id):
+    pending = write_behind.pending_changes(user_id)
+    if pending:
+        favorites = write_behind.iter_favorites(user_id, pending)
+    else:
+        favorites = iter_favorites(user_id, STREAM_BATCH if wants_stream() else None)
+
+    if wants_stream():
+        return stream_response(favorites, key='Favoritos')
+
+    favorites_user_serialize = list(favorites)
+
+    return jsonify ({'Favoritos': favorites_user_serialize}), 200
+
+@api.route('/users/<int:user_id>/profile', methods=['GET'])
+@replicas.sticky('user_id')
+@conditional('users', 'favorite_items', 'people', 'planets', suffix=lambda user_id: favorites_etag([user_id]))
+def get_user_profile(user_id):
+    profile = fetch_profiles([user_id]).get(user_id)
+    if profile is None:
+        return jsonify ({'mg': f'El usuario con ID {user_id} no existe'}), 404
+
+    return jsonify ({'msg': 'get profile ok', 'data': profile}), 200
+
+@api.route('/users/profiles', methods=['GET'])
+@conditional('users', 'favorite_items', 'people', 'planets', suffix=profiles_etag)
+def get_user_profiles():
+    user_ids = parse_ids(request.args)
+    profiles = fetch_profiles(user_ids)
+    missing = [user_id for user_id in user_ids if user_id not in profiles]
+
+    return jsonify ({
+        'msg': 'get profiles ok',
+        'data': [profiles[user_id] for user_id in user_ids if user_id in profiles],
+        'missing': missing
+    }), 200
+
+
+
+@api.route('/leaderboard/people', methods=['GET'])
+def get_people_leaderboard():
+    top = leaderboard.top('people', parse_limit({'limit': request.args.get('limit', 10)}))
+
+    return jsonify ({'msg': 'get people leaderboard ok', 'data': top}), 200
+
+@api.route('/leaderboard/planets', methods=['GET'])
+def get_planets_leaderboard():
+    top = leaderboard.top('planet', parse_limit({'limit': request.args.get('limit', 10)}))
+
+    return jsonify ({'msg': 'get planets leaderboard ok', 'data': top}), 200
+
+def bulk_write(model, resource, label):
+    items = read_bulk_body()
+    if request.method == 'POST':
+        results = bulk_create(model, items)
+    elif request.method == 'PUT':
+        results = bulk_update(model, items)
+    else:
+        results = bulk_delete(model, items)
+
+    response_cache.invalidate(resource)
+    if request.method == 'PUT' and any(isinstance(item, dict) and 'name' in item for item in items):
+        leaderboard.mark_stale('people' if model is People else 'planet')
+    for result in results:
+        if result['status'] in ('updated', 'deleted'):
+            response_cache.invalidate(resource, result['id'])
+    if model is Planet and request.method == 'DELETE':
+        response_cache.invalidate('people')
+
+    return jsonify({'msg': f'Carga masiva de {label} procesada', 'data': results}), 200
+
+@api.route('/people', methods=['GET'])
+@conditional('people', expand=People)
+@response_cache.cached('people')
+def get_people():
+    if wants_stream() and 'ids' not in request.args:
+        return stream_list(People, 'get all people ok')
+
+    return list_page(People, 'get all people ok')
+
+@api.route('/people', methods=['POST'])
+def add_person():
+    body = request.get_json(silent=True)
+
+    if body is None:
+        return jsonify({'msg': 'Debes enviar imformación del personaje'}), 400
+    
+    if 'name' not in body:
+        return jsonify({'msg': 'El campo NAME del personaje es obligatorio'}), 400
+    
+    if People.query.filter_by(name=body['name']).first():
+        return jsonify({'msg': 'Ese personaje ya esta creado'}), 400
+    
+    new_person = People(
+        name = body['name'],
+        gender = body.get('gender'),
+        height = body.get('height'),
+        mass = body.get('mass'),
+        planet_id = body.get('planet_id'),
+        url = body.get('url')
+    )
+
+    db.session.add(new_person)
+    db.session.commit()
+    response_cache.invalidate('people')
+
+    return jsonify({'msg': 'Personaje añadido', 'data': new_person.serialize()})
+
+@api.route('/people/<int:people_id>', methods=['PUT'])
+def update_person(people_id):
+    person_to_update = People.query.get(people_id)
+    if person_to_update is None:
+        return jsonify({'msg': f'El personaje {people_id} no existe'}),404
+
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify({'msg': 'Debes enviar información del personaje'}), 400
+    
+    if 'name' in body:
+        person_to_update.name = body['name']
+    if 'gender' in body:
+        person_to_update.gender = body['gender']
+    if 'height' in body:
+        person_to_update.height = body['height']
+    if 'mass' in body:
+        person_to_update.mass = body['mass']
+    if 'planet_id' in body:
+        person_to_update.planet_id = body['planet_id']
+    if 'url' in body:
+        person_to_update.url = body['url']
+
+    db.session.commit()
+    response_cache.invalidate('people', people_id)
+    if 'name' in body:
+        leaderboard.mark_stale('people')
+    return jsonify({'msg': 'Personaje actualizado', 'data': person_to_update.serialize()}), 200
+
+@api.route('/people/<int:people_id>', methods=['DELETE'])
+def remove_person(people_id):
+    person_to_remove = People.query.get(people_id)
+    if person_to_remove is None:
+        return jsonify({'msg': f'El personaje {people_id} no existe'}),404
+    
+    forget_favorites('people', [people_id])
+    db.session.delete(person_to_remove)
+    db.session.commit()
+    response_cache.invalidate('people', people_id)
+    return jsonify({'msg': 'Personaje Borrado'}), 200
+
+@api.route('/people/<int:people_id>', methods=['GET'])
+@conditional('people', expand=People)
+@response_cache.cached('people')
+@single_flight.collapse('people')
+def get_person(people_id):
+    names = parse_expand(request.args, People)
+    person = fetch_one(People, people_id)
+    if person is None:
+        return jsonify ({'mg': f'El personaje con ID {people_id} no existe'}), 404
+    
+    expand(People, [person], names)
+    return jsonify ({'mg': 'get person ok', 'data': person}), 200
+
+@api.route('/people/bulk', methods=['POST', 'PUT', 'DELETE'])
+def bulk_people():
+    return bulk_write(People, 'people', 'personajes')
+
+def favorite_target_missing(missing, user_id, item_msg):
+    if not missing.user_exists:
+        return jsonify ({'mg': f'El usuario con ID {user_id} no existe'}), 404
+    return jsonify ({'mg': item_msg}), 404
+
+def queue_favorite(user_id, kind, item_id, action, item_msg):
+    try:
+        change = write_behind.enqueue(user_id, kind, item_id, action)
+    except FavoriteTargetMissing as missing:
+        return favorite_target_missing(missing, user_id, item_msg)
+    return jsonify({'msg': 'Cambio de favorito en cola', 'data': change}), 202
+
+@api.route('/favorite/<int:user_id>/people/<int:people_id>', methods=['POST'])
+def add_favorite_person(user_id, people_id):
+    if write_behind.enabled:
+        return queue_favorite(user_id, 'people', people_id, 'add', f'El personaje con ID {people_id} no existe')
+
+    try:
+        created = add_favorite(user_id, 'people', people_id)
+    except FavoriteTargetMissing as missing:
+        return favorite_target_missing(missing, user_id, f'El personaje con ID {people_id} no existe')
+
+    if not created:
+        return jsonify({'msg': f'Al usuario {user_id} ya le gusta el personaje {people_id}'}), 200
+
+    new_favorito = FavoriteItem(user_id=user_id, people_id=people_id)
+    return jsonify({'msg': 'Person favorite add', 'data': new_favorito.serialize()}), 200
+
+@api.route('/favorite/<int:user_id>/people/<int:people_id>', methods=['DELETE'])
+def remove_favorite_person(user_id, people_id):
+    if write_behind.enabled:
+        return queue_favorite(user_id, 'people', people_id, 'remove', f'El personaje con ID {people_id} no existe')
+
+    try:
+        removed = remove_favorite(user_id, 'people', people_id)
+    except FavoriteTargetMissing as missing:
+        return favorite_target_missing(missing, user_id, f'El personaje con ID {people_id} no existe')
+
+    if removed:
+        return jsonify({'msg': 'Favorito eliminado'}), 200
+    else:
+        return jsonify({'msg': f'Al usuario {user_id} no le gusta el personaje {people_id}'}), 400
+
+
+
+@api.route('/planets', methods=['GET'])
+@conditional('planets', expand=Planet)
+@response_cache.cached('planets')
+def get_planets():
+    if wants_stream() and 'ids' not in request.args:
+        return stream_list(Planet, 'get all planets ok')
+
+    return list_page(Planet, 'get all planets ok')
+
+@api.route('/planet', methods=['POST'])
+def add_planet():
+    body = request.get_json(silent=True)
+
+    if body is None:
+        return jsonify({'msg': 'Debes enviar información del planeta'}), 400
+    
+    if 'name' not in body:
+        return jsonify({'msg': 'El campo NAME del planeta es obligatorio'}), 400
+    
+    if Planet.query.filter_by(name=body['name']).first():
+        return jsonify({'msg': 'Ese planeta ya esta creado'}), 400
+    
+    new_planet = Planet(
+        name = body['name'],
+        diameter = body.get('diameter'),
+        climate = body.get('climate'),
+        population = body.get('population'),
+        terrain = body.get('terrain'),
+        url = body.get('url')
+    )
+    
+    db.session.add(new_planet)
+    db.session.commit()
+    response_cache.invalidate('planets')
+
+    return jsonify({'msg': 'Planeta añadido', 'data': new_planet.serialize()}), 200
+
+@api.route('/planet/<int:planet_id>', methods=['PUT'])
+def update_planet(planet_id):
+    planet_to_update = Planet.query.get(planet_id)
+    if planet_to_update is None:
+        return jsonify({'msg': f'El planeta {planet_id} no existe'}),404
+
+    body = request.get_json(silent=True)
+    if body is None:
+        return jsonify({'msg': 'Debes enviar información del planeta'}), 400
+    
+    if 'name' in body:
+        planet_to_update.name = body['name']
+    if 'diameter' in body:
+        planet_to_update.diameter = body['diameter']
+    if 'climate' in body:
+        planet_to_update.climate = body['climate']
+    if 'population' in body:
+        planet_to_update.population = body['population']
+    if 'terrain' in body:
+        planet_to_update.terrain = body['terrain']
+    if 'url' in body:
+        planet_to_update.url = body['url']
+
+    db.session.commit()
+    response_cache.invalidate('planets', planet_id)
+    if 'name' in body:
+        leaderboard.mark_stale('planet')
+    return jsonify({'msg': 'Planeta actualizado', 'data': planet_to_update.serialize()}), 200
+
+@api.route('/planet/<int:planet_id>', methods=['DELETE'])
+def remove_planet(planet_id):
+    planet_to_remove = Planet.query.get(planet_id)
+    if planet_to_remove is None:
+        return jsonify({'msg': f'El planeta {planet_id} no existe'}),404
+    
+    forget_favorites('planet', [planet_id])
+    db.session.delete(planet_to_remove)
+    # Its people lose planet_id in the database (ON DELETE SET NULL), out of the session's sight
+    bump_versions(People.__tablename__)
+    db.session.commit()
+    response_cache.invalidate('planets', planet_id)
+    response_cache.invalidate('people')
+    return jsonify({'msg': 'Planeta Borrado'}), 200
+
+@api.route('/planets/<int:planet_id>', methods=['GET'])
+@conditional('planets', expand=Planet)
+@response_cache.cached('planets')
+@single_flight.collapse('planets')
+def get_planet(planet_id):
+    names = parse_expand(request.args, Planet)
+    planet = fetch_one(Planet, planet_id)
+    if planet is None:
+        return jsonify ({'mg': f'El planeta con ID {planet_id} no existe'}), 404
+
+    expand(Planet, [planet], names)
+    return jsonify ({'mg': 'get planet ok', 'data': planet}), 200
+
+@api.route('/planets/bulk', methods=['POST', 'PUT', 'DELETE'])
+def bulk_planets():
+    return bulk_write(Planet, 'planets', 'planetas')
+
+@api.route('/favorite/<int:user_id>/planet/<int:planet_id>', methods=['POST'])
+def add_favorite_planet(user_id, planet_id):
+    if write_behind.enabled:
+        return queue_favorite(user_id, 'planet', planet_id, 'add', f'El planeta con ID {planet_id} no existe')
+
+    try:
+        created = add_favorite(user_id, 'planet', planet_id)
+    except FavoriteTargetMissing as missing:
+        return favorite_target_missing(missing, user_id, f'El planeta con ID {planet_id} no existe')
+
+    if not created:
+        return jsonify({'msg': f'Al usuario {user_id} ya le gusta el planeta {planet_id}'}), 400
+
+    new_favorito = FavoriteItem(user_id=user_id, planet_id=planet_id)
+    return jsonify({'msg': 'Planet favorite add', 'data': new_favorito.serialize()}), 200
+
+@api.route('/favorite/<int:user_id>/planet/<int:planet_id>', methods=['DELETE'])
+def remove_favorite_planet(user_id, planet_id):
+    if write_behind.enabled:
+        return queue_favorite(user_id, 'planet', planet_id, 'remove', f'El planeta con ID {planet_id} no existe')
+
+    try:
+        removed = remove_favorite(user_id, 'planet', planet_id)
+    except FavoriteTargetMissing as missing:
+        return favorite_target_missing(missing, user_id, f'El planeta con ID {planet_id} no existe')
+
+    if removed:
+        return jsonify({'msg': 'Favorito eliminado'}), 200
+    else:
+        return jsonify({'msg': f'Al usuario {user_id} no le gusta el planeta {planet_id}'}), 400
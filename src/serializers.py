@@ -0,0 +1,230 @@
+"""
+Serialization straight from row tuples, and the app's JSON encoder.
+
+The read endpoints select only the columns of ``Model.public_fields`` with Core
+statements and zip them into dicts, skipping ORM instances and the identity
+map. The result has the same keys and values as ``Model.serialize()``.
+
+Clients that send ``Accept: application/x-columnar+json`` get the pages of the
+list endpoints as one table instead, with the field names written once:
+``"data": {"fields": ["id", "name"], "rows": [[1, "Luke"], [2, "C-3PO"]]}``.
+
+``?expand=`` adds related rows through the relationships of ``EXPANSIONS``
+(``/people?expand=planet``, ``/planets/1?expand=residents``) with one IN query
+per relationship, whatever the number of items.
+
+``JSON_ENCODER=orjson`` makes the compact JSON of responses go through orjson
+when it is installed (``pip install orjson``). Output stays byte-identical to
+Flask's encoder: keys are sorted, and any payload orjson would write
+differently (non-ASCII text, which Flask escapes, or values orjson rejects)
+falls back to the standard encoder.
+"""
+import os
+import logging
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from models import db, User, People, Planet, FavoriteItem
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COMPACT_SEPARATORS = (',', ':')
+COLUMNAR = 'application/x-columnar+json'
+
+
+def rows_to_dicts(fields, rows):
+    return [dict(zip(fields, row)) for row in rows]
+
+def rows_to_columns(fields, rows):
+    """The columnar table of ``rows`` (cut to ``fields``)."""
+    width = len(fields)
+    return {'fields': list(fields), 'rows': [list(row[:width]) for row in rows]}
+
+# ?expand= name -> relationship it follows
+EXPANSIONS = {
+    People: {'planet': People.planet},
+    Planet: {'residents': Planet.habitant}
+}
+
+def related_model(model, name):
+    return EXPANSIONS[model][name].property.mapper.class_
+
+def fetch_related(model, name, ids):
+    """
+    The ``name`` relationship of each of ``ids``, by id: the serialized item (or
+    None) for a many-to-one, a list of them for a one-to-many. One SELECT.
+    """
+    relationship = EXPANSIONS[model][name]
+    target, many = related_model(model, name), relationship.property.uselist
+    related = {item_id: [] if many else None for item_id in ids}
+    if not ids:
+        return related
+
+    rows = db.session.execute(
+        select(*[getattr(target, field) for field in target.public_fields], model.id)
+        .select_from(model)
+        .join(relationship)
+        .where(model.id.in_(ids))
+        .order_by(target.id)
+    )
+    width = len(target.public_fields)
+    for row in rows:
+        item = dict(zip(target.public_fields, row))
+        if many:
+            related[row[width]].append(item)
+        else:
+            related[row[width]] = item
+    return related
+
+def expand(model, data, names):
+    """Add the ``names`` relationships to ``data``, a list of dicts or a columnar table."""
+    if not names:
+        return data
+    columnar = isinstance(data, dict)
+    if columnar:
+        id_index = data['fields'].index('id')
+        ids = [row[id_index] for row in data['rows']]
+    else:
+        ids = [item['id'] for item in data]
+
+    for name in names:
+        related = fetch_related(model, name, ids)
+        if columnar:
+            data['fields'].append(name)
+            for row in data['rows']:
+                row.append(related[row[id_index]])
+        else:
+            for item in data:
+                item[name] = related[item['id']]
+    return data
+
+def fetch_many(model, ids, fields, columnar=False):
+    """
+    ``fields`` of the existing ``ids``, in the order given, as dicts or a
+    columnar table, and the ids that don't exist. One SELECT.
+    """
+    id_index = fields.index('id')
+    rows = db.session.execute(select(*[getattr(model, field) for field in fields]).where(model.id.in_(ids)))
+    by_id = {row[id_index]: row for row in rows}
+    found = [by_id[item_id] for item_id in ids if item_id in by_id]
+    data = rows_to_columns(fields, found) if columnar else rows_to_dicts(fields, found)
+    return data, [item_id for item_id in ids if item_id not in by_id]
+
+def one_query(model, item_id):
+    return select(*[getattr(model, field) for field in model.public_fields]).where(model.id == item_id)
+
+def row_to_dict(model, row):
+    return None if row is None else dict(zip(model.public_fields, row))
+
+def fetch_one(model, item_id):
+    """``model.serialize()`` of the row ``item_id`` without loading the ORM object, or None."""
+    return row_to_dict(model, db.session.execute(one_query(model, item_id)).first())
+
+def favorites_query(*user_ids):
+    """
+    The favorites of ``user_ids`` with the columns of their planet and person,
+    plus the user id, in one SELECT.
+    """
+    planets, people, favorites = Planet.__table__, People.__table__, FavoriteItem.__table__
+    owner = favorites.c.user_id == user_ids[0] if len(user_ids) == 1 else favorites.c.user_id.in_(user_ids)
+    return (
+        select(
+            *[planets.c[field] for field in Planet.public_fields],
+            *[people.c[field] for field in People.public_fields],
+            favorites.c.user_id
+        )
+        .select_from(
+            favorites
+            .outerjoin(planets, favorites.c.planet_id == planets.c.id)
+            .outerjoin(people, favorites.c.people_id == people.c.id)
+        )
+        .where(owner)
+        .order_by(favorites.c.id)
+    )
+
+def iter_favorites(user_id, batch_size=None):
+    """Serialized planets and people favorited by ``user_id``, in favorite order."""
+    statement = favorites_query(user_id)
+    if batch_size is not None:
+        statement = statement.execution_options(stream_results=True)
+    result = db.session.execute(statement)
+    if batch_size is not None:
+        result = result.yield_per(batch_size)
+
+    for row in result:
+        yield from favorite_row_items(row)
+
+def split_favorite_row(row):
+    """(planet, person) of one row of ``favorites_query``, either of them None."""
+    split, end = len(Planet.public_fields), len(Planet.public_fields) + len(People.public_fields)
+    planet, person = row[:split], row[split:end]
+    return (
+        dict(zip(Planet.public_fields, planet)) if planet[0] is not None else None,
+        dict(zip(People.public_fields, person)) if person[0] is not None else None
+    )
+
+def favorite_row_items(row):
+    """The planet and/or person of one row of ``favorites_query``."""
+    for item in split_favorite_row(row):
+        if item is not None:
+            yield item
+
+def fetch_profiles(user_ids):
+    """
+    Profiles of the existing ``user_ids`` by id: public fields, favorites count
+    by type (from the counters on ``users``) and the favorited items. Two
+    SELECTs, whatever the number of users.
+    """
+    users = User.__table__
+    rows = db.session.execute(
+        select(
+            *[users.c[field] for field in User.public_fields],
+            users.c.favorite_people_count,
+            users.c.favorite_planets_count
+        )
+        .where(users.c.id.in_(user_ids))
+    )
+    profiles = {}
+    for row in rows:
+        profile = dict(zip(User.public_fields, row))
+        profile['favorites_count'] = {'people': row.favorite_people_count, 'planets': row.favorite_planets_count}
+        profile['favorites'] = {'people': [], 'planets': []}
+        profiles[profile['id']] = profile
+
+    if profiles:
+        for row in db.session.execute(favorites_query(*profiles)):
+            planet, person = split_favorite_row(row)
+            favorites = profiles[row.user_id]['favorites']
+            if planet is not None:
+                favorites['planets'].append(planet)
+            if person is not None:
+                favorites['people'].append(person)
+    return profiles
+
+
+class APIJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider with an optional orjson fast path for compact output."""
+
+    def __init__(self, app):
+        DefaultJSONProvider.__init__(self, app)
+        encoder = os.getenv('JSON_ENCODER', 'json')
+        if encoder == 'orjson' and orjson is None:
+            logger.warning('JSON_ENCODER=orjson pero orjson no está instalado, se usa json')
+        self.use_orjson = encoder == 'orjson' and orjson is not None
+
+    def dumps(self, obj, **kwargs):
+        if self.use_orjson and kwargs.get('separators') == COMPACT_SEPARATORS and not kwargs.get('indent'):
+            try:
+                encoded = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+            except TypeError:
+                encoded = None
+            if encoded is not None and encoded.isascii():
+                return encoded.decode()
+        return DefaultJSONProvider.dumps(self, obj, **kwargs)
+
+def setup_json(app):
+    app.json = APIJSONProvider(app)
@@ -0,0 +1,133 @@
+"""
+Request coalescing (single-flight) for hot reads.
+
+When identical GET requests hit a worker at the same time (gunicorn
+``--threads``), the first one runs the view and the others wait for it and
+answer with a copy of its body: one database fetch and one serialization for
+all of them.
+
+Requests are identical when they have the same path and ETag. The ETag holds
+the version of every table the view reads (see versioning.py), so once a write
+commits, the requests that follow it read new versions and start a new flight
+instead of joining one that may have read the old rows. That covers every
+writer that bumps the versions: the handlers, bulk writes, the admin, the
+write-behind flush and the database cascades. ``collapse`` therefore goes
+under ``@conditional``.
+
+A request waits at most ``SINGLEFLIGHT_TIMEOUT_MS`` for the one in flight, then
+runs the view itself, as it does when that one failed. Streamed responses are
+never shared. Counters per resource are served at ``/metrics``. Like the
+response cache this is per process, and the async routes of asgi.py are not
+coalesced.
+
+    SINGLEFLIGHT             0 to turn it off (default 1)
+    SINGLEFLIGHT_TIMEOUT_MS  longest wait for the request in flight (default 1000)
+"""
+import os
+import threading
+from functools import wraps
+from flask import current_app, g, request
+from streaming import wants_stream
+
+DEFAULT_TIMEOUT_MS = 1000
+
+COUNTERS = (
+    # name, counter, help
+    ('api_singleflight_leaders_total', 'leaders', 'Reads that ran the view and shared their response'),
+    ('api_singleflight_collapsed_total', 'collapsed', 'Reads answered with the response of an identical read'),
+    ('api_singleflight_timeouts_total', 'timeouts', 'Reads that stopped waiting and ran the view themselves'),
+    ('api_singleflight_fallbacks_total', 'fallbacks', 'Reads that ran the view themselves after the shared one failed')
+)
+
+
+class Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # (body, status, mimetype) if the leader got a response
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self.enabled = True
+        self.timeout = DEFAULT_TIMEOUT_MS / 1000
+        self._flights = {}   # (path, etag) -> Flight
+        self._counters = {}  # resource -> counter -> count
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = os.getenv('SINGLEFLIGHT', '1').lower() not in ('0', 'false', 'no')
+        self.timeout = float(os.getenv('SINGLEFLIGHT_TIMEOUT_MS', DEFAULT_TIMEOUT_MS)) / 1000
+        app.extensions['single_flight'] = self
+
+    def collapse(self, resource):
+        """Share the response of identical concurrent GETs of ``resource``."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**kwargs):
+                etag = g.get('etag')
+                if not self.enabled or etag is None or wants_stream():
+                    return view(**kwargs)
+
+                key = (request.full_path, etag)
+                with self._lock:
+                    flight = self._flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self._flights[key] = Flight()
+                        self._count(resource, 'leaders')
+
+                if leader:
+                    return self._lead(key, flight, view, kwargs)
+                return self._follow(resource, flight, view, kwargs)
+            return wrapper
+        return decorator
+
+    def _lead(self, key, flight, view, kwargs):
+        try:
+            response = current_app.make_response(view(**kwargs))
+            if not response.is_streamed:
+                flight.result = (response.get_data(), response.status_code, response.mimetype)
+            return response
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _follow(self, resource, flight, view, kwargs):
+        if not flight.done.wait(self.timeout):
+            counter = 'timeouts'
+        elif flight.result is None:
+            counter = 'fallbacks'
+        else:
+            counter = 'collapsed'
+        with self._lock:
+            self._count(resource, counter)
+
+        if counter != 'collapsed':
+            return view(**kwargs)
+        body, status, mimetype = flight.result
+        return current_app.response_class(body, status=status, mimetype=mimetype)
+
+    def _count(self, resource, counter):
+        counters = self._counters.setdefault(resource, dict.fromkeys([name for _, name, _ in COUNTERS], 0))
+        counters[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            return {resource: dict(counters) for resource, counters in self._counters.items()}
+
+    def prometheus(self):
+        snapshot = self.stats()
+        lines = []
+        for name, counter, help_text in COUNTERS:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for resource, counters in sorted(snapshot.items()):
+                lines.append(f'{name}{{resource="{resource}"}} {counters[counter]}')
+        return '\n'.join(lines) + '\n'
+
+
+single_flight = SingleFlight()
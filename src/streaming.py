@@ -0,0 +1,57 @@
+"""
+Opt-in streaming for the list endpoints.
+
+``Accept: application/x-ndjson`` sends one JSON object per line and ``?stream=1``
+sends the usual ``{"msg": ..., "data": [...]}`` body as a chunked array. Either way
+rows are read from a server-side cursor in batches and written as they arrive, so
+memory per request does not grow with the table. Streamed bodies are always
+JSON or NDJSON, never columnar.
+"""
+from flask import Response, current_app, request, stream_with_context
+from models import db
+from pagination import build_query
+from serializers import COMPACT_SEPARATORS, COLUMNAR
+
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH = 500
+
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(['application/json', NDJSON]) == NDJSON
+
+def wants_columnar():
+    return request.accept_mimetypes.best_match(['application/json', COLUMNAR]) == COLUMNAR
+
+def wants_stream():
+    return wants_ndjson() or request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def iter_model_rows(model, args):
+    """Every row of ``model`` matching the request filters (only the ?fields= columns), as dicts."""
+    statement, fields, _, _ = build_query(model, args)
+    result = db.session.execute(statement.execution_options(stream_results=True))
+    for row in result.yield_per(STREAM_BATCH):
+        yield dict(zip(fields, row))
+
+def _dumps(obj):
+    return current_app.json.dumps(obj, separators=COMPACT_SEPARATORS)
+
+def _ndjson_chunks(items):
+    for item in items:
+        yield _dumps(item) + '\n'
+
+def _json_array_chunks(items, msg, key):
+    dumps = _dumps
+    yield '{' + (f'"msg":{dumps(msg)},' if msg is not None else '') + f'{dumps(key)}:['
+    first = True
+    for item in items:
+        yield dumps(item) if first else ',' + dumps(item)
+        first = False
+    yield ']}'
+
+def stream_response(items, msg=None, key='data'):
+    """Chunked response for ``items`` in the format the client asked for."""
+    if wants_ndjson():
+        chunks, mimetype = _ndjson_chunks(items), NDJSON
+    else:
+        chunks, mimetype = _json_array_chunks(items, msg, key), 'application/json'
+    return Response(stream_with_context(chunks), status=200, mimetype=mimetype)
@@ -0,0 +1,111 @@
+"""
+Per-table version counters and conditional GET (ETag / If-None-Match).
+
+Every flush that inserts, updates or deletes rows bumps the counter of the
+affected tables in ``table_versions`` inside the same transaction. The ETag of a
+read endpoint is built from the counters of the tables it reads, so answering a
+matching ``If-None-Match`` with 304 costs one small SELECT and no serialization.
+Writes done with Core statements (bulk endpoints, raw upserts) must call
+``bump_versions`` themselves.
+"""
+import hashlib
+from functools import wraps
+from flask import current_app, g, request
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+from models import db, TableVersion
+from compression import compression
+from pagination import parse_expand
+from serializers import related_model
+
+versions_table = TableVersion.__table__
+
+
+def bump_versions(*tables, connection=None):
+    """Increment the version of ``tables`` in the current transaction."""
+    if not tables:
+        return
+    connection = connection if connection is not None else db.session.connection()
+    in_tables = versions_table.c.table_name.in_(tables)
+    result = connection.execute(
+        versions_table.update().where(in_tables).values(version=versions_table.c.version + 1)
+    )
+    if result.rowcount == len(tables):
+        return
+
+    # First write ever on some table: create its counter
+    existing = set(connection.execute(select(versions_table.c.table_name).where(in_tables)).scalars())
+    for table_name in set(tables) - existing:
+        try:
+            with connection.begin_nested():
+                connection.execute(versions_table.insert().values(table_name=table_name, version=1))
+        except IntegrityError:
+            # Another transaction created it first
+            connection.execute(
+                versions_table.update()
+                .where(versions_table.c.table_name == table_name)
+                .values(version=versions_table.c.version + 1)
+            )
+
+def versions_query(tables):
+    return (
+        select(versions_table.c.table_name, versions_table.c.version)
+        .where(versions_table.c.table_name.in_(tables))
+    )
+
+def etag_from_rows(tables, rows, path, accept, coding=None):
+    versions = dict(rows)
+    tag = '.'.join(str(versions.get(table, 0)) for table in tables)
+    variant = f'{path}|{accept}|{coding}' if coding else f'{path}|{accept}'
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return f'{tag}-{digest}'
+
+def current_versions(*tables):
+    versions = dict(db.session.execute(versions_query(tables)).all())
+    return [versions.get(table, 0) for table in tables]
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_flushed_tables(session, flush_context):
+    tables = set()
+    for obj in list(session.new) + list(session.deleted):
+        tables.add(obj.__table__.name)
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            tables.add(obj.__table__.name)
+    tables.discard(versions_table.name)
+    if tables:
+        bump_versions(*sorted(tables), connection=session.connection())
+
+def make_etag(tables, suffix=''):
+    rows = db.session.execute(versions_query(tables)).all()
+    coding = compression.negotiate(request.headers.get('Accept-Encoding'))
+    etag = etag_from_rows(tables, rows, request.full_path, request.headers.get('Accept', ''), coding)
+    return f'{etag}-{suffix}' if suffix else etag
+
+def conditional(*tables, suffix=None, expand=None):
+    """
+    Answer ``If-None-Match`` with 304 while none of ``tables`` changed, and tag
+    successful responses with their ETag. ``suffix(**kwargs)`` can add state
+    that is not in the tables yet (pending write-behind changes). With
+    ``expand=model`` the tables of the request's ``?expand=`` count too. The
+    ETag is left in ``g.etag`` for the view (see singleflight.py).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            read_tables = tables
+            if expand is not None:
+                names = parse_expand(request.args, expand)
+                read_tables += tuple(related_model(expand, name).__tablename__ for name in names)
+            etag = g.etag = make_etag(read_tables, suffix(**kwargs) if suffix is not None else '')
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            response = current_app.make_response(view(**kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
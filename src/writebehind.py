@@ -0,0 +1,331 @@
+"""
+Write-behind mode for favorite toggles (``FAVORITES_WRITE_BEHIND=1``).
+
+``POST`` / ``DELETE /favorite/...`` check that the user and the item exist,
+append the change to a local log (fsync'd before answering 202) and return
+without touching ``favorite_items``. A background thread flushes the pending
+changes every ``FAVORITES_FLUSH_MS`` or as soon as ``FAVORITES_FLUSH_BATCH``
+are waiting, in one transaction per batch (see
+``favorites.apply_favorite_changes``).
+
+Changes are coalesced per (user, kind, item): only the last one is written, so
+an add followed by a remove costs a single idempotent DELETE, and toggling the
+same favorite many times between flushes costs one statement.
+
+Each process appends to its own ``<pid>.log`` in ``FAVORITES_LOG_DIR``. A flush
+seals the log first and deletes it once committed; if the database is down the
+changes go back to the queue and the sealed files stay. Logs left by a process
+that died (crash, restart) are claimed and flushed by the next one to start.
+
+Nothing runs while the app is created: with ``preload_app`` that happens in the
+gunicorn master, and a thread started there would be forked mid-flight. Each
+worker starts its log and flusher in ``post_fork`` (gunicorn.conf.py), or at its
+first request under other servers.
+
+``GET /user/<id>/favorites`` overlays the changes still pending in this process,
+so a client reads its own writes when it talks to the same worker (single
+worker, or sticky sessions). Counters, profiles and leaderboards catch up at
+the next flush.
+
+    FAVORITES_WRITE_BEHIND  1 to enable (default 0, each toggle commits)
+    FAVORITES_LOG_DIR       directory of the logs (default <tmp>/favorites-log)
+    FAVORITES_FLUSH_MS      longest wait before a flush (default 200)
+    FAVORITES_FLUSH_BATCH   pending changes that trigger a flush (default 500)
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import tempfile
+import threading
+from flask import has_app_context
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from models import db
+from favorites import FAVORITE_KINDS, FavoriteTargetMissing, apply_favorite_changes, target_exists
+from leaderboard import leaderboard
+from replicas import replicas
+from serializers import favorites_query, split_favorite_row
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_MS = 200
+DEFAULT_FLUSH_BATCH = 500
+
+# Order of the items in a row of favorites_query
+ROW_KINDS = ('planet', 'people')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _read_log(path):
+    changes = []
+    with open(path) as log:
+        for line in log:
+            try:
+                entry = json.loads(line)
+                changes.append((entry['user_id'], entry['kind'], entry['item_id'], entry['action']))
+            except (ValueError, KeyError):
+                # Torn last line of a process killed while writing: never acknowledged
+                logger.warning('Línea inválida en %s ignorada', path)
+    return changes
+
+
+class WriteBehind:
+
+    def __init__(self):
+        self.enabled = False
+        self.app = None
+        self.log_dir = None
+        self.flush_seconds = DEFAULT_FLUSH_MS / 1000
+        self.flush_batch = DEFAULT_FLUSH_BATCH
+        self._pid = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}    # (user_id, kind, item_id) -> 'add' | 'remove', in arrival order
+        self._flushing = {}   # batch being written
+        self._sealed = []     # log files holding the pending and flushing changes
+        self._log = None
+        self._seq = 0
+        self._generation = 0
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.enabled = os.getenv('FAVORITES_WRITE_BEHIND', '0').lower() in ('1', 'true', 'yes')
+        self.app = app
+        self.log_dir = os.getenv('FAVORITES_LOG_DIR', os.path.join(tempfile.gettempdir(), 'favorites-log'))
+        self.flush_seconds = float(os.getenv('FAVORITES_FLUSH_MS', DEFAULT_FLUSH_MS)) / 1000
+        self.flush_batch = int(os.getenv('FAVORITES_FLUSH_BATCH', DEFAULT_FLUSH_BATCH))
+        if self.enabled:
+            app.before_request(self.start)
+        app.extensions['write_behind'] = self
+
+    def start(self):
+        """Open this process' log, claim the orphan ones and start the flusher. Once per process."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._pending, self._flushing, self._sealed = {}, {}, []
+            os.makedirs(self.log_dir, exist_ok=True)
+            self._recover()
+            self._log = os.open(self._log_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+        thread = threading.Thread(target=self._run, args=(self._pid,), name='favorites-write-behind', daemon=True)
+        thread.start()
+        atexit.register(self.stop)
+        if self._pending:
+            self._wake.set()
+
+    def stop(self):
+        """Flush, close the log and end the flusher; ``start`` runs again on the next change."""
+        if self._pid != os.getpid():
+            return
+        try:
+            self.flush()
+        finally:
+            with self._flush_lock, self._lock:
+                os.close(self._log)
+                if not self._pending:
+                    # Nothing in it that isn't committed
+                    os.remove(self._log_path())
+                self._pid = self._log = None
+            self._wake.set()
+
+    def _log_path(self):
+        return os.path.join(self.log_dir, f'{self._pid}.log')
+
+    def _recover(self):
+        # <pid>.log and <pid>-<seq>.sealed of dead processes, ours if the pid was reused
+        orphans = []
+        for name in os.listdir(self.log_dir):
+            pid = name.split('.')[0].split('-')[0]
+            if not pid.isdigit() or not name.endswith(('.log', '.sealed')):
+                continue
+            if int(pid) == self._pid or not _pid_alive(int(pid)):
+                orphans.append(os.path.join(self.log_dir, name))
+
+        for path in sorted(orphans, key=os.path.getmtime):
+            claimed = self._seal_path()
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Another process claimed it first
+                continue
+            self._sealed.append(claimed)
+            for user_id, kind, item_id, action in _read_log(claimed):
+                self._pending.pop((user_id, kind, item_id), None)
+                self._pending[user_id, kind, item_id] = action
+        if self._sealed:
+            logger.info('%d favoritos pendientes recuperados de %d logs', len(self._pending), len(self._sealed))
+
+    def _seal_path(self):
+        self._seq += 1
+        return os.path.join(self.log_dir, f'{self._pid}-{self._seq}.sealed')
+
+    def enqueue(self, user_id, kind, item_id, action):
+        """
+        Check that the user and the item exist, then queue the change durably.
+        Raises FavoriteTargetMissing.
+        """
+        self.start()
+        user_exists, item_exists = target_exists(user_id, kind, item_id)
+        if not (user_exists and item_exists):
+            raise FavoriteTargetMissing(user_exists, item_exists)
+
+        entry = {'user_id': user_id, 'kind': kind, 'item_id': item_id, 'action': action}
+        line = (json.dumps(entry, separators=(',', ':')) + '\n').encode()
+        with self._lock:
+            os.write(self._log, line)
+            os.fsync(self._log)
+            key = (user_id, kind, item_id)
+            # Re-inserted so the pending adds keep the order they were made in
+            self._pending.pop(key, None)
+            self._pending[key] = action
+            self._generation += 1
+            self.queued += 1
+            waiting = len(self._pending)
+        if waiting >= self.flush_batch:
+            self._wake.set()
+        replicas.stick(user_id)
+        return entry
+
+    def _run(self, pid):
+        while self._pid == pid:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                logger.exception('Error al escribir los favoritos pendientes, se reintentará')
+                time.sleep(self.flush_seconds)
+
+    def flush(self):
+        """Write the pending changes in one transaction. Returns how many were written."""
+        if not self.enabled or self._pid != os.getpid():
+            return 0
+        if not has_app_context():
+            with self.app.app_context():
+                return self.flush()
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                sealed = self._sealed + [self._seal_path()]
+                self._sealed = []
+                os.close(self._log)
+                os.rename(self._log_path(), sealed[-1])
+                self._log = os.open(self._log_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+            changes = [key + (action,) for key, action in batch.items()]
+            try:
+                deltas = self._write(changes)
+            except SQLAlchemyError:
+                db.session.rollback()
+                with self._lock:
+                    # Back in the queue, behind nothing: later changes to the same favorite win
+                    batch.update(self._pending)
+                    self._pending, self._flushing = batch, {}
+                    self._sealed = sealed + self._sealed
+                raise
+
+            with self._lock:
+                self._flushing = {}
+                self._generation += 1
+                self.flushed += len(changes)
+            for path in sealed:
+                os.remove(path)
+        for (kind, item_id), delta in deltas.items():
+            leaderboard.record(kind, item_id, delta)
+        return len(changes)
+
+    def _write(self, changes):
+        try:
+            deltas = apply_favorite_changes(changes)
+            db.session.commit()
+            return deltas
+        except IntegrityError:
+            db.session.rollback()
+
+        # A user or item was deleted after its change was queued: write the rest
+        deltas = {}
+        for change in changes:
+            try:
+                with db.session.begin_nested():
+                    for key, delta in apply_favorite_changes([change]).items():
+                        deltas[key] = deltas.get(key, 0) + delta
+            except IntegrityError:
+                self.dropped += 1
+                logger.warning('Favorito descartado, el usuario o el elemento ya no existe: %s', change)
+        db.session.commit()
+        return deltas
+
+    def pending_changes(self, user_id):
+        """{(kind, item_id): action} not yet committed for ``user_id``, oldest first."""
+        if not self.enabled:
+            return {}
+        with self._lock:
+            merged = dict(self._flushing)
+            for key, action in self._pending.items():
+                merged.pop(key, None)
+                merged[key] = action
+        return {(kind, item_id): action for (owner, kind, item_id), action in merged.items() if owner == user_id}
+
+    def etag_suffix(self, user_id):
+        """Part of the favorites ETag that changes while ``user_id`` has pending changes."""
+        if not self.pending_changes(user_id):
+            return ''
+        return f'w{self._pid}.{self._generation}'
+
+    def iter_favorites(self, user_id, changes):
+        """``serializers.iter_favorites`` of ``user_id`` as if ``changes`` were committed."""
+        removed = {key for key, action in changes.items() if action == 'remove'}
+        seen = set()
+        for row in db.session.execute(favorites_query(user_id)):
+            for kind, item in zip(ROW_KINDS, split_favorite_row(row)):
+                if item is not None and (kind, item['id']) not in removed:
+                    seen.add((kind, item['id']))
+                    yield item
+
+        added = [key for key, action in changes.items() if action == 'add' and key not in seen]
+        items = {}
+        for kind in ROW_KINDS:
+            ids = [item_id for item_kind, item_id in added if item_kind == kind]
+            if ids:
+                model = FAVORITE_KINDS[kind][0]
+                columns = [getattr(model, field) for field in model.public_fields]
+                for row in db.session.execute(select(*columns).where(model.id.in_(ids))):
+                    items[kind, row.id] = dict(zip(model.public_fields, row))
+        for key in added:
+            if key in items:
+                yield items[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pending': len(self._pending) + len(self._flushing),
+                'queued': self.queued,
+                'flushed': self.flushed,
+                'dropped': self.dropped
+            }
+
+
+write_behind = WriteBehind()
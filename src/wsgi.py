@@ -1,7 +1,9 @@
 # This file was created to run the application on heroku using gunicorn.
 # Read more about it here: https://devcenter.heroku.com/articles/python-gunicorn
 
-from app import app as application
+from app import create_app
+
+application = create_app({'MIGRATIONS': False})
 
 if __name__ == "__main__":
     application.run()
@@ -0,0 +1,85 @@
+import os
+import sys
+import pytest
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+# Settings read by create_app and the extensions; each test gets a clean environment
+ENV = ('DATABASE_URL', 'DATABASE_REPLICA_URLS', 'FAVORITES_WRITE_BEHIND', 'FAVORITES_LOG_DIR', 'CACHE_BACKEND',
+       'COMPRESSION', 'JSON_ENCODER', 'LEADERBOARD_SIZE', 'SINGLEFLIGHT', 'SINGLEFLIGHT_TIMEOUT_MS', 'REPLICA_STICKY_SECONDS')
+
+
+@pytest.fixture
+def settings():
+    """Environment of the app under test; override it in a module to change it."""
+    return {}
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, settings):
+    for name in ENV:
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path}/test.db')
+    monkeypatch.setenv('ENABLE_ADMIN', '0')
+    for name, value in settings.items():
+        monkeypatch.setenv(name, value)
+
+    from app import create_app
+    from models import db
+    app = create_app({'MIGRATIONS': False, 'TESTING': True})
+    with app.app_context():
+        db.create_all(bind_key=None)
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def statements(app):
+    """
+    SQL statements run while the test reads it, without the version counters.
+    Every table has its counter already, as in a database that has been written to.
+    """
+    from models import db
+    from versioning import bump_versions
+    bump_versions(*db.metadata.tables)
+    db.session.commit()
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'table_versions' not in statement:
+            executed.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(db.engine, 'before_cursor_execute', record)
+
+@pytest.fixture
+def catalog(app):
+    """Builds users, planets and people in the test database."""
+    from models import db, User, People, Planet
+
+    class Catalog:
+
+        def user(self, name='luke'):
+            user = User(user_name=name, email=f'{name}@example.com', password='x', is_active=True)
+            db.session.add(user)
+            db.session.commit()
+            return user.id
+
+        def planet(self, name='Tatooine'):
+            planet = Planet(name=name, climate='arid')
+            db.session.add(planet)
+            db.session.commit()
+            return planet.id
+
+        def people(self, count, planet_id=None, prefix='person'):
+            people = [People(name=f'{prefix}-{index}', planet_id=planet_id) for index in range(count)]
+            db.session.add_all(people)
+            db.session.commit()
+            return [person.id for person in people]
+
+    return Catalog()
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Planet
+from admin import PlanetView
+
+ADMIN = {'ENABLE_ADMIN': '1'}
+
+
+@pytest.fixture
+def admin_statements():
+    """SQL run by any engine: the admin is an app of its own, with its own engine."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(Engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(Engine, 'before_cursor_execute', record)
+
+
+
+def test_planet_deleted_in_admin_leaves_its_people(client, catalog):
+    planet_id = catalog.planet()
+    person_id, = catalog.people(1, planet_id)
+    path = f'/people?planet_id={planet_id}'
+    before = client.get(path)
+    assert [person['id'] for person in before.get_json()['data']] == [person_id]
+
+    PlanetView(Planet, db.session).delete_model(db.session.get(Planet, planet_id))
+
+    after = client.get(path, headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['data'] == []
+
+@pytest.mark.parametrize('settings', [ADMIN])
+def test_list_pages_are_one_query_without_count(client, catalog, admin_statements):
+    catalog.people(60, catalog.planet())
+    client.get('/admin/people/')
+
+    pages = []
+    for page in (0, 1):
+        admin_statements.clear()
+        response = client.get(f'/admin/people/?page={page}')
+        assert response.status_code == 200
+        pages.append(response.get_data().count(b'person-'))
+        # People and their planet in one statement, no COUNT(*) for the pager
+        assert len(admin_statements) == 1
+        assert 'count(' not in admin_statements[0].lower()
+        assert 'JOIN planets' in admin_statements[0]
+
+    assert pages == [50, 10]
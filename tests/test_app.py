@@ -0,0 +1,34 @@
+import sys
+import pytest
+from app import LazyAdmin
+
+LAZY_MODULES = ('admin', 'flask_swagger')
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    # Unloaded before create_app runs, restored afterwards
+    for name in LAZY_MODULES:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return {'ENABLE_ADMIN': '1', 'ENABLE_SWAGGER': '1'}
+
+
+def test_admin_and_swagger_load_on_their_first_request(app, client):
+    lazy_admin, = [mount for mount in app.wsgi_app.mounts.values() if isinstance(mount, LazyAdmin)]
+    assert not any(name in sys.modules for name in LAZY_MODULES)
+    assert lazy_admin.app is None
+    assert 'migrate' not in app.extensions
+
+    assert client.get('/people').status_code == 200
+    assert lazy_admin.app is None
+
+    assert client.get('/admin/').status_code == 200
+    assert 'admin' in sys.modules and lazy_admin.app is not None
+    assert client.get('/swagger.json').status_code == 200
+    assert 'flask_swagger' in sys.modules
+
+@pytest.mark.parametrize('settings', [{'ENABLE_ADMIN': '0', 'ENABLE_SWAGGER': '0'}])
+def test_admin_and_swagger_can_be_left_out(client):
+    assert client.get('/admin/').status_code == 404
+    assert client.get('/swagger.json').status_code == 404
+    assert client.get('/people').status_code == 200
@@ -0,0 +1,67 @@
+import sys
+import pytest
+
+pytest.importorskip('starlette')
+pytest.importorskip('a2wsgi')
+pytest.importorskip('aiosqlite')
+from starlette.testclient import TestClient  # noqa: E402
+
+# Both clients send the same headers: the Accept header is part of the ETag
+PLAIN = {'Accept': '*/*', 'Accept-Encoding': 'identity'}
+GZIP = {'Accept': '*/*', 'Accept-Encoding': 'gzip'}
+PATHS = ['/people?limit=2&sort=-name', '/people/1', '/people/99', '/planets', '/planets/1', '/users',
+         '/user/1/favorites', '/people?limit=abc']
+
+
+@pytest.fixture
+def asgi(app, monkeypatch):
+    # Built at import time from the environment of the test
+    monkeypatch.delitem(sys.modules, 'asgi', raising=False)
+    import asgi
+    return asgi
+
+@pytest.fixture
+def clients(asgi, catalog):
+    planet_id = catalog.planet()
+    catalog.people(5, planet_id)
+    catalog.user()
+    flask_client = asgi.flask_app.test_client()
+    flask_client.post(f'/favorite/1/planet/{planet_id}')
+    with TestClient(asgi.application) as asgi_client:
+        yield asgi_client, flask_client
+
+
+@pytest.mark.parametrize('path', PATHS)
+def test_async_routes_answer_like_flask(clients, path):
+    asgi_client, flask_client = clients
+    expected = flask_client.get(path, headers=PLAIN)
+
+    response = asgi_client.get(path, headers=PLAIN)
+
+    assert response.status_code == expected.status_code
+    assert response.content == expected.get_data()
+    assert response.headers.get('ETag') == expected.headers.get('ETag')
+
+def test_gzip_bodies_and_conditional_requests_match(clients, catalog):
+    asgi_client, flask_client = clients
+    catalog.people(40, prefix='extra')
+    expected = flask_client.get('/people', headers=GZIP)
+
+    response = asgi_client.get('/people', headers=GZIP)
+
+    assert response.headers['Content-Encoding'] == expected.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == expected.headers['ETag']
+    assert response.content == flask_client.get('/people', headers=PLAIN).get_data()
+    etag = response.headers['ETag']
+    assert asgi_client.get('/people', headers={**GZIP, 'If-None-Match': etag}).status_code == 304
+    assert asgi_client.get('/people', headers={**GZIP, 'If-None-Match': f'W/{etag}'}).status_code == 304
+
+def test_writes_go_through_flask_and_change_the_etag(clients):
+    asgi_client, _ = clients
+    etag = asgi_client.get('/people', headers=PLAIN).headers['ETag']
+
+    assert asgi_client.post('/people', json={'name': 'new'}).status_code == 200
+
+    response = asgi_client.get('/people', headers={**PLAIN, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'new' in [person['name'] for person in response.json()['data']]
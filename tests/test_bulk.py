@@ -0,0 +1,57 @@
+from sqlalchemy import func, select
+from models import db, People
+
+
+def statuses(response):
+    assert response.status_code == 200
+    return [result['status'] for result in response.get_json()['data']]
+
+
+def test_create_reports_bad_items_and_writes_the_rest(client, catalog):
+    planet_id = catalog.planet()
+    response = client.post('/people/bulk', json=[
+        {'name': 'luke', 'planet_id': planet_id, 'gender': 'male', 'height': 172},
+        {'name': 'ghost', 'planet_id': 999},
+        {'name': 'droid', 'gender': 'robot'},
+        {'name': 'tall', 'height': '2m'},
+        {'name': 'flag', 'mass': True},
+        {'name': 'x' * 26},
+        {'name': ['not', 'a', 'name']},
+        {'name': 'leia', 'gender': None}
+    ])
+
+    assert statuses(response) == ['created', 'invalid', 'invalid', 'invalid', 'invalid', 'invalid', 'invalid',
+                                  'created']
+    assert db.session.execute(select(func.count()).select_from(People)).scalar() == 2
+
+def test_update_reports_bad_items_and_writes_the_rest(client, catalog):
+    luke, leia, han, chewie = catalog.people(4)
+    response = client.put('/people/bulk', json=[
+        {'id': luke, 'name': None},
+        {'id': leia, 'planet_id': 999},
+        {'id': han, 'gender': 'robot', 'height': 180},
+        {'id': chewie, 'height': 228},
+        {'id': True, 'height': 1}
+    ])
+
+    assert statuses(response) == ['invalid', 'invalid', 'invalid', 'updated', 'invalid']
+    assert db.session.get(People, chewie).height == 228
+    assert db.session.get(People, han).height is None
+
+def test_delete_rejects_bool_ids(client, catalog):
+    person_id, = catalog.people(1)
+
+    assert statuses(client.delete('/people/bulk', json=[True, {'id': person_id}])) == ['invalid', 'deleted']
+
+def test_ids_out_of_range_are_invalid(client, catalog):
+    luke, leia = catalog.people(2)
+
+    assert statuses(client.put('/people/bulk', json=[{'id': 10 ** 30, 'height': 1}, {'id': luke, 'height': 172}])) \
+        == ['invalid', 'updated']
+    assert statuses(client.delete('/people/bulk', json=[10 ** 30, {'id': -10 ** 30}, leia])) \
+        == ['invalid', 'invalid', 'deleted']
+
+def test_planets_are_validated_too(client):
+    response = client.post('/planets/bulk', json=[{'name': 'Hoth', 'population': 'many'}, {'name': 'Dagobah'}])
+
+    assert statuses(response) == ['invalid', 'created']
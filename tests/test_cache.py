@@ -0,0 +1,44 @@
+from sqlalchemy import update
+from models import db, People
+from versioning import bump_versions
+
+
+def write_from_another_worker(person_id, name):
+    # What another process does: the row and the versions change, this worker's cache is not told
+    db.session.execute(update(People).where(People.id == person_id).values(name=name))
+    bump_versions(People.__tablename__)
+    db.session.commit()
+
+
+def test_cached_person_is_not_served_after_a_write_elsewhere(client, catalog):
+    person_id, = catalog.people(1)
+    first = client.get(f'/people/{person_id}')
+    assert client.get(f'/people/{person_id}').get_json()['data']['name'] == 'person-0'
+
+    write_from_another_worker(person_id, 'renamed')
+
+    response = client.get(f'/people/{person_id}')
+    assert response.get_json()['data']['name'] == 'renamed'
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert client.get(f'/people/{person_id}', headers={'If-None-Match': first.headers['ETag']}).status_code == 200
+
+def test_cached_page_is_not_served_after_a_write_elsewhere(client, catalog):
+    person_id, = catalog.people(1)
+    client.get('/people')
+
+    write_from_another_worker(person_id, 'renamed')
+
+    assert client.get('/people').get_json()['data'][0]['name'] == 'renamed'
+
+def test_repeated_reads_hit_the_cache(client, catalog):
+    person_id, = catalog.people(1)
+    client.get(f'/people/{person_id}')
+    client.get(f'/people/{person_id}')
+
+    assert client.get('/cache/stats').get_json()['data']['hits'] == 1
+
+def test_weak_validator_gets_a_not_modified(client, catalog):
+    catalog.people(1)
+    etag = client.get('/people').headers['ETag']
+
+    assert client.get('/people', headers={'If-None-Match': f'W/{etag}'}).status_code == 304
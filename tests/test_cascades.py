@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import select
+from models import db, User, People, Planet, FavoriteItem
+from admin import UserView
+from favorites import recount_favorites
+
+COUNTERS = (User.favorite_people_count, User.favorite_planets_count, People.favorited_count, Planet.favorited_count)
+
+
+def counters():
+    return {
+        (str(column), row[0]): row[1]
+        for column in COUNTERS
+        for row in db.session.execute(select(column.class_.id, column))
+    }
+
+def assert_counters_match_favorites():
+    kept = counters()
+    recount_favorites(db.session.connection())
+    assert counters() == kept
+    db.session.rollback()
+
+def favorites_of(user_id):
+    return db.session.execute(select(FavoriteItem.id).where(FavoriteItem.user_id == user_id)).all()
+
+
+@pytest.fixture
+def deleted(client, catalog, statements):
+    """Statements run to delete a planet, a person and a user with ``dependents`` dependents each."""
+
+    def delete(dependents):
+        planet_id = catalog.planet(f'planet-{dependents}')
+        fans = [catalog.user(f'fan-{dependents}-{index}') for index in range(dependents)]
+        residents = catalog.people(dependents, planet_id, prefix=f'resident-{dependents}')
+        person_id, = catalog.people(1, prefix=f'famous-{dependents}')
+        for fan in fans:
+            client.post(f'/favorite/{fan}/planet/{planet_id}')
+            client.post(f'/favorite/{fan}/people/{person_id}')
+            client.post(f'/favorite/{fan}/people/{residents[0]}')
+        collector = catalog.user(f'collector-{dependents}')
+        for resident in residents:
+            client.post(f'/favorite/{collector}/people/{resident}')
+        db.session.remove()
+
+        counts = {}
+        statements.clear()
+        assert client.delete(f'/planet/{planet_id}').status_code == 200
+        counts['planet'] = len(statements)
+        assert db.session.execute(select(People.planet_id).where(People.id.in_(residents))).scalars().all() == \
+            [None] * dependents
+        assert_counters_match_favorites()
+
+        statements.clear()
+        assert client.delete(f'/people/{person_id}').status_code == 200
+        counts['person'] = len(statements)
+        assert_counters_match_favorites()
+
+        statements.clear()
+        UserView(User, db.session).delete_model(db.session.get(User, collector))
+        counts['user'] = len(statements)
+        assert favorites_of(collector) == []
+        assert_counters_match_favorites()
+        db.session.remove()
+        return counts
+
+    return delete
+
+
+def test_delete_statements_do_not_grow_with_dependents(deleted):
+    assert deleted(1) == deleted(25)
@@ -0,0 +1,69 @@
+import pytest
+from sqlalchemy import delete, func, select
+from models import db, User, People, Planet, FavoriteItem
+
+# In import order
+TABLES = ('planets', 'people', 'users', 'favorite_items')
+
+
+def run(app, *args):
+    return app.test_cli_runner().invoke(args=['catalog', *args])
+
+def wipe():
+    for model in (FavoriteItem, People, Planet, User):
+        db.session.execute(delete(model))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'ndjson'])
+def test_export_and_import_round_trip(app, client, catalog, tmp_path, file_format):
+    planet_id = catalog.planet()
+    luke, leia = catalog.people(2, planet_id)
+    user_id = catalog.user()
+    client.post(f'/favorite/{user_id}/people/{luke}')
+    client.post(f'/favorite/{user_id}/planet/{planet_id}')
+    profile = client.get(f'/users/{user_id}/profile').get_json()['data']
+
+    exported = {}
+    for table in TABLES:
+        path = tmp_path / f'{table}.{file_format}'
+        result = run(app, 'export', table, str(path), '--batch-size', '1')
+        assert result.exit_code == 0, result.output
+        exported[table] = path.read_bytes()
+
+    wipe()
+    for table in TABLES:
+        result = run(app, 'import', table, str(tmp_path / f'{table}.{file_format}'), '--batch-size', '1')
+        assert result.exit_code == 0, result.output
+
+    for table in TABLES:
+        path = tmp_path / f'again-{table}.{file_format}'
+        run(app, 'export', table, str(path))
+        assert path.read_bytes() == exported[table]
+    assert client.get(f'/users/{user_id}/profile').get_json()['data'] == profile
+
+def test_import_resolves_names(app, client, catalog, tmp_path):
+    catalog.planet('Tatooine')
+    catalog.user('luke')
+    people = tmp_path / 'people.csv'
+    people.write_text('name,gender,height,planet\nLuke,male,172,Tatooine\nC-3PO,,,\n')
+    favorites = tmp_path / 'favorites.ndjson'
+    favorites.write_text('{"user_name":"luke","people":"Luke"}\n{"user_name":"luke","planet":"Tatooine"}\n')
+
+    assert run(app, 'import', 'people', str(people)).exit_code == 0
+    assert run(app, 'import', 'favorite_items', str(favorites)).exit_code == 0
+
+    body = client.get('/people?fields=name,height&sort=name').get_json()['data']
+    assert [(person['name'], person['height']) for person in body] == [('C-3PO', None), ('Luke', 172)]
+    assert client.get('/leaderboard/people').get_json()['data'][0]['name'] == 'Luke'
+
+def test_failed_import_writes_nothing(app, catalog, tmp_path):
+    catalog.planet('Tatooine')
+    people = tmp_path / 'people.csv'
+    people.write_text('name,planet\nLuke,Tatooine\nLeia,Alderaan\n')
+
+    result = run(app, 'import', 'people', str(people), '--batch-size', '1')
+
+    assert result.exit_code == 1
+    assert 'planet not found: Alderaan' in result.output
+    assert db.session.execute(select(func.count()).select_from(People)).scalar() == 0
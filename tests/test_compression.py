@@ -0,0 +1,66 @@
+import gzip
+import zlib
+import pytest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+COLUMNAR = {'Accept': 'application/x-columnar+json'}
+
+
+@pytest.fixture
+def people(catalog):
+    # Well over COMPRESS_MIN_BYTES
+    return catalog.people(40, catalog.planet())
+
+
+@pytest.mark.parametrize('path, headers', [('/people', {}), ('/people', COLUMNAR), ('/people?stream=1', {}),
+                                           ('/people', {'Accept': 'application/x-ndjson'})])
+def test_gzip_bodies_decompress_to_the_plain_ones(client, people, path, headers):
+    plain = client.get(path, headers=headers)
+    compressed = client.get(path, headers={**headers, **GZIP})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary'] and 'Accept-Encoding' in plain.headers['Vary']
+    assert len(compressed.get_data()) < len(plain.get_data())
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+
+def test_brotli_is_preferred_when_installed(client, people):
+    brotli = pytest.importorskip('brotli')
+    plain = client.get('/people')
+    compressed = client.get('/people', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert compressed.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(compressed.get_data()) == plain.get_data()
+
+@pytest.mark.parametrize('settings', [{'COMPRESS_FLUSH_BYTES': '256'}])
+def test_streams_can_be_decoded_as_they_arrive(client, people):
+    plain = client.get('/people?stream=1').get_data()
+    response = client.get('/people?stream=1', headers=GZIP, buffered=False)
+    decoder = zlib.decompressobj(31)
+
+    decoded = [decoder.decompress(chunk) for chunk in response.iter_encoded()]
+    response.close()
+
+    # Every flush is readable on its own, well before the end of the body
+    assert len([data for data in decoded if data]) > 2
+    assert b''.join(decoded) + decoder.flush() == plain
+
+def test_small_bodies_and_unaccepted_codings_are_sent_plain(client, people):
+    assert 'Content-Encoding' not in client.get(f'/people/{people[0]}', headers=GZIP).headers
+    assert 'Content-Encoding' not in client.get('/people', headers={'Accept-Encoding': 'gzip;q=0, deflate'}).headers
+
+def test_gzip_etag_matches_only_requests_that_accept_gzip(client, people):
+    plain = client.get('/people').headers['ETag']
+    compressed = client.get('/people', headers=GZIP).headers['ETag']
+
+    assert compressed != plain
+    assert client.get('/people', headers={**GZIP, 'If-None-Match': compressed}).status_code == 304
+    assert client.get('/people', headers={'If-None-Match': compressed}).status_code == 200
+    assert client.get('/people', headers={**GZIP, 'If-None-Match': plain}).status_code == 200
+
+def test_columnar_rows_hold_the_plain_items(client, people):
+    plain = client.get('/people?sort=-name&limit=10').get_json()
+    columnar = client.get('/people?sort=-name&limit=10', headers=COLUMNAR).get_json()
+    fields = columnar['data']['fields']
+
+    assert [dict(zip(fields, row)) for row in columnar['data']['rows']] == plain['data']
+    assert columnar['next'] == plain['next']
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+import favorites
+from versioning import current_versions
+
+
+def favorites_etag(client, user_id):
+    return client.get(f'/user/{user_id}/favorites').headers['ETag']
+
+
+def test_toggle_changes_only_its_users_etags(client, catalog):
+    luke, leia = catalog.user('luke'), catalog.user('leia')
+    person_id, = catalog.people(1)
+    before = {user_id: favorites_etag(client, user_id) for user_id in (luke, leia)}
+    profile = client.get(f'/users/{leia}/profile').headers['ETag']
+    table_version = current_versions('favorite_items')
+
+    assert client.post(f'/favorite/{luke}/people/{person_id}').status_code == 200
+
+    assert favorites_etag(client, luke) != before[luke]
+    assert favorites_etag(client, leia) == before[leia]
+    assert client.get(f'/users/{leia}/profile').headers['ETag'] == profile
+    assert current_versions('favorite_items') == table_version
+
+def test_profile_etag_follows_its_counters(client, catalog):
+    user_id = catalog.user()
+    planet_id = catalog.planet()
+    first = client.get(f'/users/{user_id}/profile')
+
+    client.post(f'/favorite/{user_id}/planet/{planet_id}')
+    second = client.get(f'/users/{user_id}/profile', headers={'If-None-Match': first.headers['ETag']})
+
+    assert second.status_code == 200
+    assert second.get_json()['data']['favorites_count'] == {'people': 0, 'planets': 1}
+
+def test_profiles_etag_follows_every_user(client, catalog):
+    luke, leia = catalog.user('luke'), catalog.user('leia')
+    planet_id = catalog.planet()
+    path = f'/users/profiles?ids={luke},{leia}'
+    first = client.get(path).headers['ETag']
+
+    client.post(f'/favorite/{leia}/planet/{planet_id}')
+
+    assert client.get(path, headers={'If-None-Match': first}).status_code == 200
+
+def test_favorites_statements_do_not_grow_with_favorites(client, catalog, statements):
+    planet_id = catalog.planet()
+    people = catalog.people(20, planet_id)
+    few, many = catalog.user('luke'), catalog.user('leia')
+    client.post(f'/favorite/{few}/people/{people[0]}')
+    for person_id in people:
+        client.post(f'/favorite/{many}/people/{person_id}')
+    client.post(f'/favorite/{many}/planet/{planet_id}')
+
+    counts = {}
+    for user_id, expected in ((few, 1), (many, 21)):
+        statements.clear()
+        response = client.get(f'/user/{user_id}/favorites')
+        assert len(response.get_json()['Favoritos']) == expected
+        counts[user_id] = len(statements)
+
+    assert counts[few] == counts[many]
+
+@pytest.mark.parametrize('dialect', ['sqlite', 'mysql'])
+def test_duplicate_add_is_not_counted(client, catalog, monkeypatch, dialect):
+    # 'mysql' takes the savepoint path of dialects.insert_if_absent on SQLite
+    monkeypatch.setattr('dialects.dialect_name', lambda: dialect)
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+
+    first = client.post(f'/favorite/{user_id}/people/{person_id}')
+    again = client.post(f'/favorite/{user_id}/people/{person_id}')
+    missing = client.post(f'/favorite/{user_id}/people/999')
+
+    assert first.get_json()['msg'] == 'Person favorite add'
+    assert again.get_json()['msg'] == f'Al usuario {user_id} ya le gusta el personaje {person_id}'
+    assert missing.status_code == 404
+    profile = client.get(f'/users/{user_id}/profile').get_json()['data']
+    assert profile['favorites_count'] == {'people': 1, 'planets': 0}
+    assert [person['favorited_count'] for person in client.get('/leaderboard/people').get_json()['data']] == [1]
+
+def test_integrity_error_with_both_targets_is_not_a_missing_target(app, catalog, monkeypatch):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+
+    def failing_insert(user_id, kind, item_id):
+        raise IntegrityError('INSERT INTO favorite_items', {}, Exception('CHECK constraint failed'))
+
+    monkeypatch.setattr(favorites, '_insert_favorite', failing_insert)
+
+    with pytest.raises(IntegrityError):
+        favorites.add_favorite(user_id, 'people', person_id)
+    with pytest.raises(favorites.FavoriteTargetMissing):
+        favorites.add_favorite(user_id, 'people', 999)
@@ -0,0 +1,43 @@
+import pytest
+from models import db, People
+
+
+def names(client, query, model='people'):
+    response = client.get(f'/{model}?{query}')
+    assert response.status_code == 200
+    return [item['name'] for item in response.get_json()['data']]
+
+
+@pytest.mark.parametrize('query', ['min_height=1' + '0' * 30, 'max_mass=-1' + '0' * 30, 'planet_id=1' + '0' * 30])
+def test_numbers_out_of_range_are_rejected(client, query):
+    response = client.get(f'/people?{query}')
+
+    assert response.status_code == 400
+    assert 'fuera de rango' in response.get_json()['message']
+
+def test_people_are_filtered_by_planet_gender_and_range(client, catalog):
+    planet_id = catalog.planet()
+    db.session.add_all([
+        People(name='Luke', gender='male', height=172, mass=77, planet_id=planet_id),
+        People(name='Leia', gender='female', height=150, mass=49, planet_id=planet_id),
+        People(name='Chewbacca', gender='male', height=228, mass=112)
+    ])
+    db.session.commit()
+
+    assert names(client, f'planet_id={planet_id}&sort=name') == ['Leia', 'Luke']
+    assert names(client, 'gender=male&min_height=200') == ['Chewbacca']
+    assert names(client, 'max_mass=80&sort=-mass') == ['Luke', 'Leia']
+    assert client.get('/people?gender=robot').status_code == 400
+
+def test_sort_and_search(client, catalog):
+    for name in ('Hoth', 'Dagobah', 'Tatooine', 'Coruscant'):
+        catalog.planet(name)
+    catalog.people(1, prefix='Lu')
+    catalog.people(1, prefix='luminara')
+    catalog.people(1, prefix='Leia')
+
+    assert names(client, 'sort=-name', 'planets') == ['Tatooine', 'Hoth', 'Dagobah', 'Coruscant']
+    assert names(client, 'q=oo', 'planets') == ['Tatooine']
+    assert names(client, 'name_prefix=lu&sort=name') == ['Lu-0', 'luminara-0']
+    assert names(client, 'name_prefix=%25') == []
+    assert client.get('/people?sort=url').status_code == 400
@@ -0,0 +1,59 @@
+import pytest
+
+
+def favorite(client, user_id, person_id, method='POST'):
+    assert client.open(f'/favorite/{user_id}/people/{person_id}', method=method).status_code == 200
+
+def top(client, limit=10):
+    return [(item['id'], item['favorited_count'])
+            for item in client.get(f'/leaderboard/people?limit={limit}').get_json()['data']]
+
+
+@pytest.fixture
+def fans(catalog):
+    return [catalog.user(f'fan{index}') for index in range(4)]
+
+
+def test_order_follows_added_and_removed_favorites(client, catalog, fans):
+    luke, leia, han = catalog.people(3)
+    for user_id in fans[:3]:
+        favorite(client, user_id, luke)
+    for user_id in fans[:2]:
+        favorite(client, user_id, leia)
+    favorite(client, fans[0], han)
+
+    assert top(client) == [(luke, 3), (leia, 2), (han, 1)]
+
+    favorite(client, fans[1], luke, 'DELETE')
+    favorite(client, fans[2], luke, 'DELETE')
+    favorite(client, fans[1], han)
+    favorite(client, fans[3], han)
+
+    assert top(client) == [(han, 3), (leia, 2), (luke, 1)]
+    assert top(client, 1) == [(han, 3)]
+
+def test_changes_to_tracked_items_are_served_from_memory(client, catalog, fans, statements):
+    luke, leia = catalog.people(2)
+    favorite(client, fans[0], luke)
+    favorite(client, fans[0], leia)
+    top(client)
+
+    favorite(client, fans[1], leia)
+    statements.clear()
+
+    assert top(client) == [(leia, 2), (luke, 1)]
+    assert statements == []
+
+@pytest.mark.parametrize('settings', [{'LEADERBOARD_SIZE': '1'}])
+def test_untracked_item_that_climbs_reaches_the_top(client, catalog, fans):
+    # Only the 2 most favorited items are tracked
+    people = catalog.people(3)
+    for count, person_id in enumerate(people, 1):
+        for user_id in fans[:count]:
+            favorite(client, user_id, person_id)
+    assert top(client) == [(people[2], 3)]
+
+    for user_id in fans[1:]:
+        favorite(client, user_id, people[0])
+
+    assert top(client) == [(people[0], 4)]
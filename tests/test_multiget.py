@@ -0,0 +1,40 @@
+import pytest
+
+
+def ids(values):
+    return ','.join(str(value) for value in values)
+
+
+@pytest.mark.parametrize('path', ['/people?ids=1,{}', '/planets?ids={}', '/users/profiles?ids={}', '/people?ids=-{}'])
+def test_ids_out_of_range_are_a_bad_request(client, path):
+    response = client.get(path.format(10 ** 30))
+
+    assert response.status_code == 400
+    assert response.get_json()['message'].startswith('El parámetro "ids"')
+
+def test_people_statements_do_not_grow_with_ids(client, catalog, statements):
+    people = [catalog.people(1, catalog.planet(f'planet-{index}'), f'person{index}')[0] for index in range(20)]
+
+    counts = []
+    for chosen in (people[:1], people):
+        statements.clear()
+        body = client.get(f'/people?ids={ids(chosen)},999&expand=planet').get_json()
+        assert [person['planet']['name'] for person in body['data']] == [f'planet-{index}' for index in range(len(chosen))]
+        assert body['missing'] == [999]
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
+
+def test_planets_statements_do_not_grow_with_residents(client, catalog, statements):
+    planets = [catalog.planet(f'planet-{index}') for index in range(10)]
+    for index, planet_id in enumerate(planets):
+        catalog.people(index + 1, planet_id, f'planet{index}')
+
+    counts = []
+    for chosen in (planets[:1], planets):
+        statements.clear()
+        body = client.get(f'/planets?ids={ids(chosen)}&expand=residents').get_json()
+        assert [len(planet['residents']) for planet in body['data']] == list(range(1, len(chosen) + 1))
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1]
@@ -0,0 +1,38 @@
+import pytest
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize('query, values', [
+    ('', [True]),
+    ('', [False]),
+    ('', [None]),
+    ('', [1.5]),
+    ('', ['1']),
+    ('', [2 ** 70]),
+    ('', [1, 2]),
+    ('&sort=height', ['tall', 1]),
+    ('&sort=height', [True, 1]),
+    ('&sort=name', [7, 1]),
+    ('&sort=name', [None, 1]),
+    ('&sort=gender', ['robot', 1]),
+    ('&sort=gender', [{'male': 1}, 1]),
+])
+def test_malformed_cursor_is_a_bad_request(client, catalog, query, values):
+    catalog.people(3)
+
+    response = client.get(f'/people?limit=1{query}&after={encode_cursor(values)}')
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'El cursor "after" no es válido'
+
+def test_cursors_walk_every_page(client, catalog):
+    catalog.people(5)
+    names, after = [], ''
+    while True:
+        body = client.get(f'/people?limit=2&sort=-height,gender{after}').get_json()
+        names += [person['name'] for person in body['data']]
+        if body['next'] is None:
+            break
+        after = f'&after={body["next"]}'
+
+    assert sorted(names) == [f'person-{index}' for index in range(5)]
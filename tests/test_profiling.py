@@ -0,0 +1,14 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from models import db
+
+
+def test_failed_statement_leaves_no_start_time_behind(app):
+    with db.engine.connect() as connection:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                connection.execute(text('SELECT * FROM missing_table'))
+        connection.execute(text('SELECT 1'))
+
+        assert connection.info['query_start'] == []
@@ -0,0 +1,116 @@
+import time
+import pytest
+from sqlalchemy import insert, select
+from models import db, People
+from replicas import STICKY_COOKIE, replicas
+
+BROKEN_REPLICA = {'DATABASE_REPLICA_URLS': 'sqlite:////nonexistent/replica.db'}
+
+
+@pytest.fixture
+def settings(tmp_path):
+    # The replica is another SQLite file: it never sees the writes, like a replica far behind
+    return {'DATABASE_REPLICA_URLS': f'sqlite:///{tmp_path}/replica.db'}
+
+@pytest.fixture
+def replica(app):
+    engine = db.engines['replica_0']
+    db.metadata.create_all(engine)
+    return engine
+
+
+def request(client, method, path, **kwargs):
+    # The requests share the test's app context: give each one a new session, as a server does
+    db.session.remove()
+    return client.open(path, method=method, **kwargs)
+
+def favorites(client, user_id):
+    return request(client, 'GET', f'/user/{user_id}/favorites').get_json()['Favoritos']
+
+def sticky_cookie(response):
+    return response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+
+
+def test_writer_reads_its_favorites_from_the_primary(app, replica, catalog):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    writer, other = app.test_client(), app.test_client()
+
+    response = request(writer, 'POST', f'/favorite/{user_id}/people/{person_id}')
+
+    assert response.headers['Set-Cookie'].startswith(f'{STICKY_COOKIE}=')
+    assert [item['id'] for item in favorites(writer, user_id)] == [person_id]
+    assert favorites(other, user_id) == []
+
+def test_cookie_works_on_any_worker(app, replica, catalog):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    cookie = sticky_cookie(request(app.test_client(), 'POST', f'/favorite/{user_id}/people/{person_id}'))
+
+    # All another worker gets from the client is the cookie
+    client = app.test_client()
+    client.set_cookie('localhost', STICKY_COOKIE, cookie)
+    assert [item['id'] for item in favorites(client, user_id)] == [person_id]
+    assert favorites(client, catalog.user('leia')) == []
+
+def test_forged_or_expired_cookie_is_ignored(app, replica, catalog, monkeypatch):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    client = app.test_client()
+    cookie = sticky_cookie(request(client, 'POST', f'/favorite/{user_id}/people/{person_id}'))
+
+    client.set_cookie('localhost', STICKY_COOKIE, cookie[:-2] + 'xx')
+    assert favorites(client, user_id) == []
+
+    client.set_cookie('localhost', STICKY_COOKIE, cookie)
+    monkeypatch.setattr('replicas.time.time', lambda: 9999999999)
+    assert favorites(client, user_id) == []
+
+def names(client):
+    return [person['name'] for person in request(client, 'GET', '/people').get_json()['data']]
+
+def replica_healthy(client):
+    return request(client, 'GET', '/health/db').get_json()['replicas'][0]['healthy']
+
+
+def test_reads_go_to_the_replica_and_writes_to_the_primary(client, replica, catalog):
+    catalog.people(1, prefix='primary')
+    with replica.begin() as connection:
+        connection.execute(insert(People.__table__).values(name='replica-0'))
+
+    assert names(client) == ['replica-0']
+    created = request(client, 'POST', '/people/bulk', json=[{'name': 'written'}])
+    assert [result['status'] for result in created.get_json()['data']] == ['created']
+    assert names(client) == ['replica-0']
+    db.session.remove()
+    assert db.session.execute(select(People.name).order_by(People.id)).scalars().all() == ['primary-0', 'written']
+
+@pytest.mark.parametrize('settings', [BROKEN_REPLICA])
+def test_failed_replica_falls_back_to_the_primary(client, catalog, monkeypatch):
+    catalog.people(1, prefix='primary')
+    picked = []
+    pick = replicas.pick
+
+    def recorded_pick():
+        picked.append(pick())
+        return picked[-1]
+
+    monkeypatch.setattr(replicas, 'pick', recorded_pick)
+
+    assert names(client) == ['primary-0']
+    assert replica_healthy(client) is False
+    assert names(client) == ['primary-0']
+    # Left out once it failed: no more attempts until the retry delay
+    assert picked == ['replica_0', None]
+
+@pytest.mark.parametrize('settings', [BROKEN_REPLICA])
+def test_failed_replica_is_tried_again_later(client, catalog, monkeypatch):
+    catalog.people(1, prefix='primary')
+    names(client)
+    assert replica_healthy(client) is False
+
+    monotonic = time.monotonic
+    monkeypatch.setattr('replicas.time.monotonic', lambda: monotonic() + replicas.retry_seconds + 1)
+    assert replica_healthy(client) is True
+    assert names(client) == ['primary-0']
+    assert replica_healthy(client) is False
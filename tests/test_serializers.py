@@ -0,0 +1,40 @@
+import json
+import pytest
+from models import db, User, People, Planet
+from serializers import fetch_one, fetch_profiles
+
+ENCODERS = [{}, {'JSON_ENCODER': 'orjson'}]
+
+
+def plain_body(obj):
+    # What jsonify writes with the standard encoder
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode() + b'\n'
+
+
+@pytest.fixture
+def galaxy(catalog):
+    planet = Planet(name='Alderaan', diameter=12500, climate='temperate', population=2000000000, terrain='grasslands')
+    db.session.add(planet)
+    db.session.commit()
+    person = People(name='Leia Órgana', gender='female', height=150, mass=49, planet_id=planet.id)
+    db.session.add(person)
+    db.session.commit()
+    return db.session.get(User, catalog.user()), planet, person
+
+
+def test_rows_serialize_like_the_models(galaxy):
+    for obj in galaxy:
+        assert fetch_one(type(obj), obj.id) == obj.serialize()
+    user = galaxy[0]
+    assert {key: value for key, value in fetch_profiles([user.id])[user.id].items()
+            if key in user.serialize()} == user.serialize()
+
+@pytest.mark.parametrize('settings', ENCODERS)
+def test_bodies_are_byte_identical_to_serialize(client, galaxy, settings):
+    _, planet, person = galaxy
+    assert client.application.json.use_orjson == ('JSON_ENCODER' in settings)
+
+    assert client.get(f'/people/{person.id}').get_data() == plain_body({'mg': 'get person ok', 'data': person.serialize()})
+    assert client.get(f'/planets/{planet.id}').get_data() == plain_body({'mg': 'get planet ok', 'data': planet.serialize()})
+    assert client.get('/people').get_data() == \
+        plain_body({'msg': 'get all people ok', 'data': [person.serialize()], 'next': None})
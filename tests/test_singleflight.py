@@ -0,0 +1,142 @@
+import time
+import threading
+import pytest
+import routes
+from singleflight import single_flight
+
+FOLLOWERS = 5
+
+
+class Gate:
+    """Stands in for routes.fetch_one: the first call, the leader's, waits until ``release``."""
+
+    def __init__(self, monkeypatch, fail=False):
+        self.fetch_one = routes.fetch_one
+        self.calls = 0
+        self.fail = fail
+        self.entered = threading.Event()
+        self.released = threading.Event()
+        monkeypatch.setattr(routes, 'fetch_one', self)
+
+    def __call__(self, model, item_id):
+        self.calls += 1
+        if self.calls == 1:
+            self.entered.set()
+            assert self.released.wait(5)
+            if self.fail:
+                raise RuntimeError('the leader failed')
+        return self.fetch_one(model, item_id)
+
+    def release(self):
+        self.released.set()
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+def get_in_thread(app, path, responses):
+    def get():
+        try:
+            responses.append(app.test_client().get(path))
+        except RuntimeError as error:
+            responses.append(error)
+    thread = threading.Thread(target=get)
+    thread.start()
+    return thread
+
+def counters():
+    return dict(single_flight.stats().get('people', dict.fromkeys(('leaders', 'collapsed', 'timeouts', 'fallbacks'), 0)))
+
+
+@pytest.fixture
+def followers(monkeypatch):
+    """How many reads are waiting for the one in flight."""
+    waiting = []
+    follow = single_flight._follow
+
+    def counted(*args):
+        waiting.append(args)
+        return follow(*args)
+
+    monkeypatch.setattr(single_flight, '_follow', counted)
+    return waiting
+
+@pytest.fixture
+def person_id(catalog):
+    # The response cache would answer the repeated reads before they get here
+    return catalog.people(1)[0]
+
+
+def test_identical_reads_share_the_leaders_response(app, monkeypatch, followers, person_id):
+    monkeypatch.setattr(single_flight, 'timeout', 5)
+    gate = Gate(monkeypatch)
+    before = counters()
+    responses = []
+
+    leader = get_in_thread(app, f'/people/{person_id}', responses)
+    assert gate.entered.wait(5)
+    threads = [get_in_thread(app, f'/people/{person_id}', responses) for _ in range(FOLLOWERS)]
+    wait_for(lambda: len(followers) == FOLLOWERS)
+    gate.release()
+    for thread in [leader] + threads:
+        thread.join(5)
+
+    assert gate.calls == 1
+    assert [response.status_code for response in responses] == [200] * (FOLLOWERS + 1)
+    assert len({response.data for response in responses}) == 1
+    after = counters()
+    assert after['leaders'] - before['leaders'] == 1
+    assert after['collapsed'] - before['collapsed'] == FOLLOWERS
+
+def test_follower_stops_waiting_after_the_timeout(app, monkeypatch, followers, person_id):
+    monkeypatch.setattr(single_flight, 'timeout', 0.05)
+    gate = Gate(monkeypatch)
+    before = counters()
+    responses = []
+
+    leader = get_in_thread(app, f'/people/{person_id}', responses)
+    assert gate.entered.wait(5)
+    follower = app.test_client().get(f'/people/{person_id}')
+    gate.release()
+    leader.join(5)
+
+    assert follower.status_code == 200
+    assert follower.data == responses[0].data
+    assert gate.calls == 2
+    assert counters()['timeouts'] - before['timeouts'] == 1
+
+def test_followers_run_the_view_when_the_leader_fails(app, monkeypatch, followers, person_id):
+    monkeypatch.setattr(single_flight, 'timeout', 5)
+    gate = Gate(monkeypatch, fail=True)
+    before = counters()
+    leader_responses, responses = [], []
+
+    leader = get_in_thread(app, f'/people/{person_id}', leader_responses)
+    assert gate.entered.wait(5)
+    follower = get_in_thread(app, f'/people/{person_id}', responses)
+    wait_for(lambda: len(followers) == 1)
+    gate.release()
+    leader.join(5)
+    follower.join(5)
+
+    assert isinstance(leader_responses[0], RuntimeError)
+    assert responses[0].status_code == 200
+    assert counters()['fallbacks'] - before['fallbacks'] == 1
+
+def test_reads_after_a_write_start_a_new_flight(app, client, monkeypatch, followers, person_id):
+    monkeypatch.setattr(single_flight, 'timeout', 5)
+    gate = Gate(monkeypatch)
+    responses = []
+
+    leader = get_in_thread(app, f'/people/{person_id}', responses)
+    assert gate.entered.wait(5)
+    assert client.put('/people/bulk', json=[{'id': person_id, 'name': 'renamed'}]).status_code == 200
+    after_write = app.test_client().get(f'/people/{person_id}')
+    gate.release()
+    leader.join(5)
+
+    assert followers == []
+    assert after_write.get_json()['data']['name'] == 'renamed'
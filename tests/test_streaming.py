@@ -0,0 +1,35 @@
+import json
+import streaming
+
+NDJSON = {'Accept': 'application/x-ndjson'}
+
+
+def compact(obj):
+    return json.dumps(obj, separators=(',', ':'), sort_keys=True).encode()
+
+
+def test_streamed_bodies_match_the_plain_page(client, catalog, monkeypatch):
+    # Several batches of the server-side cursor
+    monkeypatch.setattr(streaming, 'STREAM_BATCH', 2)
+    catalog.people(5, catalog.planet())
+    people = client.get('/people').get_json()['data']
+
+    assert client.get('/people', headers=NDJSON).get_data() == b''.join(compact(person) + b'\n' for person in people)
+    assert client.get('/people?stream=1').get_data() == \
+        b'{"msg":"get all people ok","data":[' + b','.join(compact(person) for person in people) + b']}'
+
+def test_streams_are_filtered_sorted_and_projected(client, catalog):
+    planet_id = catalog.planet()
+    catalog.people(3, planet_id, 'native')
+    catalog.people(2, prefix='visitor')
+    query = f'planet_id={planet_id}&sort=-name&fields=name'
+
+    lines = client.get(f'/people?{query}', headers=NDJSON).get_data().splitlines()
+
+    assert lines == [compact(person) for person in client.get(f'/people?{query}').get_json()['data']]
+    assert [json.loads(line)['name'] for line in lines] == ['native-2', 'native-1', 'native-0']
+
+def test_expand_is_not_streamed(client, catalog):
+    catalog.people(1)
+
+    assert client.get('/people?stream=1&expand=planet').status_code == 400
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import threading
+import subprocess
+import pytest
+from sqlalchemy.exc import OperationalError
+from writebehind import write_behind
+
+
+def dead_pid():
+    process = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+    return int(process.stdout)
+
+def write_log(path, *changes):
+    with open(path, 'w') as log:
+        for user_id, kind, item_id, action in changes:
+            log.write(json.dumps({'user_id': user_id, 'kind': kind, 'item_id': item_id, 'action': action}) + '\n')
+
+def favorite_ids(client, user_id):
+    return [item['id'] for item in client.get(f'/user/{user_id}/favorites').get_json()['Favoritos']]
+
+def favorites_count(client, user_id):
+    return client.get(f'/users/{user_id}/profile').get_json()['data']['favorites_count']
+
+def flusher_running():
+    return any(thread.name == 'favorites-write-behind' and thread.is_alive() for thread in threading.enumerate())
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    path = tmp_path / 'favorites-log'
+    path.mkdir()
+    return path
+
+@pytest.fixture
+def orphan_changes():
+    """Changes in the log of a dead worker when the app starts; parametrize to set them."""
+    return []
+
+@pytest.fixture
+def orphan(log_dir, orphan_changes):
+    path = log_dir / f'{dead_pid()}.log'
+    if orphan_changes:
+        write_log(path, *orphan_changes)
+    return path
+
+@pytest.fixture
+def settings(log_dir, orphan):
+    # Flushes only when a test asks for one
+    return {'FAVORITES_WRITE_BEHIND': '1', 'FAVORITES_LOG_DIR': str(log_dir), 'FAVORITES_FLUSH_MS': '600000'}
+
+@pytest.fixture(autouse=True)
+def stop_flusher(app):
+    yield
+    write_behind.stop()
+
+
+# Left by a worker that died before flushing: user 1 likes person 1
+@pytest.mark.parametrize('orphan_changes', [[(1, 'people', 1, 'add')]])
+def test_nothing_starts_while_the_app_is_created(app, client, catalog, orphan, log_dir):
+    assert write_behind._pid is None
+    assert not flusher_running()
+    assert os.listdir(log_dir) == [orphan.name]
+
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    flushed = write_behind.stats()['flushed']
+    client.get('/')
+
+    assert write_behind._pid == os.getpid()
+    assert flusher_running()
+    assert not orphan.exists()
+    write_behind.flush()
+    assert write_behind.stats()['flushed'] == flushed + 1
+    assert [item['id'] for item in client.get(f'/user/{user_id}/favorites').get_json()['Favoritos']] == [person_id]
+
+def test_toggles_of_one_favorite_are_written_once(client, catalog, statements):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    for _ in range(25):
+        assert client.post(f'/favorite/{user_id}/people/{person_id}').status_code == 202
+        assert client.delete(f'/favorite/{user_id}/people/{person_id}').status_code == 202
+    client.post(f'/favorite/{user_id}/people/{person_id}')
+
+    assert write_behind.pending_changes(user_id) == {('people', person_id): 'add'}
+    statements.clear()
+    assert write_behind.flush() == 1
+    writes = [statement for statement in statements if statement.startswith(('INSERT', 'UPDATE', 'DELETE'))]
+    # The favorite, the user's counter and the person's counter
+    assert len(writes) == 3
+    assert favorite_ids(client, user_id) == [person_id]
+    assert favorites_count(client, user_id) == {'people': 1, 'planets': 0}
+
+def test_add_then_remove_writes_nothing(client, catalog):
+    user_id = catalog.user()
+    planet_id = catalog.planet()
+    client.post(f'/favorite/{user_id}/planet/{planet_id}')
+    client.delete(f'/favorite/{user_id}/planet/{planet_id}')
+
+    assert write_behind.flush() == 1
+    assert favorite_ids(client, user_id) == []
+    assert favorites_count(client, user_id) == {'people': 0, 'planets': 0}
+
+def test_pending_changes_are_read_back(client, catalog):
+    user_id = catalog.user()
+    people = catalog.people(2)
+    client.post(f'/favorite/{user_id}/people/{people[0]}')
+    write_behind.flush()
+    before = client.get(f'/user/{user_id}/favorites')
+
+    client.delete(f'/favorite/{user_id}/people/{people[0]}')
+    client.post(f'/favorite/{user_id}/people/{people[1]}')
+
+    pending = client.get(f'/user/{user_id}/favorites', headers={'If-None-Match': before.headers['ETag']})
+    assert pending.status_code == 200
+    assert [item['id'] for item in pending.get_json()['Favoritos']] == [people[1]]
+    write_behind.flush()
+    assert favorite_ids(client, user_id) == [people[1]]
+
+@pytest.mark.parametrize('orphan_changes', [[(1, 'people', 1, 'add'), (1, 'people', 2, 'add')]])
+def test_logs_of_dead_workers_are_recovered_in_order(client, catalog, orphan, log_dir):
+    user_id = catalog.user()
+    people = catalog.people(2)
+    assert (user_id, people) == (1, [1, 2])
+    # Sealed after the log above, then the worker died: its changes are newer
+    sealed = log_dir / f'{dead_pid()}-1.sealed'
+    write_log(sealed, (user_id, 'people', people[1], 'remove'))
+    with open(sealed, 'a') as log:
+        log.write('{"user_id": 1, "ki')
+    os.utime(orphan, (1, 1))
+
+    client.get('/')
+    write_behind.flush()
+
+    assert os.listdir(log_dir) == [f'{os.getpid()}.log']
+    assert favorite_ids(client, user_id) == [people[0]]
+    assert favorites_count(client, user_id) == {'people': 1, 'planets': 0}
+
+def test_failed_flush_keeps_the_changes(client, catalog, monkeypatch, log_dir):
+    user_id = catalog.user()
+    person_id, = catalog.people(1)
+    client.post(f'/favorite/{user_id}/people/{person_id}')
+
+    def database_down(changes):
+        raise OperationalError('INSERT', {}, Exception('database is down'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr('writebehind.apply_favorite_changes', database_down)
+        with pytest.raises(OperationalError):
+            write_behind.flush()
+    assert write_behind.pending_changes(user_id) == {('people', person_id): 'add'}
+    assert any(name.endswith('.sealed') for name in os.listdir(log_dir))
+
+    assert write_behind.flush() == 1
+    assert favorite_ids(client, user_id) == [person_id]
+    assert os.listdir(log_dir) == [f'{os.getpid()}.log']
+
+def test_changes_of_deleted_items_are_dropped(client, catalog):
+    user_id = catalog.user()
+    people = catalog.people(2)
+    dropped = write_behind.stats()['dropped']
+    for person_id in people:
+        client.post(f'/favorite/{user_id}/people/{person_id}')
+    client.delete(f'/people/{people[0]}')
+
+    assert write_behind.flush() == 2
+    assert write_behind.stats()['dropped'] == dropped + 1
+    assert favorite_ids(client, user_id) == [people[1]]